@@ -0,0 +1,99 @@
+"""Prueba de carga del API Gateway contra servicios stub locales.
+
+Arranca services/api_gateway/main.py como subproceso, apuntando a stubs de
+equipos-service y proveedores-service que corren en este mismo proceso en
+puertos de localhost, con latencia, tamaño de respuesta y tasa de error
+configurables. Para cada escenario lanza un gateway nuevo y mide throughput,
+latencias p50/p95/p99 y la CPU y el RSS pico del proceso del gateway.
+No necesita Docker, Postgres ni red.
+
+Escenarios:
+    proxy       GET /api/equipos/{id} reenviado en streaming (respuesta pequeña)
+    listado     GET /api/equipos reenviado en streaming, sin comprimir
+    compresion  GET /api/equipos comprimido por el gateway (--encoding)
+    cache       GET /api/categorias servido desde la caché del gateway
+    batch       POST /api/batch con --batch-items detalles de equipos y proveedores
+
+Uso:
+    python benchmarks/carga.py --filas 1000 --latencia-ms 5 --tasa-error 0.01
+    python benchmarks/carga.py --escenarios cache batch --peticiones 5000 --concurrencia 64
+"""
+import argparse
+import asyncio
+
+from comun import ProcesoGateway, generar_carga, leer_cpu, leer_memoria, puerto_libre, servir_en_proceso
+from stubs import crear_stub_servicio
+
+SIN_COMPRIMIR = {"Accept-Encoding": "identity"}
+
+
+def escenarios(args) -> dict:
+    """Nombre -> (ruta, método, argumentos de la petición)"""
+    # Lote mixto: detalles de equipos y de proveedores (dos servicios en paralelo)
+    lote = [{"path": f"/api/{'equipos' if i % 2 else 'proveedores'}/{i}"} for i in range(1, args.batch_items + 1)]
+    return {
+        "proxy": ("/api/equipos/7", "GET", {"headers": SIN_COMPRIMIR}),
+        "listado": ("/api/equipos", "GET", {"headers": SIN_COMPRIMIR}),
+        "compresion": ("/api/equipos", "GET", {"headers": {"Accept-Encoding": args.encoding}}),
+        "cache": ("/api/categorias", "GET", {"headers": SIN_COMPRIMIR}),
+        "batch": ("/api/batch", "POST", {"headers": SIN_COMPRIMIR, "json": lote}),
+    }
+
+
+async def medir(nombre: str, escenario: tuple, env: dict, args) -> dict:
+    ruta, metodo, kwargs = escenario
+    with ProcesoGateway(env) as gateway:
+        url = f"{gateway.url}{ruta}"
+        # Calentamiento: carga módulos, abre conexiones y llena la caché
+        await generar_carga(url, args.concurrencia, args.concurrencia, metodo, **kwargs)
+        cpu_inicio = leer_cpu(gateway.pid)
+        resultado = await generar_carga(url, args.peticiones, args.concurrencia, metodo, **kwargs)
+        resultado["cpu_s"] = leer_cpu(gateway.pid) - cpu_inicio
+        resultado.update(leer_memoria(gateway.pid))
+    resultado["escenario"] = nombre
+    return resultado
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escenarios", nargs="+", default=["proxy", "listado", "compresion", "cache", "batch"],
+                        choices=["proxy", "listado", "compresion", "cache", "batch"])
+    parser.add_argument("--filas", type=int, default=1000, help="filas de los listados de los stubs")
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="latencia añadida por los stubs")
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="fracción de respuestas 500 de los stubs")
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--encoding", default="zstd, br, gzip", help="Accept-Encoding del escenario compresion")
+    parser.add_argument("--batch-items", type=int, default=10)
+    args = parser.parse_args()
+
+    puertos = {"equipos": puerto_libre(), "proveedores": puerto_libre()}
+    stubs = [
+        await servir_en_proceso(crear_stub_servicio(nombre, args.filas, args.latencia_ms, args.tasa_error), puerto)
+        for nombre, puerto in puertos.items()
+    ]
+    env = {
+        "EQUIPOS_URL": f"http://127.0.0.1:{puertos['equipos']}",
+        "PROVEEDORES_URL": f"http://127.0.0.1:{puertos['proveedores']}",
+        # Sin coalescencia: cada petición del escenario llega al stub
+        "GATEWAY_COALESCE_ROUTES": "",
+    }
+    print(f"Stubs: {args.filas} filas, {args.latencia_ms} ms de latencia, {args.tasa_error:.1%} de errores")
+
+    resultados = []
+    for nombre, escenario in escenarios(args).items():
+        if nombre in args.escenarios:
+            resultados.append(await medir(nombre, escenario, env, args))
+
+    for stub in stubs:
+        stub.should_exit = True
+    print(f"\n{'escenario':<11} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errores':>8} "
+          f"{'cpu (s)':>8} {'cpu/pet ms':>10} {'rss pico':>9} {'KB/resp':>8}")
+    for r in resultados:
+        print(f"{r['escenario']:<11} {r['rps']:>8.0f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['errores']:>8} {r['cpu_s']:>8.2f} {r['cpu_s'] * 1000 / r['peticiones']:>10.3f} "
+              f"{r['rss_pico_mb']:>9.1f} {r['bytes'] / r['peticiones'] / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
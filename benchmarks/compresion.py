@@ -0,0 +1,86 @@
+"""Benchmark: costo de CPU de la compresión del gateway frente a los bytes ahorrados.
+
+Comprime payloads con la forma real de las respuestas (listados de equipos de
+distinto tamaño, catálogos y el dashboard) con cada algoritmo disponible,
+en trozos de 64 KB como en el modo streaming, y estima cuánto tiempo de
+transferencia se ahorra en enlaces lentos frente a la CPU gastada.
+
+Uso:
+    python benchmarks/compresion.py --niveles
+"""
+import argparse
+import json
+import sys
+import time
+
+from comun import GATEWAY_DIR
+from stubs import filas_equipos
+
+sys.path.insert(0, str(GATEWAY_DIR))
+import compression  # noqa: E402
+
+TROZO = 64 * 1024
+ENLACES_MBPS = (2, 10, 50)
+NIVELES_ALTERNATIVOS = {"gzip": (1, 6, 9), "br": (1, 4, 8), "zstd": (1, 3, 9)}
+
+
+def payloads() -> dict:
+    categorias = [{"id": i, "nombre": n, "descripcion": f"Categoría {n}", "vida_util_anos": 4}
+                  for i, n in enumerate(["Laptops", "Desktops", "Servidores", "Impresoras", "Redes", "Periféricos"], 1)]
+    dashboard = {"total_equipos": 182345, "equipos_operativos": 170001, "equipos_reparacion": 1200,
+                 "tasa_disponibilidad": 93.23, "valor_inventario": 123456789.5,
+                 "mantenimientos_mes": 320, "costo_mantenimiento_mes": 45678.9}
+    return {
+        "categorias": json.dumps(categorias).encode(),
+        "dashboard": json.dumps(dashboard).encode(),
+        "equipos 1k": json.dumps(filas_equipos(1_000)).encode(),
+        "equipos 10k": json.dumps(filas_equipos(10_000)).encode(),
+        "equipos 100k": json.dumps(filas_equipos(100_000)).encode(),
+    }
+
+
+def medir(datos: bytes, encoding: str, repeticiones: int) -> tuple:
+    """(bytes comprimidos, segundos de CPU del mejor intento) comprimiendo en trozos"""
+    mejor = float("inf")
+    salida = 0
+    for _ in range(repeticiones):
+        inicio = time.process_time()
+        compresor = compression.Compresor(encoding)
+        salida = 0
+        for i in range(0, len(datos), TROZO):
+            salida += len(compresor.comprimir(datos[i:i + TROZO]))
+        salida += len(compresor.terminar())
+        mejor = min(mejor, time.process_time() - inicio)
+    return salida, mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--niveles", action="store_true", help="probar también niveles alternativos")
+    args = parser.parse_args()
+
+    print(f"Algoritmos disponibles: {', '.join(compression.DISPONIBLES)} (umbral {compression.MIN_SIZE} bytes)")
+    cabecera = f"{'payload':<14} {'algoritmo':<9} {'original':>11} {'comprimido':>11} {'ratio':>6} {'CPU ms':>8} {'MB/s':>7}"
+    cabecera += "".join(f" {f'ahorro@{m}Mbps':>14}" for m in ENLACES_MBPS)
+    print(cabecera)
+
+    for nombre, datos in payloads().items():
+        for encoding in compression.DISPONIBLES:
+            niveles = NIVELES_ALTERNATIVOS[encoding] if args.niveles else (compression.NIVELES[encoding],)
+            for nivel in niveles:
+                compression.NIVELES[encoding] = nivel
+                comprimido, cpu = medir(datos, encoding, args.repeticiones)
+                ahorrado = len(datos) - comprimido
+                fila = (f"{nombre:<14} {f'{encoding}:{nivel}':<9} {len(datos):>11,} {comprimido:>11,} "
+                        f"{len(datos) / max(comprimido, 1):>6.1f} {cpu * 1000:>8.2f} "
+                        f"{len(datos) / 1e6 / max(cpu, 1e-9):>7.0f}")
+                # Tiempo de transferencia ahorrado menos la CPU gastada (positivo = compensa)
+                for mbps in ENLACES_MBPS:
+                    neto_ms = (ahorrado * 8 / (mbps * 1e6) - cpu) * 1000
+                    fila += f" {neto_ms:>12.1f}ms"
+                print(fila)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Utilidades compartidas por los benchmarks del API Gateway.
+
+No requieren Docker ni Postgres: los servicios se reemplazan por stubs que
+corren en el mismo proceso del benchmark y el gateway se lanza como
+subproceso para poder medir su CPU y memoria por separado.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+RAIZ = Path(__file__).resolve().parent.parent
+GATEWAY_DIR = RAIZ / "services" / "api_gateway"
+
+
+def puerto_libre() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def leer_memoria(pid: int) -> dict:
+    """RSS actual y pico (VmHWM) del proceso en MB, leídos de /proc"""
+    memoria = {"rss_mb": 0.0, "rss_pico_mb": 0.0}
+    with open(f"/proc/{pid}/status") as f:
+        for linea in f:
+            if linea.startswith("VmRSS:"):
+                memoria["rss_mb"] = int(linea.split()[1]) / 1024
+            elif linea.startswith("VmHWM:"):
+                memoria["rss_pico_mb"] = int(linea.split()[1]) / 1024
+    return memoria
+
+
+def leer_cpu(pid: int) -> float:
+    """Segundos de CPU (usuario + sistema) consumidos por el proceso"""
+    with open(f"/proc/{pid}/stat") as f:
+        campos = f.read().rsplit(")", 1)[1].split()
+    return (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def esperar_puerto(port: int, timeout: float = 15.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Nada escucha en el puerto {port} tras {timeout}s")
+
+
+class ProcesoGateway:
+    """Lanza una app ASGI (por defecto el gateway real) en un subproceso uvicorn"""
+
+    def __init__(self, env: dict, app: str = "main:app", app_dir: Path = GATEWAY_DIR, argumentos: tuple = ()):
+        self.port = puerto_libre()
+        # El gateway importa el paquete compartido services/common
+        self.env = {**os.environ, "PYTHONPATH": str(RAIZ / "services"), **env}
+        self.app = app
+        self.app_dir = app_dir
+        self.argumentos = list(argumentos)
+        self.proceso = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def pid(self) -> int:
+        return self.proceso.pid
+
+    def __enter__(self):
+        self.proceso = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", self.app, "--app-dir", str(self.app_dir),
+             "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning", *self.argumentos],
+            env=self.env,
+        )
+        esperar_puerto(self.port)
+        return self
+
+    def __exit__(self, *exc):
+        self.proceso.terminate()
+        try:
+            self.proceso.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proceso.kill()
+
+
+class ProcesoServicio(ProcesoGateway):
+    """Lanza un servicio con su arranque de producción (`python main.py`, common.server)"""
+
+    def __enter__(self):
+        env = {**self.env, "HOST": "127.0.0.1", "PORT": str(self.port)}
+        self.proceso = subprocess.Popen([sys.executable, "main.py"], cwd=self.app_dir, env=env)
+        esperar_puerto(self.port)
+        return self
+
+
+async def servir_en_proceso(app, port: int) -> uvicorn.Server:
+    """Arranca una app ASGI dentro del event loop actual (para los stubs)"""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+async def generar_carga(url: str, total: int, concurrencia: int, metodo: str = "GET", **kwargs) -> dict:
+    """Lanza `total` peticiones con `concurrencia` en vuelo y devuelve latencias y errores.
+
+    El cuerpo de cada respuesta se consume y se descarta en streaming para que
+    la memoria del generador no influya en la medición.
+    """
+    latencias = []
+    errores = 0
+    bytes_recibidos = 0
+    pendientes = iter(range(total))
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+
+    async with httpx.AsyncClient(limits=limites, timeout=120.0) as cliente:
+        async def trabajador():
+            nonlocal errores, bytes_recibidos
+            for _ in pendientes:
+                inicio = time.perf_counter()
+                try:
+                    async with cliente.stream(metodo, url, **kwargs) as respuesta:
+                        async for chunk in respuesta.aiter_raw():
+                            bytes_recibidos += len(chunk)
+                    if respuesta.status_code >= 400:
+                        errores += 1
+                except httpx.HTTPError:
+                    errores += 1
+                latencias.append(time.perf_counter() - inicio)
+
+        inicio_total = time.perf_counter()
+        await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio_total
+
+    return {
+        "peticiones": total,
+        "errores": errores,
+        "duracion_s": duracion,
+        "rps": total / duracion if duracion else 0.0,
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p95_ms": percentil(latencias, 95) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "bytes": bytes_recibidos,
+    }
@@ -0,0 +1,30 @@
+"""Réplica del forward_request original del gateway (bufferiza y re-parsea JSON).
+
+Sólo se usa como línea base "antes" en gateway_streaming.py.
+"""
+import os
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+
+app = FastAPI(title="API Gateway (legacy)")
+EQUIPOS_URL = os.getenv("EQUIPOS_URL", "http://localhost:8001")
+client = httpx.AsyncClient()
+
+
+@app.get("/api/equipos")
+async def get_equipos(request: Request):
+    url = f"{EQUIPOS_URL}/equipos"
+    if request.query_params:
+        url += f"?{request.query_params}"
+    try:
+        response = await client.request(
+            method=request.method,
+            url=url,
+            headers=request.headers,
+            content=await request.body(),
+            timeout=30.0
+        )
+        return response.json()
+    except httpx.ConnectError:
+        raise HTTPException(status_code=503, detail="No se pudo conectar con el servicio equipos")
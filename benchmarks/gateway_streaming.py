@@ -0,0 +1,63 @@
+"""Benchmark: proxy con buffer + re-parseo JSON (antes) vs proxy en streaming (después).
+
+Sirve un listado de GET /equipos de 100k filas desde un stub en proceso y mide,
+para cada variante del gateway, el RSS pico del proceso del gateway, la CPU
+consumida y las latencias p50/p99 vistas por el cliente.
+
+Uso:
+    python benchmarks/gateway_streaming.py --filas 100000 --peticiones 40 --concurrencia 8
+"""
+import argparse
+import asyncio
+
+from comun import ProcesoGateway, generar_carga, leer_cpu, leer_memoria, puerto_libre, servir_en_proceso, RAIZ
+from stubs import crear_stub_equipos
+
+VARIANTES = {
+    "antes (json)": {"app": "gateway_legacy:app", "app_dir": RAIZ / "benchmarks", "env": {}},
+    "buffer": {"env": {"GATEWAY_PROXY_MODE": "buffer"}},
+    "stream": {"env": {"GATEWAY_PROXY_MODE": "stream"}},
+}
+
+
+async def medir(nombre: str, variante: dict, equipos_url: str, args) -> dict:
+    env = {"EQUIPOS_URL": equipos_url, **variante["env"]}
+    opciones = {k: variante[k] for k in ("app", "app_dir") if k in variante}
+    with ProcesoGateway(env, **opciones) as gateway:
+        url = f"{gateway.url}/api/equipos"
+        # Calentamiento: una petición para cargar módulos y abrir conexiones
+        await generar_carga(url, 1, 1)
+        memoria_base = leer_memoria(gateway.pid)
+        cpu_inicio = leer_cpu(gateway.pid)
+        resultado = await generar_carga(url, args.peticiones, args.concurrencia)
+        resultado["cpu_s"] = leer_cpu(gateway.pid) - cpu_inicio
+        resultado.update(leer_memoria(gateway.pid))
+        resultado["rss_base_mb"] = memoria_base["rss_mb"]
+    resultado["variante"] = nombre
+    return resultado
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--peticiones", type=int, default=40)
+    parser.add_argument("--concurrencia", type=int, default=8)
+    args = parser.parse_args()
+
+    port = puerto_libre()
+    print(f"Generando stub de equipos con {args.filas} filas...")
+    stub = await servir_en_proceso(crear_stub_equipos(args.filas), port)
+
+    resultados = []
+    for nombre, variante in VARIANTES.items():
+        resultados.append(await medir(nombre, variante, f"http://127.0.0.1:{port}", args))
+
+    stub.should_exit = True
+    print(f"\n{'variante':<14} {'rss base':>9} {'rss pico':>9} {'cpu (s)':>8} {'p50 ms':>8} {'p99 ms':>8} {'errores':>8}")
+    for r in resultados:
+        print(f"{r['variante']:<14} {r['rss_base_mb']:>9.1f} {r['rss_pico_mb']:>9.1f} {r['cpu_s']:>8.2f} "
+              f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errores']:>8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
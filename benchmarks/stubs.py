@@ -0,0 +1,112 @@
+"""Servicios falsos que imitan las respuestas de los microservicios reales."""
+import asyncio
+import json
+import os
+import random
+from datetime import date, datetime, timedelta
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response
+
+
+def filas_equipos(n: int) -> list:
+    """Genera `n` filas con la misma forma que devuelve GET /equipos"""
+    base = datetime(2024, 1, 1)
+    categorias = ["Laptops", "Desktops", "Servidores", "Impresoras", "Redes", "Periféricos"]
+    estados = ["operativo", "en_reparacion", "obsoleto", "en_almacen"]
+    filas = []
+    for i in range(1, n + 1):
+        filas.append({
+            "id": i,
+            "codigo_inventario": f"INV-{i:07d}",
+            "nombre": f"Equipo de prueba {i}",
+            "marca": "Marca",
+            "modelo": f"Modelo-{i % 50}",
+            "numero_serie": f"SN{i:010d}",
+            "categoria_id": i % 6 + 1,
+            "especificaciones": {"ram_gb": 8 * (i % 4 + 1), "cpu": "Core i5", "disco_gb": 512},
+            "proveedor_id": i % 3 + 1,
+            "fecha_compra": (date(2020, 1, 1) + timedelta(days=i % 1500)).isoformat(),
+            "costo_compra": 1500.0 + i % 700,
+            "fecha_garantia_fin": None,
+            "ubicacion_actual_id": i % 5 + 1,
+            "estado_operativo": estados[i % len(estados)],
+            "estado_fisico": "bueno",
+            "asignado_a_id": None,
+            "notas": "Registrado por el generador de datos de benchmark",
+            "imagen_url": None,
+            "fecha_registro": (base + timedelta(minutes=i)).isoformat(),
+            "categoria_nombre": categorias[i % len(categorias)],
+            "ubicacion_nombre": "Edificio A - Lab 101",
+            "proveedor_nombre": "Tecnología Global S.A.",
+        })
+    return filas
+
+
+def crear_stub_equipos(filas: int) -> FastAPI:
+    """Stub de equipos-service con un listado fijo de `filas` equipos ya serializado"""
+    app = FastAPI()
+    cuerpo = json.dumps(filas_equipos(filas)).encode()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "service": "equipos"}
+
+    @app.get("/equipos")
+    async def equipos():
+        return Response(content=cuerpo, media_type="application/json")
+
+    return app
+
+
+def crear_stub_servicio(nombre: str, filas: int, latencia_ms: float = 0.0, tasa_error: float = 0.0) -> FastAPI:
+    """Stub configurable de un servicio de datos para las pruebas de carga.
+
+    Sirve listados de `filas` equipos, detalles y catálogos, cada respuesta tras
+    `latencia_ms` de espera y con probabilidad `tasa_error` de responder 500.
+    Los cuerpos se serializan una sola vez para que el stub gaste la mínima CPU.
+    """
+    app = FastAPI()
+    listado = filas_equipos(filas)
+    cuerpo_listado = json.dumps(listado).encode()
+    detalles = [json.dumps(fila).encode() for fila in listado[:1000]] or [b"{}"]
+    catalogo = json.dumps([{"id": i, "nombre": f"Elemento {i}", "descripcion": "Catálogo de prueba"}
+                           for i in range(1, 21)]).encode()
+
+    async def simular():
+        if latencia_ms:
+            await asyncio.sleep(latencia_ms / 1000)
+        if tasa_error and random.random() < tasa_error:
+            raise HTTPException(status_code=500, detail="Error simulado")
+
+    def json_response(cuerpo: bytes) -> Response:
+        return Response(content=cuerpo, media_type="application/json")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "service": nombre}
+
+    @app.get("/equipos")
+    @app.get("/proveedores")
+    async def listar():
+        await simular()
+        return json_response(cuerpo_listado)
+
+    @app.get("/equipos/{item_id}")
+    @app.get("/proveedores/{item_id}")
+    async def detalle(item_id: int):
+        await simular()
+        return json_response(detalles[item_id % len(detalles)])
+
+    @app.get("/categorias")
+    @app.get("/ubicaciones")
+    async def catalogos():
+        await simular()
+        return json_response(catalogo)
+
+    return app
+
+
+def app_equipos() -> FastAPI:
+    """Factory para lanzar el stub con `uvicorn stubs:app_equipos --factory` (filas en STUB_FILAS)"""
+    return crear_stub_equipos(int(os.getenv("STUB_FILAS", "1000")))
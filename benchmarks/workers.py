@@ -0,0 +1,81 @@
+"""Benchmark: escalado del throughput del gateway de 1 a N workers.
+
+Lanza el gateway con su arranque de producción (python main.py, WEB_WORKERS,
+uvloop/httptools) delante de un stub de equipos-service con varios workers,
+y mide peticiones por segundo y latencias con cada número de workers. La
+carga sale de varios procesos cliente para que el generador no sea el cuello
+de botella. Las respuestas se piden con gzip y sin coalescencia, de modo que
+cada petición cuesta CPU en el gateway (proxy + compresión).
+
+Uso:
+    python benchmarks/workers.py --workers 1 2 4 --filas 1000 --peticiones 4000
+"""
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from comun import GATEWAY_DIR, ProcesoGateway, ProcesoServicio, generar_carga, RAIZ
+
+
+def cargar(url: str, total: int, concurrencia: int) -> dict:
+    """Carga de un proceso cliente (se ejecuta en un proceso del pool)"""
+    return asyncio.run(generar_carga(url, total, concurrencia, headers={"Accept-Encoding": "gzip"}))
+
+
+def medir(workers: int, equipos_url: str, args) -> dict:
+    env = {
+        "EQUIPOS_URL": equipos_url,
+        "WEB_WORKERS": str(workers),
+        "GATEWAY_COALESCE_ROUTES": "",
+        "GATEWAY_ADMISSION_MAX_CONCURRENT": "10000",
+        "GATEWAY_ADMISSION_MAX_QUEUE": "10000",
+    }
+    with ProcesoServicio(env, app_dir=GATEWAY_DIR) as gateway:
+        url = f"{gateway.url}/api/equipos"
+        por_cliente = args.peticiones // args.clientes
+        with ProcessPoolExecutor(args.clientes) as clientes:
+            # Calentamiento: abre conexiones y carga módulos en todos los workers
+            list(clientes.map(cargar, [url] * args.clientes, [workers * 20] * args.clientes, [workers] * args.clientes))
+            parciales = list(clientes.map(
+                cargar, [url] * args.clientes, [por_cliente] * args.clientes, [args.concurrencia] * args.clientes
+            ))
+
+    # Los clientes corren a la vez: el throughput total es la suma y las
+    # latencias se resumen con el peor proceso (los percentiles no se suman)
+    return {
+        "workers": workers,
+        "rps": sum(p["rps"] for p in parciales),
+        "p50_ms": max(p["p50_ms"] for p in parciales),
+        "p99_ms": max(p["p99_ms"] for p in parciales),
+        "errores": sum(p["errores"] for p in parciales),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--filas", type=int, default=1000)
+    parser.add_argument("--peticiones", type=int, default=4000)
+    parser.add_argument("--clientes", type=int, default=4, help="procesos generadores de carga")
+    parser.add_argument("--concurrencia", type=int, default=16, help="peticiones en vuelo por cliente")
+    parser.add_argument("--stub-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    args = parser.parse_args()
+
+    stub = ProcesoGateway(
+        {"STUB_FILAS": str(args.filas)}, app="stubs:app_equipos", app_dir=RAIZ / "benchmarks",
+        argumentos=("--factory", "--workers", str(args.stub_workers)),
+    )
+    print(f"CPUs: {os.cpu_count()}; stub de equipos con {args.filas} filas y {args.stub_workers} workers")
+    with stub:
+        resultados = [medir(n, stub.url, args) for n in args.workers]
+
+    base = resultados[0]["rps"] or 1
+    print(f"\n{'workers':>8} {'rps':>9} {'escala':>7} {'p50 ms':>8} {'p99 ms':>8} {'errores':>8}")
+    for r in resultados:
+        print(f"{r['workers']:>8} {r['rps']:>9.0f} {r['rps'] / base:>6.2f}x "
+              f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errores']:>8}")
+
+
+if __name__ == "__main__":
+    main()
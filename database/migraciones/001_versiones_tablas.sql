@@ -0,0 +1,33 @@
+-- Migración 001: contadores de versión por tabla para ETags (ver schema.sql)
+
+-- Versión de datos por tabla: cada sentencia que modifica la tabla incrementa su
+-- contador. Los servicios derivan de aquí ETags sin tener que leer los datos.
+CREATE TABLE IF NOT EXISTS versiones_tablas (
+    tabla VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION incrementar_version_tabla() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO versiones_tablas (tabla, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (tabla) DO UPDATE SET version = versiones_tablas.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'proveedores', 'categorias_equipos', 'ubicaciones', 'usuarios', 'equipos',
+        'movimientos_equipos', 'mantenimientos', 'contratos', 'notificaciones'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_version_%1$s ON %1$I', t);
+        EXECUTE format(
+            'CREATE TRIGGER trg_version_%1$s AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %1$I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version_tabla()', t
+        );
+    END LOOP;
+END;
+$$;
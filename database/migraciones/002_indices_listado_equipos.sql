@@ -0,0 +1,13 @@
+-- Migración 002: índices para la paginación por cursor de GET /equipos (ver schema.sql)
+
+-- Índices del listado paginado de equipos: cada orden permitido usa (columna, id)
+-- y se recorre hacia delante o hacia atrás según la dirección
+CREATE INDEX IF NOT EXISTS idx_equipos_fecha_registro_id ON equipos (fecha_registro, id);
+CREATE INDEX IF NOT EXISTS idx_equipos_codigo_id ON equipos (codigo_inventario, id);
+CREATE INDEX IF NOT EXISTS idx_equipos_nombre_id ON equipos (nombre, id);
+CREATE INDEX IF NOT EXISTS idx_equipos_fecha_compra_id ON equipos (fecha_compra, id);
+CREATE INDEX IF NOT EXISTS idx_equipos_costo_id ON equipos (costo_compra, id);
+-- Filtros del listado
+CREATE INDEX IF NOT EXISTS idx_equipos_estado ON equipos (estado_operativo);
+CREATE INDEX IF NOT EXISTS idx_equipos_ubicacion ON equipos (ubicacion_actual_id);
+CREATE INDEX IF NOT EXISTS idx_equipos_categoria ON equipos (categoria_id);
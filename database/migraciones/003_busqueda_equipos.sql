@@ -0,0 +1,17 @@
+-- Migración 003: índices de búsqueda de texto completo y por trigramas de equipos (ver schema.sql)
+
+-- Búsqueda de equipos (GET /equipos/search). Las expresiones deben ser idénticas
+-- a BUSQUEDA_TSV y BUSQUEDA_TEXTO de equipos_service para que se usen los índices.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_equipos_busqueda_tsv ON equipos USING GIN ((
+    setweight(to_tsvector('simple', coalesce(codigo_inventario, '') || ' ' || coalesce(numero_serie, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(nombre, '') || ' ' || coalesce(marca, '') || ' ' || coalesce(modelo, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(notas, '')), 'C')
+));
+
+-- Trigramas: coincidencias parciales (LIKE '%...%') y aproximadas (<%) en código, serie, nombre, marca y modelo
+CREATE INDEX IF NOT EXISTS idx_equipos_busqueda_trgm ON equipos USING GIN ((lower(
+    coalesce(codigo_inventario, '') || ' ' || coalesce(numero_serie, '') || ' ' ||
+    coalesce(nombre, '') || ' ' || coalesce(marca, '') || ' ' || coalesce(modelo, '')
+)) gin_trgm_ops);
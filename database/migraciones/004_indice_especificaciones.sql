@@ -0,0 +1,4 @@
+-- Migración 004: índice GIN para filtrar equipos por especificaciones (ver schema.sql)
+
+-- Filtros de GET /equipos sobre especificaciones (spec.<clave>=...): @> y @? usan este índice
+CREATE INDEX IF NOT EXISTS idx_equipos_especificaciones ON equipos USING GIN (especificaciones jsonb_path_ops);
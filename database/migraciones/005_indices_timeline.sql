@@ -0,0 +1,7 @@
+-- Migración 005: índices de la línea de tiempo de equipos (ver schema.sql)
+
+-- Línea de tiempo y secciones del detalle de un equipo: los eventos de cada
+-- fuente se leen por (equipo_id, fecha, id) en orden descendente
+CREATE INDEX IF NOT EXISTS idx_movimientos_equipo_fecha ON movimientos_equipos (equipo_id, fecha_movimiento, id);
+CREATE INDEX IF NOT EXISTS idx_mantenimientos_equipo_fecha ON mantenimientos (equipo_id, fecha_creacion, id);
+CREATE INDEX IF NOT EXISTS idx_notificaciones_equipo_fecha ON notificaciones (equipo_id, fecha_creacion, id);
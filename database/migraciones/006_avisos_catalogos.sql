@@ -0,0 +1,25 @@
+-- Migración 006: avisos de cambios en los catálogos (ver schema.sql)
+
+-- Cada sentencia que modifica un catálogo envía un aviso al canal "catalogos" con
+-- el nombre de la tabla; equipos_service lo escucha para invalidar su copia en
+-- memoria. Los avisos repetidos en una misma transacción se entregan una sola vez.
+CREATE OR REPLACE FUNCTION notificar_cambio_catalogo() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('catalogos', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['categorias_equipos', 'ubicaciones', 'proveedores', 'usuarios'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_aviso_%1$s ON %1$I', t);
+        EXECUTE format(
+            'CREATE TRIGGER trg_aviso_%1$s AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %1$I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_catalogo()', t
+        );
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,52 @@
+-- Migración 007: feed de cambios por fila (GET /<recurso>/changes, ver schema.sql)
+
+-- actualizado_en y version_fila las mantiene el trigger: version_fila es el id de
+-- la transacción que escribió la fila, y el feed la usa para saber qué filas
+-- cambiaron desde el token del consumidor. Las filas existentes quedan con versión 0.
+CREATE OR REPLACE FUNCTION marcar_cambio_fila() RETURNS trigger AS $$
+BEGIN
+    NEW.actualizado_en := now();
+    NEW.version_fila := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Lápidas de las filas borradas, con la versión de la transacción que las borró
+CREATE TABLE IF NOT EXISTS filas_eliminadas (
+    tabla VARCHAR(63) NOT NULL,
+    fila_id INTEGER NOT NULL,
+    version_fila BIGINT NOT NULL DEFAULT pg_current_xact_id()::text::bigint,
+    eliminado_en TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_filas_eliminadas_version ON filas_eliminadas (tabla, version_fila, fila_id);
+
+CREATE OR REPLACE FUNCTION registrar_eliminaciones() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO filas_eliminadas (tabla, fila_id) SELECT TG_TABLE_NAME, id FROM eliminadas;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['equipos', 'mantenimientos', 'proveedores', 'contratos'] LOOP
+        EXECUTE format(
+            'ALTER TABLE %1$I ADD COLUMN IF NOT EXISTS actualizado_en TIMESTAMPTZ NOT NULL DEFAULT now(), '
+            'ADD COLUMN IF NOT EXISTS version_fila BIGINT NOT NULL DEFAULT 0', t
+        );
+        EXECUTE format('CREATE INDEX IF NOT EXISTS idx_%1$s_version_fila ON %1$I (version_fila, id)', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_cambio_%1$s ON %1$I', t);
+        EXECUTE format(
+            'CREATE TRIGGER trg_cambio_%1$s BEFORE INSERT OR UPDATE ON %1$I '
+            'FOR EACH ROW EXECUTE FUNCTION marcar_cambio_fila()', t
+        );
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_eliminacion_%1$s ON %1$I', t);
+        EXECUTE format(
+            'CREATE TRIGGER trg_eliminacion_%1$s AFTER DELETE ON %1$I REFERENCING OLD TABLE AS eliminadas '
+            'FOR EACH STATEMENT EXECUTE FUNCTION registrar_eliminaciones()', t
+        );
+    END LOOP;
+END;
+$$;
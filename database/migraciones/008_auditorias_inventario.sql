@@ -0,0 +1,24 @@
+-- Migración 008: búsqueda por código y auditorías de inventario físico (ver schema.sql)
+
+-- POST /equipos/lookup y la conciliación buscan también por número de serie
+-- (codigo_inventario ya tiene el índice de su UNIQUE)
+CREATE INDEX IF NOT EXISTS idx_equipos_numero_serie ON equipos (numero_serie);
+
+-- Una sesión de auditoría recorre una ubicación y registra los códigos leídos
+CREATE TABLE IF NOT EXISTS auditorias (
+    id SERIAL PRIMARY KEY,
+    ubicacion_id INTEGER NOT NULL REFERENCES ubicaciones(id),
+    usuario_id INTEGER REFERENCES usuarios(id),
+    estado VARCHAR(20) NOT NULL DEFAULT 'abierta', -- abierta, cerrada
+    notas TEXT,
+    fecha_inicio TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    fecha_cierre TIMESTAMP
+);
+
+-- Códigos leídos (código de inventario o número de serie), sin repetir por sesión
+CREATE TABLE IF NOT EXISTS auditoria_lecturas (
+    auditoria_id INTEGER NOT NULL REFERENCES auditorias(id) ON DELETE CASCADE,
+    codigo VARCHAR(100) NOT NULL,
+    fecha_lectura TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (auditoria_id, codigo)
+);
@@ -0,0 +1,11 @@
+-- Migración 009: índice GiST de trigramas para ordenar la búsqueda de equipos por parecido (ver schema.sql)
+
+-- GET /equipos/search toma las BUSQUEDA_MAX_CANDIDATOS coincidencias más parecidas
+-- con ORDER BY ... <->> término: el GiST las devuelve por distancia sin leer todas.
+-- La expresión debe ser idéntica a BUSQUEDA_TEXTO de equipos_service.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_equipos_busqueda_trgm_gist ON equipos USING GIST ((lower(
+    coalesce(codigo_inventario, '') || ' ' || coalesce(numero_serie, '') || ' ' ||
+    coalesce(nombre, '') || ' ' || coalesce(marca, '') || ' ' || coalesce(modelo, '')
+)) gist_trgm_ops);
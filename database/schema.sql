@@ -113,6 +113,179 @@ CREATE TABLE notificaciones (
     fecha_lectura TIMESTAMP
 );
 
+-- Versión de datos por tabla: cada sentencia que modifica la tabla incrementa su
+-- contador. Los servicios derivan de aquí ETags sin tener que leer los datos.
+CREATE TABLE IF NOT EXISTS versiones_tablas (
+    tabla VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION incrementar_version_tabla() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO versiones_tablas (tabla, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (tabla) DO UPDATE SET version = versiones_tablas.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'proveedores', 'categorias_equipos', 'ubicaciones', 'usuarios', 'equipos',
+        'movimientos_equipos', 'mantenimientos', 'contratos', 'notificaciones'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_version_%1$s ON %1$I', t);
+        EXECUTE format(
+            'CREATE TRIGGER trg_version_%1$s AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %1$I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version_tabla()', t
+        );
+    END LOOP;
+END;
+$$;
+
+-- Índices del listado paginado de equipos: cada orden permitido usa (columna, id)
+-- y se recorre hacia delante o hacia atrás según la dirección
+CREATE INDEX IF NOT EXISTS idx_equipos_fecha_registro_id ON equipos (fecha_registro, id);
+CREATE INDEX IF NOT EXISTS idx_equipos_codigo_id ON equipos (codigo_inventario, id);
+CREATE INDEX IF NOT EXISTS idx_equipos_nombre_id ON equipos (nombre, id);
+CREATE INDEX IF NOT EXISTS idx_equipos_fecha_compra_id ON equipos (fecha_compra, id);
+CREATE INDEX IF NOT EXISTS idx_equipos_costo_id ON equipos (costo_compra, id);
+-- Filtros del listado
+CREATE INDEX IF NOT EXISTS idx_equipos_estado ON equipos (estado_operativo);
+CREATE INDEX IF NOT EXISTS idx_equipos_ubicacion ON equipos (ubicacion_actual_id);
+CREATE INDEX IF NOT EXISTS idx_equipos_categoria ON equipos (categoria_id);
+
+-- Búsqueda de equipos (GET /equipos/search). Las expresiones deben ser idénticas
+-- a BUSQUEDA_TSV y BUSQUEDA_TEXTO de equipos_service para que se usen los índices.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_equipos_busqueda_tsv ON equipos USING GIN ((
+    setweight(to_tsvector('simple', coalesce(codigo_inventario, '') || ' ' || coalesce(numero_serie, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(nombre, '') || ' ' || coalesce(marca, '') || ' ' || coalesce(modelo, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(notas, '')), 'C')
+));
+
+-- Trigramas: coincidencias parciales (LIKE '%...%') y aproximadas (<%) en código, serie, nombre, marca y modelo
+CREATE INDEX IF NOT EXISTS idx_equipos_busqueda_trgm ON equipos USING GIN ((lower(
+    coalesce(codigo_inventario, '') || ' ' || coalesce(numero_serie, '') || ' ' ||
+    coalesce(nombre, '') || ' ' || coalesce(marca, '') || ' ' || coalesce(modelo, '')
+)) gin_trgm_ops);
+
+-- Orden por parecido (ORDER BY ... <->> término): las coincidencias más parecidas sin leer todas
+CREATE INDEX IF NOT EXISTS idx_equipos_busqueda_trgm_gist ON equipos USING GIST ((lower(
+    coalesce(codigo_inventario, '') || ' ' || coalesce(numero_serie, '') || ' ' ||
+    coalesce(nombre, '') || ' ' || coalesce(marca, '') || ' ' || coalesce(modelo, '')
+)) gist_trgm_ops);
+
+-- Filtros de GET /equipos sobre especificaciones (spec.<clave>=...): @> y @? usan este índice
+CREATE INDEX IF NOT EXISTS idx_equipos_especificaciones ON equipos USING GIN (especificaciones jsonb_path_ops);
+
+-- Línea de tiempo y secciones del detalle de un equipo: los eventos de cada
+-- fuente se leen por (equipo_id, fecha, id) en orden descendente
+CREATE INDEX IF NOT EXISTS idx_movimientos_equipo_fecha ON movimientos_equipos (equipo_id, fecha_movimiento, id);
+CREATE INDEX IF NOT EXISTS idx_mantenimientos_equipo_fecha ON mantenimientos (equipo_id, fecha_creacion, id);
+CREATE INDEX IF NOT EXISTS idx_notificaciones_equipo_fecha ON notificaciones (equipo_id, fecha_creacion, id);
+
+-- Cada sentencia que modifica un catálogo envía un aviso al canal "catalogos" con
+-- el nombre de la tabla; equipos_service lo escucha para invalidar su copia en
+-- memoria. Los avisos repetidos en una misma transacción se entregan una sola vez.
+CREATE OR REPLACE FUNCTION notificar_cambio_catalogo() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('catalogos', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['categorias_equipos', 'ubicaciones', 'proveedores', 'usuarios'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_aviso_%1$s ON %1$I', t);
+        EXECUTE format(
+            'CREATE TRIGGER trg_aviso_%1$s AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %1$I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_catalogo()', t
+        );
+    END LOOP;
+END;
+$$;
+
+-- actualizado_en y version_fila las mantiene el trigger: version_fila es el id de
+-- la transacción que escribió la fila, y el feed la usa para saber qué filas
+-- cambiaron desde el token del consumidor. Las filas existentes quedan con versión 0.
+CREATE OR REPLACE FUNCTION marcar_cambio_fila() RETURNS trigger AS $$
+BEGIN
+    NEW.actualizado_en := now();
+    NEW.version_fila := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Lápidas de las filas borradas, con la versión de la transacción que las borró
+CREATE TABLE IF NOT EXISTS filas_eliminadas (
+    tabla VARCHAR(63) NOT NULL,
+    fila_id INTEGER NOT NULL,
+    version_fila BIGINT NOT NULL DEFAULT pg_current_xact_id()::text::bigint,
+    eliminado_en TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_filas_eliminadas_version ON filas_eliminadas (tabla, version_fila, fila_id);
+
+CREATE OR REPLACE FUNCTION registrar_eliminaciones() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO filas_eliminadas (tabla, fila_id) SELECT TG_TABLE_NAME, id FROM eliminadas;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['equipos', 'mantenimientos', 'proveedores', 'contratos'] LOOP
+        EXECUTE format(
+            'ALTER TABLE %1$I ADD COLUMN IF NOT EXISTS actualizado_en TIMESTAMPTZ NOT NULL DEFAULT now(), '
+            'ADD COLUMN IF NOT EXISTS version_fila BIGINT NOT NULL DEFAULT 0', t
+        );
+        EXECUTE format('CREATE INDEX IF NOT EXISTS idx_%1$s_version_fila ON %1$I (version_fila, id)', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_cambio_%1$s ON %1$I', t);
+        EXECUTE format(
+            'CREATE TRIGGER trg_cambio_%1$s BEFORE INSERT OR UPDATE ON %1$I '
+            'FOR EACH ROW EXECUTE FUNCTION marcar_cambio_fila()', t
+        );
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_eliminacion_%1$s ON %1$I', t);
+        EXECUTE format(
+            'CREATE TRIGGER trg_eliminacion_%1$s AFTER DELETE ON %1$I REFERENCING OLD TABLE AS eliminadas '
+            'FOR EACH STATEMENT EXECUTE FUNCTION registrar_eliminaciones()', t
+        );
+    END LOOP;
+END;
+$$;
+
+-- POST /equipos/lookup y la conciliación buscan también por número de serie
+-- (codigo_inventario ya tiene el índice de su UNIQUE)
+CREATE INDEX IF NOT EXISTS idx_equipos_numero_serie ON equipos (numero_serie);
+
+-- Una sesión de auditoría recorre una ubicación y registra los códigos leídos
+CREATE TABLE IF NOT EXISTS auditorias (
+    id SERIAL PRIMARY KEY,
+    ubicacion_id INTEGER NOT NULL REFERENCES ubicaciones(id),
+    usuario_id INTEGER REFERENCES usuarios(id),
+    estado VARCHAR(20) NOT NULL DEFAULT 'abierta', -- abierta, cerrada
+    notas TEXT,
+    fecha_inicio TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    fecha_cierre TIMESTAMP
+);
+
+-- Códigos leídos (código de inventario o número de serie), sin repetir por sesión
+CREATE TABLE IF NOT EXISTS auditoria_lecturas (
+    auditoria_id INTEGER NOT NULL REFERENCES auditorias(id) ON DELETE CASCADE,
+    codigo VARCHAR(100) NOT NULL,
+    fecha_lectura TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (auditoria_id, codigo)
+);
+
 -- Datos Semilla (Seed Data) para pruebas
 INSERT INTO categorias_equipos (nombre, vida_util_anos) VALUES ('Laptops', 4), ('Impresoras', 5), ('Servidores', 7);
 INSERT INTO ubicaciones (edificio, aula_oficina) VALUES ('Edificio A', 'Lab 101'), ('Edificio B', 'Oficina TI');
\ No newline at end of file
@@ -28,32 +28,51 @@ def get_equipos(categoria=None, estado=None):
         st.error(f"Error: {e}")
         return []
 
-def get_categorias():
+def get_equipos_page(categoria=None, estado=None):
+    """Obtiene en una sola llamada al gateway los datos de la página (los pide en paralelo)"""
+    params = {}
+    if categoria:
+        params['categoria'] = categoria
+    if estado:
+        params['estado'] = estado
+    
     try:
-        response = requests.get(f"{API_URL}/api/categorias", timeout=10)
+        response = requests.get(f"{API_URL}/api/bff/equipos-page", params=params, timeout=10)
         if response.status_code == 200:
-            return response.json()
-        return []
-    except:
-        return []
+            return response.json().get("data", {})
+        return {}
+    except Exception as e:
+        st.error(f"Error: {e}")
+        return {}
 
-def get_ubicaciones():
+def buscar_equipos(texto):
+    """Búsqueda en el servidor por código, serie, nombre, marca, modelo o notas"""
     try:
-        response = requests.get(f"{API_URL}/api/ubicaciones", timeout=10)
+        response = requests.get(f"{API_URL}/api/equipos/search", params={"q": texto, "limit": 100}, timeout=10)
         if response.status_code == 200:
-            return response.json()
+            return response.json().get("items", [])
         return []
-    except:
+    except Exception as e:
+        st.error(f"Error: {e}")
         return []
 
+def get_categorias():
+    return pagina.get("categorias", [])
+
+def get_ubicaciones():
+    return pagina.get("ubicaciones", [])
+
 def get_proveedores():
-    try:
-        response = requests.get(f"{API_URL}/api/proveedores", timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        return []
-    except:
-        return []
+    return pagina.get("proveedores", [])
+
+# Los filtros se leen del estado de sesión antes de dibujar los selectbox para
+# pedir toda la página de una vez
+filtro_categoria = st.session_state.get("filtro_categoria", "Todas")
+filtro_estado = st.session_state.get("filtro_estado", "Todos")
+categoria_filtro = filtro_categoria if filtro_categoria != "Todas" else None
+estado_filtro = filtro_estado if filtro_estado != "Todos" else None
+
+pagina = get_equipos_page(categoria=categoria_filtro, estado=estado_filtro)
 
 # Tabs principales
 tab1, tab2, tab3 = st.tabs(["📋 Lista de Equipos", "➕ Nuevo Equipo", "📊 Estadísticas"])
@@ -68,16 +87,13 @@ with tab1:
     cat_nombres = ["Todas"] + [c['nombre'] for c in categorias]
     
     with col1:
-        filtro_categoria = st.selectbox("Categoría", cat_nombres)
+        filtro_categoria = st.selectbox("Categoría", cat_nombres, key="filtro_categoria")
     
     with col2:
-        filtro_estado = st.selectbox("Estado", ["Todos", "operativo", "en_reparacion", "obsoleto", "dado_baja", "en_almacen"])
+        filtro_estado = st.selectbox("Estado", ["Todos", "operativo", "en_reparacion", "obsoleto", "dado_baja", "en_almacen"], key="filtro_estado")
     
     with col3:
-        st.write("")
-        st.write("")
-        if st.button("🔍 Buscar", use_container_width=True):
-            st.rerun()
+        busqueda = st.text_input("Buscar", placeholder="Código, serie, marca, modelo...", key="busqueda")
     
     with col4:
         st.write("")
@@ -85,11 +101,12 @@ with tab1:
         if st.button("🔄 Actualizar", use_container_width=True):
             st.rerun()
     
-    # Obtener equipos con filtros
-    categoria_filtro = filtro_categoria if filtro_categoria != "Todas" else None
-    estado_filtro = filtro_estado if filtro_estado != "Todos" else None
-    
-    equipos = get_equipos(categoria=categoria_filtro, estado=estado_filtro)
+    # Equipos con los filtros actuales (ya vienen en los datos de la página);
+    # con texto de búsqueda se pide al servidor, ordenado por relevancia
+    if len(busqueda.strip()) >= 2:
+        equipos = buscar_equipos(busqueda.strip())
+    else:
+        equipos = pagina.get("equipos", [])
     
     if equipos:
         st.success(f"Se encontraron {len(equipos)} equipos")
@@ -264,7 +281,8 @@ with tab2:
 with tab3:
     st.subheader("Estadísticas de Equipos")
     
-    equipos = get_equipos()
+    # Sin filtros activos, el listado de la página ya es el inventario completo
+    equipos = pagina.get("equipos", []) if not (categoria_filtro or estado_filtro) else get_equipos()
     
     if equipos:
         df = pd.DataFrame(equipos)
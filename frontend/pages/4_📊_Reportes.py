@@ -14,60 +14,37 @@ st.title("📊 Reportes y Análisis")
 st.markdown("---")
 
 # Funciones auxiliares
-def get_dashboard_data():
+def get_reportes_page(year=None):
+    """Obtiene en una sola llamada al gateway todos los reportes de la página (los pide en paralelo)"""
+    params = {"year": year} if year else {}
     try:
-        response = requests.get(f"{API_URL}/api/reportes/dashboard", timeout=10)
+        response = requests.get(f"{API_URL}/api/bff/reportes-page", params=params, timeout=10)
         if response.status_code == 200:
-            return response.json()
-        return None
+            return response.json().get("data", {})
+        return {}
     except:
-        return None
+        return {}
+
+def get_dashboard_data():
+    return pagina.get("dashboard")
 
 def get_equipos_por_ubicacion():
-    try:
-        response = requests.get(f"{API_URL}/api/reportes/equipos-por-ubicacion", timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        return []
-    except:
-        return []
+    return pagina.get("equipos_por_ubicacion", [])
 
 def get_equipos_por_estado():
-    try:
-        response = requests.get(f"{API_URL}/api/reportes/equipos-por-estado", timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        return []
-    except:
-        return []
+    return pagina.get("equipos_por_estado", [])
 
 def get_equipos_por_categoria():
-    try:
-        response = requests.get(f"{API_URL}/api/reportes/equipos-por-categoria", timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        return []
-    except:
-        return []
+    return pagina.get("equipos_por_categoria", [])
 
 def get_costos_mantenimiento(year=None):
-    params = {"year": year} if year else {}
-    try:
-        response = requests.get(f"{API_URL}/api/reportes/costos-mantenimiento", params=params, timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        return []
-    except:
-        return []
+    return pagina.get("costos_mantenimiento", [])
 
 def get_equipos_antiguedad():
-    try:
-        response = requests.get(f"{API_URL}/api/reportes/equipos-antiguedad", timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        return []
-    except:
-        return []
+    return pagina.get("equipos_antiguedad", [])
+
+# El año de costos se lee del estado de sesión para pedir toda la página de una vez
+pagina = get_reportes_page(year=st.session_state.get("year_costos", 2024))
 
 # Tabs principales
 tab1, tab2, tab3, tab4 = st.tabs(["📈 Dashboard", "📊 Gráficos", "📄 Exportar", "🔍 Análisis Avanzado"])
@@ -198,7 +175,7 @@ with tab2:
     # Costos de mantenimiento
     st.markdown("### 💵 Costos de Mantenimiento")
     
-    year_selected = st.selectbox("Seleccionar Año", [2024, 2023, 2022])
+    year_selected = st.selectbox("Seleccionar Año", [2024, 2023, 2022], key="year_costos")
     data_costos = get_costos_mantenimiento(year=year_selected)
     
     if data_costos:
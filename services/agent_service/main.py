@@ -1,20 +1,45 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request, Response
 from typing import List
-import asyncpg
 import os
 from datetime import datetime, date, timedelta
 import asyncio
 
+from common.db import crear_pool, enrutar_lecturas
+from common.etag import calcular_etag, coincide, no_modificado
+from common.metrics import instrumentar
+from common.server import servir
+
 app = FastAPI(title="Agent Service", version="1.0.0")
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Réplica opcional para las lecturas (GET); sin ella todo va a DATABASE_URL
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
 
 # --- CORRECCIÓN: Pool Global ---
 pool = None
 
+# Métricas Prometheus en /metrics (incluye el estado del pool de conexiones)
+instrumentar(app, "agents", pool_getter=lambda: pool)
+enrutar_lecturas(app)
+
+# Una sola ejecución de agentes a la vez, sea un check-* o run-all-agents: el
+# gateway libera su hueco de admisión al recibir la respuesta, y run-all-agents
+# responde antes de terminar el trabajo
+ejecucion_agentes = asyncio.Lock()
+# Referencias a las ejecuciones en segundo plano (el event loop sólo guarda referencias débiles)
+tareas_agentes = set()
+
+async def reservar_ejecucion():
+    """Toma el lock de ejecución o responde 409 si ya hay una en curso"""
+    if ejecucion_agentes.locked():
+        raise HTTPException(status_code=409, detail="Ya hay una ejecución de agentes en curso",
+                            headers={"Retry-After": "30"})
+    # Con el lock libre acquire() no suspende: nadie puede tomarlo entre la comprobación y aquí
+    await ejecucion_agentes.acquire()
+
 @app.on_event("startup")
 async def startup_db():
     global pool
-    pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=10)
+    pool = await crear_pool(DATABASE_URL, dsn_lectura=DATABASE_READ_URL)
 
 @app.on_event("shutdown")
 async def shutdown_db():
@@ -40,6 +65,13 @@ async def crear_notificacion(tipo: str, titulo: str, mensaje: str,
 
 @app.post("/check-maintenance")
 async def check_maintenance_reminders():
+    await reservar_ejecucion()
+    try:
+        return await agente_mantenimiento()
+    finally:
+        ejecucion_agentes.release()
+
+async def agente_mantenimiento():
     notificaciones_generadas = 0
     try:
         hoy = date.today()
@@ -92,6 +124,13 @@ async def check_maintenance_reminders():
 
 @app.post("/check-obsolescence")
 async def check_equipment_obsolescence():
+    await reservar_ejecucion()
+    try:
+        return await agente_obsolescencia()
+    finally:
+        ejecucion_agentes.release()
+
+async def agente_obsolescencia():
     notificaciones_generadas = 0
     try:
         async with pool.acquire() as conn:
@@ -122,7 +161,7 @@ async def check_equipment_obsolescence():
         return {"status": "error", "error": str(e)}
 
 @app.get("/notificaciones")
-async def get_notificaciones(leida: bool = False, limit: int = 50):
+async def get_notificaciones(request: Request, response: Response, leida: bool = False, limit: int = 50):
     query = """
         SELECT n.*, e.codigo_inventario, e.nombre as equipo_nombre
         FROM notificaciones n
@@ -132,19 +171,33 @@ async def get_notificaciones(leida: bool = False, limit: int = 50):
         LIMIT $2
     """
     async with pool.acquire() as conn:
+        etag = await calcular_etag(conn, request, ("notificaciones", "equipos"))
+        if coincide(request, etag):
+            return no_modificado(etag)
+        if etag:
+            response.headers["ETag"] = etag
+
         rows = await conn.fetch(query, leida, limit)
         return [dict(row) for row in rows]
 
 @app.post("/run-all-agents")
-async def run_all_agents(background_tasks: BackgroundTasks):
+async def run_all_agents():
+    await reservar_ejecucion()
+
     async def ejecutar_todos():
-        await check_maintenance_reminders()
-        await check_equipment_obsolescence()
-        # Puedes agregar los otros agentes aquí
-    
-    background_tasks.add_task(ejecutar_todos)
+        try:
+            await agente_mantenimiento()
+            await agente_obsolescencia()
+            # Puedes agregar los otros agentes aquí
+        finally:
+            ejecucion_agentes.release()
+
+    # Tarea propia en vez de BackgroundTasks: si el cliente se desconecta antes
+    # de recibir la respuesta, la ejecución termina igual y libera el lock
+    tarea = asyncio.create_task(ejecutar_todos())
+    tareas_agentes.add(tarea)
+    tarea.add_done_callback(tareas_agentes.discard)
     return {"message": "Agentes ejecutándose en segundo plano"}
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8005)
\ No newline at end of file
+    servir("main:app", 8005)
\ No newline at end of file
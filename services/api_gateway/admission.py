@@ -0,0 +1,272 @@
+"""Control de admisión: límites de concurrencia y de tasa por clase de ruta."""
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+import asyncio
+import ipaddress
+import math
+import os
+import time
+
+from config import desde_env
+
+# Clases de ruta: prefijo de la ruta del gateway -> clase. Lo que no encaja es "default".
+ROUTE_CLASSES = (
+    ("/api/reportes/export/", "export"),
+    ("/api/agents/run-all-agents", "agents"),
+    ("/api/agents/check-", "agents"),
+)
+
+ADMISSION_DEFAULTS = {
+    "max_concurrent": 200,   # peticiones simultáneas de la clase hacia los servicios
+    "max_queue": 200,        # peticiones que pueden esperar turno; el resto recibe 503
+    "queue_timeout": 5.0,    # espera máxima en cola (segundos) antes de un 503
+    "rate": 0.0,             # peticiones por segundo por cliente (0 = sin límite); el exceso recibe 429
+    "burst": None,           # ráfaga permitida por cliente (por defecto max(1, rate))
+}
+
+ADMISSION_DEFAULTS_POR_CLASE = {
+    # Las exportaciones ocupan conexiones de la base de reportes durante segundos
+    "export": {"max_concurrent": 2, "max_queue": 4, "queue_timeout": 15.0, "rate": 0.2, "burst": 3},
+    "agents": {"max_concurrent": 1, "max_queue": 2, "queue_timeout": 5.0, "rate": 1 / 30, "burst": 1},
+}
+
+# Clientes distintos de los que se guarda el bucket de tokens (LRU); además se
+# descartan los que llevan inactivos lo bastante para haberse rellenado
+MAX_CLIENTES = int(os.getenv("GATEWAY_ADMISSION_MAX_CLIENTS", "10000"))
+
+
+def proxies_confiables(valor: str = None) -> tuple:
+    """Redes de GATEWAY_TRUSTED_PROXIES (IPs o CIDR separados por comas) cuyo
+    X-Forwarded-For se acepta. Sin configurar no se confía en ninguna."""
+    if valor is None:
+        valor = os.getenv("GATEWAY_TRUSTED_PROXIES", "")
+    return tuple(ipaddress.ip_network(v.strip(), strict=False) for v in valor.split(",") if v.strip())
+
+
+def _es_confiable(ip: str, confiables: tuple) -> bool:
+    try:
+        direccion = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(direccion in red for red in confiables)
+
+
+def ip_cliente(peer: str, reenviado: str, confiables: tuple) -> str:
+    """IP del cliente para los límites de tasa.
+
+    X-Forwarded-For lo puede escribir cualquiera: sólo se lee si la conexión
+    viene de un proxy confiable, y de derecha a izquierda (cada proxy añade al
+    final) se toma la primera dirección que no es de un proxy confiable.
+    """
+    if not reenviado or not _es_confiable(peer, confiables):
+        return peer
+    for salto in reversed([s.strip() for s in reenviado.split(",") if s.strip()]):
+        if not _es_confiable(salto, confiables):
+            return salto
+    return peer
+
+
+def ruta_valida(ruta: str) -> bool:
+    """Falso si la ruta tiene segmentos ".", ".." o vacíos (salvo una barra final).
+
+    httpx resuelve los puntos al construir la URL del servicio, así que
+    /api/reportes/a/../export/excel se clasificaría como "default" y ejecutaría
+    /reportes/export/excel: esas rutas se rechazan antes de clasificar.
+    """
+    segmentos = ruta.split("/")[1:]
+    if segmentos and segmentos[-1] == "":
+        segmentos.pop()
+    return all(s not in ("", ".", "..") for s in segmentos)
+
+
+@dataclass
+class ClassLimits:
+    max_concurrent: int
+    max_queue: int
+    queue_timeout: float
+    rate: float
+    burst: int
+
+    def __post_init__(self):
+        if self.burst is None:
+            self.burst = max(1, math.ceil(self.rate))
+        # Una configuración imposible se rechaza al arrancar, no petición a petición
+        errores = []
+        if self.max_concurrent < 1:
+            errores.append("MAX_CONCURRENT debe ser al menos 1")
+        if self.max_queue < 0:
+            errores.append("MAX_QUEUE no puede ser negativo")
+        if self.queue_timeout <= 0:
+            errores.append("QUEUE_TIMEOUT debe ser mayor que 0")
+        if self.rate < 0:
+            errores.append("RATE no puede ser negativo")
+        if self.rate > 0 and self.burst < 1:
+            # Con menos de un token en el bucket se rechazaría cada petición
+            errores.append("BURST debe ser al menos 1 si RATE es mayor que 0")
+        if errores:
+            raise ValueError("Configuración de admisión inválida: " + "; ".join(errores))
+
+    @classmethod
+    def desde_env(cls, clase: str) -> "ClassLimits":
+        """Lee GATEWAY_ADMISSION_<CLASE>_<CAMPO>, luego GATEWAY_ADMISSION_<CAMPO>, luego los defaults"""
+        defaults = {**ADMISSION_DEFAULTS, **ADMISSION_DEFAULTS_POR_CLASE.get(clase, {})}
+        try:
+            return desde_env(cls, "GATEWAY_ADMISSION", clase, defaults)
+        except ValueError as e:
+            raise ValueError(f"Clase de admisión {clase}: {e}") from e
+
+
+class Rechazada(Exception):
+    """La petición no se admite; `status` es 429 (tasa) o 503 (sin capacidad)"""
+
+    def __init__(self, status: int, motivo: str, retry_after: int):
+        super().__init__(motivo)
+        self.status = status
+        self.motivo = motivo
+        self.retry_after = retry_after
+
+
+class LimiteConcurrencia:
+    """Semáforo con cola acotada y espera máxima. Al liberar, el hueco pasa
+    directamente al primero de la cola (orden FIFO)."""
+
+    def __init__(self, limites: ClassLimits):
+        self.limites = limites
+        self.activos = 0
+        self._cola = deque()
+
+    @property
+    def esperando(self) -> int:
+        return len(self._cola)
+
+    async def adquirir(self) -> bool:
+        """Devuelve True si tuvo que esperar en cola"""
+        if self.activos < self.limites.max_concurrent and not self._cola:
+            self.activos += 1
+            return False
+        if len(self._cola) >= self.limites.max_queue:
+            raise Rechazada(503, "cola_llena", max(1, math.ceil(self.limites.queue_timeout)))
+
+        turno = asyncio.get_running_loop().create_future()
+        self._cola.append(turno)
+        try:
+            await asyncio.wait_for(turno, self.limites.queue_timeout)
+        except asyncio.TimeoutError:
+            self._quitar(turno)
+            raise Rechazada(503, "espera_agotada", max(1, math.ceil(self.limites.queue_timeout)))
+        except asyncio.CancelledError:
+            # Si el hueco ya se había asignado, se devuelve para el siguiente
+            if turno.done() and not turno.cancelled():
+                self.liberar()
+            else:
+                self._quitar(turno)
+            raise
+        return True
+
+    def _quitar(self, turno):
+        try:
+            self._cola.remove(turno)
+        except ValueError:
+            pass
+
+    def liberar(self):
+        while self._cola:
+            turno = self._cola.popleft()
+            if not turno.done():
+                turno.set_result(None)
+                return
+        self.activos -= 1
+
+
+class TokenBucket:
+    def __init__(self, burst: int):
+        self.tokens = float(burst)
+        self.ultimo = time.monotonic()
+
+    def tomar(self, rate: float, burst: int) -> float:
+        """Consume un token; si no hay, devuelve los segundos hasta el próximo"""
+        ahora = time.monotonic()
+        self.tokens = min(float(burst), self.tokens + (ahora - self.ultimo) * rate)
+        self.ultimo = ahora
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class AdmissionController:
+    def __init__(self, clases: tuple = ROUTE_CLASSES):
+        self.clases = clases
+        nombres = {"default"} | {clase for _, clase in clases}
+        self.limites = {nombre: ClassLimits.desde_env(nombre) for nombre in nombres}
+        self.concurrencia = {nombre: LimiteConcurrencia(l) for nombre, l in self.limites.items()}
+        self._buckets = OrderedDict()  # (cliente, clase) -> TokenBucket
+        # (clase, decisión) -> contador; decisión: admitted, queued, rejected_<motivo>
+        self.decisiones = {}
+
+    def clasificar(self, ruta: str) -> str:
+        for prefijo, clase in self.clases:
+            if ruta.startswith(prefijo):
+                return clase
+        return "default"
+
+    def _contar(self, clase: str, decision: str):
+        clave = (clase, decision)
+        self.decisiones[clave] = self.decisiones.get(clave, 0) + 1
+
+    def _comprobar_tasa(self, clase: str, cliente: str):
+        limites = self.limites[clase]
+        if limites.rate <= 0:
+            return
+        clave = (cliente, clase)
+        bucket = self._buckets.get(clave)
+        if bucket is None:
+            self._purgar()
+            bucket = self._buckets[clave] = TokenBucket(limites.burst)
+            if len(self._buckets) > MAX_CLIENTES:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(clave)
+
+        espera = bucket.tomar(limites.rate, limites.burst)
+        if espera > 0:
+            raise Rechazada(429, "tasa", max(1, math.ceil(espera)))
+
+    def _purgar(self):
+        """Descarta, desde el menos usado, los buckets que ya se habrían rellenado:
+        equivalen a uno nuevo"""
+        ahora = time.monotonic()
+        while self._buckets:
+            (_, clase), bucket = next(iter(self._buckets.items()))
+            limites = self.limites[clase]
+            if ahora - bucket.ultimo < limites.burst / limites.rate:
+                return
+            self._buckets.popitem(last=False)
+
+    async def admitir(self, clase: str, cliente: str):
+        """Comprueba la tasa del cliente y reserva un hueco de concurrencia de la clase.
+
+        Lanza `Rechazada` si no se admite. Si se admite, hay que llamar a `liberar(clase)`.
+        """
+        try:
+            self._comprobar_tasa(clase, cliente)
+            if await self.concurrencia[clase].adquirir():
+                self._contar(clase, "queued")
+        except Rechazada as e:
+            self._contar(clase, f"rejected_{e.motivo}")
+            raise
+        self._contar(clase, "admitted")
+
+    def liberar(self, clase: str):
+        self.concurrencia[clase].liberar()
+
+    def stats(self) -> dict:
+        resultado = {}
+        for nombre, limite in self.concurrencia.items():
+            resultado[nombre] = {
+                "active": limite.activos,
+                "waiting": limite.esperando,
+                "limits": vars(self.limites[nombre]),
+                "decisions": {d: n for (c, d), n in self.decisiones.items() if c == nombre},
+            }
+        return resultado
@@ -0,0 +1,125 @@
+"""Circuit breaker por servicio: corta rápido las llamadas a un servicio caído o colgado."""
+from collections import deque
+from dataclasses import dataclass, fields
+import math
+import time
+
+from config import desde_env
+
+CERRADO = "closed"
+ABIERTO = "open"
+SEMIABIERTO = "half_open"
+
+BREAKER_DEFAULTS = {
+    "window": 20,            # últimas llamadas que se tienen en cuenta
+    "min_calls": 10,         # llamadas mínimas en la ventana antes de poder abrir
+    "error_rate": 0.5,       # proporción de fallos (errores o lentas) que abre el circuito
+    "slow_call_s": 10.0,     # una llamada más lenta que esto cuenta como fallo
+    "half_open_calls": 3,    # llamadas de prueba permitidas en semiabierto
+    "probe_interval": 5.0,   # cada cuánto se prueba /health de los circuitos abiertos
+}
+
+BREAKER_DEFAULTS_POR_SERVICIO = {
+    # Las exportaciones tardan por diseño; sólo se consideran lentas pasado un minuto
+    "reportes": {"slow_call_s": 60.0},
+}
+
+
+@dataclass
+class BreakerConfig:
+    window: int
+    min_calls: int
+    error_rate: float
+    slow_call_s: float
+    half_open_calls: int
+    probe_interval: float
+
+    @classmethod
+    def desde_env(cls, servicio: str) -> "BreakerConfig":
+        """Lee GATEWAY_BREAKER_<SERVICIO>_<CAMPO>, luego GATEWAY_BREAKER_<CAMPO>, luego los defaults"""
+        defaults = {**BREAKER_DEFAULTS, **BREAKER_DEFAULTS_POR_SERVICIO.get(servicio, {})}
+        return desde_env(cls, "GATEWAY_BREAKER", servicio, defaults)
+
+
+class CircuitBreaker:
+    """Cerrado -> abierto por tasa de fallos; abierto -> semiabierto cuando /health
+    responde; semiabierto -> cerrado si las llamadas de prueba van bien (o de
+    vuelta a abierto al primer fallo)."""
+
+    def __init__(self, servicio: str, config: BreakerConfig):
+        self.servicio = servicio
+        self.config = config
+        self.estado = CERRADO
+        self._ventana = deque(maxlen=config.window)  # True = fallo
+        self._pruebas_en_curso = 0
+        self._pruebas_ok = 0
+        self.abierto_desde = None
+        self.aperturas = 0
+        self.rechazadas = 0
+
+    def permitir(self) -> bool:
+        if self.estado == CERRADO:
+            return True
+        if self.estado == SEMIABIERTO and self._pruebas_en_curso < self.config.half_open_calls:
+            self._pruebas_en_curso += 1
+            return True
+        self.rechazadas += 1
+        return False
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.config.probe_interval))
+
+    def registrar(self, exito: bool, duracion: float):
+        fallo = not exito or duracion > self.config.slow_call_s
+
+        if self.estado == SEMIABIERTO:
+            self._pruebas_en_curso = max(0, self._pruebas_en_curso - 1)
+            if fallo:
+                self._abrir()
+                return
+            self._pruebas_ok += 1
+            if self._pruebas_ok >= self.config.half_open_calls:
+                self._cerrar()
+            return
+
+        if self.estado != CERRADO:
+            return
+        self._ventana.append(fallo)
+        if len(self._ventana) >= self.config.min_calls and self.tasa_fallos() >= self.config.error_rate:
+            self._abrir()
+
+    def cancelar(self):
+        """La llamada se abandonó sin resultado (p. ej. el cliente se desconectó)"""
+        if self.estado == SEMIABIERTO:
+            self._pruebas_en_curso = max(0, self._pruebas_en_curso - 1)
+
+    def probe_ok(self):
+        if self.estado == ABIERTO:
+            self.estado = SEMIABIERTO
+            self._pruebas_en_curso = 0
+            self._pruebas_ok = 0
+
+    def tasa_fallos(self) -> float:
+        return sum(self._ventana) / len(self._ventana) if self._ventana else 0.0
+
+    def _abrir(self):
+        self.estado = ABIERTO
+        self.abierto_desde = time.time()
+        self.aperturas += 1
+        self._pruebas_en_curso = 0
+
+    def _cerrar(self):
+        self.estado = CERRADO
+        self.abierto_desde = None
+        self._ventana.clear()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.estado,
+            "failure_rate": round(self.tasa_fallos(), 4),
+            "calls_in_window": len(self._ventana),
+            "open_since": self.abierto_desde,
+            "opened_total": self.aperturas,
+            "rejected_total": self.rechazadas,
+            "config": {f.name: getattr(self.config, f.name) for f in fields(self.config)},
+        }
@@ -0,0 +1,90 @@
+"""Caché LRU con expiración (TTL) para respuestas del gateway."""
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """LRU acotada en número de entradas, con TTL por entrada.
+
+    Cada entrada lleva un `tag` (el servicio del que proviene) para poder
+    invalidar de golpe todo lo de un servicio cuando éste recibe una escritura.
+    La generación por tag evita guardar una respuesta que se pidió antes de
+    una invalidación y llegó después (quedaría obsoleta desde el inicio).
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._datos = OrderedDict()  # clave -> (expira_en, tag, valor)
+        self._generaciones = {}
+        self._invalidada_en = {}  # tag -> instante (monotonic) de su última invalidación
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+    def get(self, clave):
+        entrada = self._datos.get(clave)
+        if entrada is None:
+            self.misses += 1
+            return None
+
+        expira_en, _, valor = entrada
+        if expira_en <= time.monotonic():
+            # La entrada vencida se conserva para poder revalidarla (If-None-Match)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._datos.move_to_end(clave)
+        self.hits += 1
+        return valor
+
+    def get_stale(self, clave):
+        """Devuelve la entrada aunque haya vencido, sin contar hit ni miss"""
+        entrada = self._datos.get(clave)
+        return entrada[2] if entrada is not None else None
+
+    def generacion(self, tag: str) -> int:
+        return self._generaciones.get(tag, 0)
+
+    def set(self, clave, valor, ttl: float, tag: str, generacion: int = None) -> bool:
+        if generacion is not None and generacion != self.generacion(tag):
+            return False
+
+        self._datos[clave] = (time.monotonic() + ttl, tag, valor)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_entries:
+            self._datos.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def desde_invalidacion(self, tag: str) -> float:
+        """Segundos desde la última invalidación de `tag` (infinito si nunca se invalidó)"""
+        instante = self._invalidada_en.get(tag)
+        return float("inf") if instante is None else time.monotonic() - instante
+
+    def invalidar(self, tag: str) -> int:
+        self._generaciones[tag] = self.generacion(tag) + 1
+        self._invalidada_en[tag] = time.monotonic()
+        claves = [clave for clave, (_, t, _) in self._datos.items() if t == tag]
+        for clave in claves:
+            del self._datos[clave]
+        self.invalidations += len(claves)
+        return len(claves)
+
+    def stats(self) -> dict:
+        consultas = self.hits + self.misses
+        return {
+            "entries": len(self._datos),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / consultas, 4) if consultas else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
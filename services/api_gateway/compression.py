@@ -0,0 +1,209 @@
+"""Compresión de respuestas negociada con Accept-Encoding (zstd, brotli, gzip).
+
+brotli y zstd son opcionales: si sus paquetes no están instalados, sólo se
+negocian los algoritmos disponibles.
+"""
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Tamaño mínimo (bytes) a partir del cual compensa comprimir
+MIN_SIZE = int(os.getenv("GATEWAY_COMPRESSION_MIN_SIZE", "1024"))
+
+# Niveles moderados: los máximos cuestan mucha CPU y ganan poco en JSON
+NIVELES = {
+    "zstd": int(os.getenv("GATEWAY_COMPRESSION_ZSTD_LEVEL", "3")),
+    "br": int(os.getenv("GATEWAY_COMPRESSION_BR_LEVEL", "4")),
+    "gzip": int(os.getenv("GATEWAY_COMPRESSION_GZIP_LEVEL", "6")),
+}
+
+# Orden de preferencia del servidor ante pesos q iguales
+DISPONIBLES = tuple(
+    enc for enc, ok in (("zstd", zstandard is not None), ("br", brotli is not None), ("gzip", True)) if ok
+)
+
+TIPOS_COMPRIMIBLES = ("application/json", "application/javascript", "application/xml", "application/x-ndjson")
+
+# Bytes antes y después de comprimir, por algoritmo
+stats = {enc: {"responses": 0, "bytes_in": 0, "bytes_out": 0} for enc in DISPONIBLES}
+
+
+def elegir_encoding(accept_encoding: str):
+    """Algoritmo a usar según Accept-Encoding, o None si no hay ninguno aceptable"""
+    if not accept_encoding:
+        return None
+    pesos = {}
+    for parte in accept_encoding.split(","):
+        token, _, parametros = parte.strip().partition(";")
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        pesos[token.strip().lower()] = q
+
+    comodin = pesos.get("*", 0.0)
+    mejor, mejor_q = None, 0.0
+    for enc in DISPONIBLES:
+        q = pesos.get(enc, comodin)
+        if q > mejor_q:
+            mejor, mejor_q = enc, q
+    return mejor
+
+
+def es_comprimible(content_type: str) -> bool:
+    tipo = content_type.split(";")[0].strip().lower()
+    return tipo.startswith("text/") or tipo in TIPOS_COMPRIMIBLES or tipo.endswith("+json")
+
+
+def etag_debil(etag: bytes) -> bytes:
+    """El cuerpo comprimido es otra representación: no puede compartir el ETag
+    fuerte de la original (RFC 9110, 8.8.3). Se marca como débil; If-None-Match
+    usa comparación débil, así que sigue revalidando contra el servicio."""
+    return etag if etag.startswith(b"W/") else b"W/" + etag
+
+
+def con_vary(headers: list) -> list:
+    """Cabeceras con Accept-Encoding añadido a Vary (una sola cabecera Vary)"""
+    resultado, valores = [], []
+    for clave, valor in headers:
+        if clave.lower() == b"vary":
+            valores += [v.strip() for v in valor.split(b",") if v.strip()]
+        else:
+            resultado.append((clave, valor))
+    if b"*" not in valores and b"accept-encoding" not in (v.lower() for v in valores):
+        valores.append(b"Accept-Encoding")
+    resultado.append((b"vary", b", ".join(valores)))
+    return resultado
+
+
+def representacion_comprimida(headers: list, encoding: str) -> list:
+    """Cabeceras de la variante comprimida: sin Content-Length, con Content-Encoding,
+    Vary y el ETag débil"""
+    resultado = [
+        (k, etag_debil(v) if k.lower() == b"etag" else v)
+        for k, v in headers if k.lower() != b"content-length"
+    ]
+    resultado.append((b"content-encoding", encoding.encode()))
+    return con_vary(resultado)
+
+
+class Compresor:
+    """Compresión incremental para respuestas en streaming"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=NIVELES["zstd"]).compressobj()
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=NIVELES["br"])
+        else:
+            # wbits=31: formato gzip (cabecera y CRC) en lugar de zlib
+            self._obj = zlib.compressobj(NIVELES["gzip"], zlib.DEFLATED, 31)
+        self._stats = stats[encoding]
+        self._stats["responses"] += 1
+
+    def comprimir(self, datos: bytes) -> bytes:
+        self._stats["bytes_in"] += len(datos)
+        salida = self._obj.process(datos) if self.encoding == "br" else self._obj.compress(datos)
+        self._stats["bytes_out"] += len(salida)
+        return salida
+
+    def terminar(self) -> bytes:
+        salida = self._obj.finish() if self.encoding == "br" else self._obj.flush()
+        self._stats["bytes_out"] += len(salida)
+        return salida
+
+
+def comprimir(datos: bytes, encoding: str) -> bytes:
+    compresor = Compresor(encoding)
+    return compresor.comprimir(datos) + compresor.terminar()
+
+
+class CompressionMiddleware:
+    """Middleware ASGI que comprime las respuestas según Accept-Encoding.
+
+    Funciona también en streaming: cada trozo se comprime según llega, sin
+    cargar el cuerpo completo. Las respuestas que ya traen Content-Encoding
+    (p. ej. las precomprimidas de la caché) se dejan tal cual. Toda respuesta
+    comprimible lleva Vary: Accept-Encoding, se comprima o no: una caché
+    intermedia no debe servir la variante sin comprimir a quien acepta gzip ni
+    al revés.
+    """
+
+    def __init__(self, app, min_size: int = MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for clave, valor in scope["headers"]:
+            if clave == b"accept-encoding":
+                accept = valor.decode("latin-1")
+        # HEAD no lleva cuerpo que comprimir, pero sí las mismas cabeceras que GET
+        encoding = None if scope["method"] == "HEAD" else elegir_encoding(accept)
+
+        inicio = None
+        compresor = None
+        directo = False
+
+        async def send_comprimido(message):
+            nonlocal inicio, compresor, directo
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                tipo = headers.get(b"content-type", b"").decode("latin-1")
+                longitud = headers.get(b"content-length")
+                comprimible = b"content-encoding" not in headers and es_comprimible(tipo)
+                if comprimible:
+                    message = {**message, "headers": con_vary(message.get("headers", []))}
+                if (
+                    encoding is None
+                    or not comprimible
+                    or message["status"] in (204, 304)
+                    or (longitud is not None and int(longitud) < self.min_size)
+                ):
+                    directo = True
+                    await send(message)
+                else:
+                    # Se retiene hasta ver el primer trozo del cuerpo
+                    inicio = message
+                return
+
+            if message["type"] != "http.response.body" or directo:
+                await send(message)
+                return
+
+            cuerpo = message.get("body", b"")
+            mas = message.get("more_body", False)
+
+            if compresor is None:
+                if not mas and len(cuerpo) < self.min_size:
+                    directo = True
+                    await send(inicio)
+                    await send(message)
+                    return
+                compresor = Compresor(encoding)
+                await send({**inicio, "headers": representacion_comprimida(inicio.get("headers", []), encoding)})
+
+            datos = compresor.comprimir(cuerpo)
+            if not mas:
+                datos += compresor.terminar()
+            if datos or not mas:
+                await send({"type": "http.response.body", "body": datos, "more_body": mas})
+
+        await self.app(scope, receive, send_comprimido)
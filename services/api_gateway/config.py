@@ -0,0 +1,19 @@
+"""Lectura de configuración por variables de entorno para los módulos del gateway."""
+from dataclasses import fields
+import os
+
+
+def desde_env(cls, prefijo: str, nombre: str, defaults: dict):
+    """Crea un dataclass `cls` leyendo cada campo de <PREFIJO>_<NOMBRE>_<CAMPO>,
+    luego de <PREFIJO>_<CAMPO> y, si no hay ninguna, de `defaults`."""
+    valores = dict(defaults)
+    for campo in fields(cls):
+        clave = campo.name.upper()
+        crudo = os.getenv(f"{prefijo}_{nombre.upper()}_{clave}", os.getenv(f"{prefijo}_{clave}"))
+        if crudo is None:
+            continue
+        if campo.type is bool:
+            valores[campo.name] = crudo.lower() in ("1", "true", "yes")
+        else:
+            valores[campo.name] = campo.type(crudo)
+    return cls(**valores)
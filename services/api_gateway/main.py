@@ -1,10 +1,36 @@
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel
+from typing import Any, List, Optional, Union
+from dataclasses import dataclass, field
+from urllib.parse import unquote, urlencode
+import asyncio
 import httpx
+import json
 import os
-import uvicorn
+import time
+
+from common.metrics import instrumentar
+from common.server import servir
+
+from admission import AdmissionController, Rechazada, ip_cliente, proxies_confiables, ruta_valida
+from breaker import ABIERTO, SEMIABIERTO, BreakerConfig, CircuitBreaker
+from cache import TTLCache
+from compression import CompressionMiddleware, comprimir, elegir_encoding, es_comprimible, MIN_SIZE
+from compression import con_vary, etag_debil, representacion_comprimida
+from compression import stats as compression_stats
+from pools import PoolConfig, ServicePool
+from singleflight import SingleFlight
 
 app = FastAPI(title="API Gateway")
 
+# Métricas Prometheus en /metrics
+registry = instrumentar(app, "api_gateway")
+
+# Compresión negociada (zstd/br/gzip) de las respuestas, también en streaming
+app.add_middleware(CompressionMiddleware)
+
 # Configuración de URLs de microservicios desde variables de entorno
 # Los valores por defecto son para ejecución local, en Docker se sobrescriben con el nombre del servicio
 SERVICES = {
@@ -15,48 +41,477 @@ SERVICES = {
     "agents": os.getenv("AGENTS_URL", "http://localhost:8005"),
 }
 
-client = httpx.AsyncClient()
+# Modo de proxy: "stream" reenvía los bytes tal cual llegan (por defecto),
+# "buffer" espera el cuerpo completo antes de responder (útil para depurar)
+PROXY_MODE = os.getenv("GATEWAY_PROXY_MODE", "stream")
 
-async def forward_request(service_name: str, path: str, request: Request):
+# Cabeceras hop-by-hop (RFC 7230, sección 6.1): son de cada conexión y no se reenvían.
+# "host" lo fija httpx según la URL destino.
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "trailers", "transfer-encoding", "upgrade", "host",
+}
+
+METODOS_ESCRITURA = {"POST", "PUT", "PATCH", "DELETE"}
+
+# --- CACHÉ DE CATÁLOGOS ---
+# Rutas GET del gateway que se cachean. Las escrituras que pasan por el proxy
+# del servicio indicado invalidan sus entradas. TTL 0 desactiva la ruta.
+@dataclass
+class CacheRule:
+    ttl: float
+    servicio: str
+
+CACHE_RULES = {
+    "/api/categorias": CacheRule(float(os.getenv("GATEWAY_CACHE_TTL_CATEGORIAS", "300")), "equipos"),
+    "/api/ubicaciones": CacheRule(float(os.getenv("GATEWAY_CACHE_TTL_UBICACIONES", "300")), "equipos"),
+    "/api/proveedores": CacheRule(float(os.getenv("GATEWAY_CACHE_TTL_PROVEEDORES", "60")), "proveedores"),
+}
+
+cache = TTLCache(max_entries=int(os.getenv("GATEWAY_CACHE_MAX_ENTRIES", "512")))
+
+# Tras una escritura que invalida la caché de un servicio, sus rellenos se piden
+# con X-Read-Primary durante estos segundos: una réplica con retraso devolvería
+# (y la caché guardaría todo el TTL) los datos de antes de la escritura.
+# Conviene igualarlo a DB_READ_STICKY_SECONDS de los servicios.
+LECTURA_PRINCIPAL_TRAS_ESCRITURA = float(os.getenv("GATEWAY_READ_PRIMARY_AFTER_WRITE", "5"))
+
+# --- COALESCENCIA DE GETs CALIENTES ---
+# Rutas (opt-in) cuyos GETs idénticos en vuelo se resuelven con una sola llamada al
+# servicio. La respuesta se lee completa para poder compartirla, así que estas
+# rutas no usan el modo streaming: por defecto sólo el dashboard, que es pequeño
+# y caro de calcular. Los listados (p. ej. /api/equipos) se mantienen en
+# streaming; añadirlos aquí vuelve a cargar cada respuesta entera en memoria.
+COALESCE_ROUTES = {
+    r.strip() for r in os.getenv("GATEWAY_COALESCE_ROUTES", "/api/reportes/dashboard").split(",")
+    if r.strip()
+}
+# Segundos que un GET espera al que ya está en vuelo antes de hacer su propia llamada
+COALESCE_MAX_WAIT = float(os.getenv("GATEWAY_COALESCE_MAX_WAIT", "10"))
+
+coalescer = SingleFlight()
+
+# --- CONTROL DE ADMISIÓN ---
+# Límites de concurrencia y tasa por clase de ruta (exportaciones, agentes, resto);
+# ver admission.py y las variables GATEWAY_ADMISSION_*
+admision = AdmissionController()
+# Proxies (p. ej. el balanceador) cuyo X-Forwarded-For identifica al cliente
+PROXIES_CONFIABLES = proxies_confiables()
+
+# Un pool de conexiones por servicio: un servicio lento (p. ej. exportaciones de
+# reportes) no puede agotar las conexiones que necesitan los demás
+pools = {nombre: ServicePool(nombre, PoolConfig.desde_env(nombre)) for nombre in SERVICES}
+
+# Un circuit breaker por servicio: si un servicio falla o va lento, se responde
+# 503 al instante en vez de esperar al timeout en cada petición
+breakers = {nombre: CircuitBreaker(nombre, BreakerConfig.desde_env(nombre)) for nombre in SERVICES}
+tarea_vigilancia = None
+
+async def vigilar_circuitos():
+    """Prueba /health de los servicios con el circuito abierto y los pasa a semiabierto"""
+    intervalo = min(b.config.probe_interval for b in breakers.values())
+
+    async def probar(nombre: str):
+        try:
+            response = await pools[nombre].client.get(f"{SERVICES[nombre]}/health", timeout=2.0)
+            if response.status_code == 200:
+                breakers[nombre].probe_ok()
+        except httpx.HTTPError:
+            pass
+
+    while True:
+        await asyncio.sleep(intervalo)
+        abiertos = [nombre for nombre, breaker in breakers.items() if breaker.estado == ABIERTO]
+        await asyncio.gather(*(probar(nombre) for nombre in abiertos))
+
+@app.on_event("startup")
+async def startup_vigilancia():
+    global tarea_vigilancia
+    tarea_vigilancia = asyncio.create_task(vigilar_circuitos())
+
+@app.on_event("shutdown")
+async def shutdown_client():
+    if tarea_vigilancia:
+        tarea_vigilancia.cancel()
+    for pool in pools.values():
+        await pool.aclose()
+
+@dataclass
+class RespuestaUpstream:
+    """Respuesta de un servicio leída completa (para caché y agregaciones)"""
+    status_code: int
+    headers: list
+    body: bytes
+    # Cuerpo ya comprimido por algoritmo: en la caché se comprime una sola vez por entrada
+    variantes: dict = field(default_factory=dict)
+
+    @property
+    def etag(self):
+        return dict(self.headers).get(b"etag")
+
+    def comprimible(self) -> bool:
+        headers = dict(self.headers)
+        return (
+            len(self.body) >= MIN_SIZE
+            and b"content-encoding" not in headers
+            and es_comprimible(headers.get(b"content-type", b"").decode("latin-1"))
+        )
+
+    def to_response(self, extra_headers: list = (), encoding: str = None) -> Response:
+        body = self.body
+        headers = [(k, v) for k, v in self.headers if k != b"content-length"]
+        if encoding and self.comprimible():
+            body = self.variantes.get(encoding)
+            if body is None:
+                body = self.variantes[encoding] = comprimir(self.body, encoding)
+            headers = representacion_comprimida(headers, encoding)
+
+        respuesta = Response(content=body, status_code=self.status_code)
+        respuesta.raw_headers = headers + [(b"content-length", str(len(body)).encode())] + list(extra_headers)
+        return respuesta
+
+def filtrar_headers(headers) -> list:
+    """Devuelve las cabeceras end-to-end como lista de pares en bytes"""
+    # Además de las hop-by-hop fijas, se descartan las nombradas en "Connection"
+    conexion = {h.strip().lower() for h in headers.get("connection", "").split(",") if h.strip()}
+    return [
+        (k.lower(), v) for k, v in headers.raw
+        if k.lower().decode("latin-1") not in HOP_BY_HOP_HEADERS
+        and k.lower().decode("latin-1") not in conexion
+    ]
+
+def encoding_de(request: Request):
+    return elegir_encoding(request.headers.get("accept-encoding", ""))
+
+def tiene_cuerpo(request: Request) -> bool:
+    return "content-length" in request.headers or "transfer-encoding" in request.headers
+
+def url_destino(service_name: str, path: str, query: str) -> str:
     base_url = SERVICES.get(service_name)
     if not base_url:
         raise HTTPException(status_code=404, detail="Service not found")
     
     # Construcción de la URL destino
     url = f"{base_url}/{path}"
-    if request.query_params:
-        url += f"?{request.query_params}"
+    if query:
+        url += f"?{query}"
+    return url
 
-    try:
-        # Reenvía el request al microservicio correspondiente
-        response = await client.request(
-            method=request.method,
-            url=url,
-            headers=request.headers,
-            content=await request.body(),
-            timeout=30.0
+def error_upstream(service_name: str, e: Exception) -> HTTPException:
+    """Traduce los errores de red hacia un servicio a HTTPException"""
+    if isinstance(e, httpx.PoolTimeout):
+        return HTTPException(status_code=503, detail=f"Sin conexiones disponibles hacia el servicio {service_name}")
+    if isinstance(e, httpx.ConnectError):
+        return HTTPException(status_code=503, detail=f"No se pudo conectar con el servicio {service_name}")
+    if isinstance(e, httpx.TimeoutException):
+        return HTTPException(status_code=504, detail=f"Tiempo de espera agotado con el servicio {service_name}")
+    return HTTPException(status_code=500, detail=f"Error interno en Gateway: {str(e)}")
+
+async def enviar(service_name: str, upstream_request: httpx.Request) -> httpx.Response:
+    """Envía la petición en modo stream pasando por el circuit breaker del servicio"""
+    breaker = breakers[service_name]
+    if not breaker.permitir():
+        raise HTTPException(
+            status_code=503,
+            detail=f"Servicio {service_name} no disponible temporalmente (circuito abierto)",
+            headers={"Retry-After": str(breaker.retry_after())}
         )
-        # Retorna el JSON directamente
-        return response.json()
-    except httpx.ConnectError:
-        raise HTTPException(status_code=503, detail=f"No se pudo conectar con el servicio {service_name}")
+
+    inicio = time.perf_counter()
+    try:
+        response = await pools[service_name].send(upstream_request)
+    except asyncio.CancelledError:
+        breaker.cancelar()
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error interno en Gateway: {str(e)}")
+        breaker.registrar(False, time.perf_counter() - inicio)
+        raise error_upstream(service_name, e)
+
+    # La latencia es hasta recibir las cabeceras (en streaming el cuerpo llega después)
+    breaker.registrar(response.status_code < 500, time.perf_counter() - inicio)
+    return response
+
+async def leer_respuesta(service_name: str, response: httpx.Response) -> RespuestaUpstream:
+    # Bytes "raw": sin decodificar, para que content-encoding siga siendo válido
+    try:
+        body = b"".join([chunk async for chunk in response.aiter_raw()])
+    finally:
+        await pools[service_name].cerrar(response)
+    return RespuestaUpstream(response.status_code, filtrar_headers(response.headers), body)
+
+async def obtener_buffered(service_name: str, path: str, query: str, headers: list) -> RespuestaUpstream:
+    """GET a un servicio leyendo la respuesta completa, sin compresión de origen"""
+    headers = [(k, v) for k, v in headers if k != b"accept-encoding"]
+    url = url_destino(service_name, path, query)
+    upstream_request = pools[service_name].client.build_request("GET", url, headers=headers)
+    return await leer_respuesta(service_name, await enviar(service_name, upstream_request))
+
+def lee_principal(headers: list) -> bool:
+    """True si la petición exige leer del principal (X-Read-Primary o un X-Read-Primary-Until vigente)"""
+    cabeceras = dict(headers)
+    if cabeceras.get(b"x-read-primary", b"").strip() in (b"1", b"true"):
+        return True
+    try:
+        return float(cabeceras.get(b"x-read-primary-until", b"0")) > time.time()
+    except ValueError:
+        return False
+
+async def obtener_compartido(service_name: str, path: str, ruta: str, query: str, headers: list) -> RespuestaUpstream:
+    """GET buffered coalescido: los GETs idénticos concurrentes comparten una sola llamada"""
+    # Quien pide leer del principal (para ver su propia escritura) no se une a una
+    # llamada en vuelo: pudo salir hacia la réplica, o antes de la escritura
+    if lee_principal(headers):
+        return await obtener_buffered(service_name, path, query, headers)
+    # La clave usa la ruta del gateway y, de las cabeceras, sólo If-None-Match
+    # (un 304 no sirve a quien no mandó validador); el resto no varía la respuesta
+    validador = dict(headers).get(b"if-none-match")
+    return await coalescer.do(
+        ("GET", ruta, query, validador),
+        lambda: obtener_buffered(service_name, path, query, headers),
+        COALESCE_MAX_WAIT
+    )
+
+async def obtener_cacheado(service_name: str, path: str, ruta: str, query: str, headers: list,
+                           regla: CacheRule, forzar: bool = False) -> tuple:
+    """Devuelve (respuesta, estado de caché) para un GET de una ruta cacheable"""
+    clave = ("GET", ruta, query)
+    # Una lectura del principal no se sirve de la caché (pudo llenarse desde la
+    # réplica); su respuesta sí renueva la entrada
+    forzar = forzar or lee_principal(headers)
+    if not forzar:
+        guardada = cache.get(clave)
+        if guardada is not None:
+            return guardada, b"HIT"
+
+    generacion = cache.generacion(regla.servicio)
+    # Las condiciones del cliente no se usan para llenar la caché: si hay una
+    # entrada vencida se revalida con su propio ETag y un 304 la renueva sin
+    # volver a transferir (ni consultar) los datos
+    anterior = None if forzar else cache.get_stale(clave)
+    headers = [(k, v) for k, v in headers if k not in (b"if-none-match", b"if-modified-since")]
+    if anterior is not None and anterior.etag:
+        headers.append((b"if-none-match", anterior.etag))
+    if cache.desde_invalidacion(regla.servicio) < LECTURA_PRINCIPAL_TRAS_ESCRITURA:
+        headers.append((b"x-read-primary", b"1"))
+
+    resultado = await obtener_compartido(service_name, path, ruta, query, headers)
+    if resultado.status_code == 304 and anterior is not None:
+        cache.set(clave, anterior, regla.ttl, regla.servicio, generacion)
+        return anterior, b"REVALIDATED"
+    if resultado.status_code == 200:
+        cache.set(clave, resultado, regla.ttl, regla.servicio, generacion)
+    return resultado, b"BYPASS" if forzar else b"MISS"
+
+def etag_coincide(if_none_match: str, etag: bytes) -> bool:
+    """Comparación débil de If-None-Match con el ETag de una respuesta"""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag.decode("latin-1").removeprefix("W/")
+    return any(e.strip().removeprefix("W/") == etag for e in if_none_match.split(","))
+
+async def responder_con_cache(service_name: str, path: str, request: Request, regla: CacheRule) -> Response:
+    # "Cache-Control: no-cache" del cliente fuerza a ir al servicio (y refresca la entrada)
+    forzar = "no-cache" in request.headers.get("cache-control", "")
+    resultado, estado = await obtener_cacheado(
+        service_name, path, request.url.path, request.url.query,
+        filtrar_headers(request.headers), regla, forzar
+    )
+    # Si el cliente ya tiene esta versión, basta con un 304 desde el gateway
+    if resultado.status_code == 200 and etag_coincide(request.headers.get("if-none-match"), resultado.etag):
+        # El 304 lleva el ETag y el Vary de la variante que recibiría el cliente
+        headers = [(b"etag", resultado.etag), (b"x-cache", estado)]
+        if resultado.comprimible():
+            if encoding_de(request):
+                headers[0] = (b"etag", etag_debil(resultado.etag))
+            headers = con_vary(headers)
+        respuesta = Response(status_code=304)
+        respuesta.raw_headers = headers
+        return respuesta
+    return resultado.to_response([(b"x-cache", estado)], encoding_de(request))
+
+def cliente_id(request: Request) -> str:
+    """Identificador del cliente para los límites de tasa: su IP, o la que indica
+    X-Forwarded-For si la conexión viene de un proxy de GATEWAY_TRUSTED_PROXIES"""
+    peer = request.client.host if request.client else "desconocido"
+    return ip_cliente(peer, request.headers.get("x-forwarded-for"), PROXIES_CONFIABLES)
+
+def validar_ruta(ruta: str):
+    if not ruta_valida(ruta):
+        raise HTTPException(status_code=400, detail="Ruta inválida: contiene segmentos '.', '..' o vacíos")
+
+async def forward_request(service_name: str, path: str, request: Request):
+    # La clase se decide sobre la misma ruta que llega al servicio
+    validar_ruta(request.url.path)
+    clase = admision.clasificar(request.url.path)
+    try:
+        await admision.admitir(clase, cliente_id(request))
+    except Rechazada as e:
+        detalle = "Demasiadas peticiones" if e.status == 429 else "Gateway saturado para esta ruta"
+        raise HTTPException(status_code=e.status, detail=f"{detalle}, reintente más tarde",
+                            headers={"Retry-After": str(e.retry_after)})
+
+    # El hueco se libera al recibir la respuesta del servicio. En las exportaciones
+    # y los check-* de agentes el trabajo ya terminó en ese momento; run-all-agents
+    # responde antes de terminar, así que agent_service limita por su cuenta las
+    # ejecuciones a una (409 mientras hay otra en curso)
+    try:
+        return await proxy_request(service_name, path, request)
+    finally:
+        admision.liberar(clase)
+
+async def proxy_request(service_name: str, path: str, request: Request):
+    regla = CACHE_RULES.get(request.url.path)
+    if request.method == "GET" and regla and regla.ttl > 0:
+        return await responder_con_cache(service_name, path, request, regla)
+
+    if request.method == "GET" and request.url.path in COALESCE_ROUTES and not lee_principal(request.headers.raw):
+        resultado = await obtener_compartido(
+            service_name, path, request.url.path, request.url.query, filtrar_headers(request.headers)
+        )
+        return resultado.to_response(encoding=encoding_de(request))
+
+    # El cuerpo del cliente se reenvía en streaming, sin cargarlo completo en memoria
+    url = url_destino(service_name, path, request.url.query)
+    upstream_request = pools[service_name].client.build_request(
+        method=request.method,
+        url=url,
+        headers=filtrar_headers(request.headers),
+        content=request.stream() if tiene_cuerpo(request) else None
+    )
+
+    # Reenvía el request al microservicio correspondiente
+    response = await enviar(service_name, upstream_request)
+
+    # Cuando el servicio ya respondió, la escritura está hecha: se invalida su caché
+    if request.method in METODOS_ESCRITURA:
+        cache.invalidar(service_name)
+
+    if PROXY_MODE == "buffer":
+        return (await leer_respuesta(service_name, response)).to_response(encoding=encoding_de(request))
+
+    # Se usan los bytes "raw" (sin decodificar gzip, etc.) para que content-length
+    # y content-encoding del servicio sigan siendo válidos para el cliente
+    respuesta = StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        background=BackgroundTask(pools[service_name].cerrar, response)
+    )
+    respuesta.raw_headers = filtrar_headers(response.headers)
+    return respuesta
+
+# --- ESTADO DEL GATEWAY ---
+
+@app.get("/gateway/cache")
+async def cache_stats():
+    return cache.stats()
+
+@app.get("/gateway/coalescing")
+async def coalescing_stats():
+    return coalescer.stats()
+
+@app.get("/gateway/pools")
+async def pools_stats():
+    return {nombre: pool.stats() for nombre, pool in pools.items()}
+
+@registry.collector
+def metricas_gateway():
+    """Estado de caché, coalescencia, pools y circuitos, leído en cada scrape"""
+    estado_circuito = {"closed": 0, SEMIABIERTO: 1, ABIERTO: 2}
+    return [
+        ("gateway_cache_hits_total", "counter", "Aciertos de la caché de catálogos", [({}, cache.hits)]),
+        ("gateway_cache_misses_total", "counter", "Fallos de la caché de catálogos", [({}, cache.misses)]),
+        ("gateway_cache_evictions_total", "counter", "Entradas expulsadas por LRU", [({}, cache.evictions)]),
+        ("gateway_cache_entries", "gauge", "Entradas en la caché", [({}, len(cache))]),
+        ("gateway_compression_bytes_in_total", "counter", "Bytes antes de comprimir por algoritmo",
+         [({"encoding": e}, c["bytes_in"]) for e, c in compression_stats.items()]),
+        ("gateway_compression_bytes_out_total", "counter", "Bytes después de comprimir por algoritmo",
+         [({"encoding": e}, c["bytes_out"]) for e, c in compression_stats.items()]),
+        ("gateway_coalesced_requests_total", "counter", "GETs resueltos con la llamada de otro",
+         [({}, coalescer.coalescidas)]),
+        ("gateway_pool_in_use", "gauge", "Peticiones en curso por servicio",
+         [({"backend": n}, p.en_uso) for n, p in pools.items()]),
+        ("gateway_pool_max_connections", "gauge", "Conexiones máximas del pool por servicio",
+         [({"backend": n}, p.config.max_connections) for n, p in pools.items()]),
+        ("gateway_pool_timeouts_total", "counter", "Peticiones sin conexión libre en el pool",
+         [({"backend": n}, p.pool_timeouts) for n, p in pools.items()]),
+        ("gateway_circuit_state", "gauge", "Estado del circuito: 0 cerrado, 1 semiabierto, 2 abierto",
+         [({"backend": n}, estado_circuito[b.estado]) for n, b in breakers.items()]),
+        ("gateway_circuit_rejected_total", "counter", "Peticiones rechazadas con el circuito abierto",
+         [({"backend": n}, b.rechazadas) for n, b in breakers.items()]),
+        ("gateway_admission_decisions_total", "counter", "Decisiones de admisión por clase de ruta",
+         [({"route_class": c, "decision": d}, n) for (c, d), n in admision.decisiones.items()]),
+        ("gateway_admission_active", "gauge", "Peticiones admitidas en curso por clase de ruta",
+         [({"route_class": c}, l.activos) for c, l in admision.concurrencia.items()]),
+        ("gateway_admission_waiting", "gauge", "Peticiones en cola por clase de ruta",
+         [({"route_class": c}, l.esperando) for c, l in admision.concurrencia.items()]),
+    ]
+
+@app.get("/gateway/admission")
+async def admission_stats():
+    return admision.stats()
+
+@app.get("/gateway/status")
+async def gateway_status():
+    servicios = {
+        nombre: {
+            "url": url,
+            "circuit": breakers[nombre].stats(),
+            "pool": pools[nombre].stats(),
+        }
+        for nombre, url in SERVICES.items()
+    }
+    return {
+        "status": "degraded" if any(b.estado != "closed" for b in breakers.values()) else "healthy",
+        "services": servicios,
+        "cache": cache.stats(),
+        "coalescing": coalescer.stats(),
+    }
 
 # --- PROXIES GENÉRICOS (Capturan cualquier sub-ruta) ---
 
+@app.api_route("/api/equipos", methods=["POST"])
 @app.api_route("/api/equipos/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
-async def equipos_proxy(path: str, request: Request):
+async def equipos_proxy(request: Request, path: str = ""):
     return await forward_request("equipos", f"equipos/{path}" if path else "equipos", request)
 
+@app.api_route("/api/proveedores", methods=["POST"])
 @app.api_route("/api/proveedores/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
-async def proveedores_proxy(path: str, request: Request):
+async def proveedores_proxy(request: Request, path: str = ""):
     return await forward_request("proveedores", f"proveedores/{path}" if path else "proveedores", request)
 
+# Los contratos los atiende proveedores-service
+@app.api_route("/api/contratos", methods=["GET", "POST"])
+@app.api_route("/api/contratos/{path:path}", methods=["GET"])
+async def contratos_proxy(request: Request, path: str = ""):
+    return await forward_request("proveedores", f"contratos/{path}" if path else "contratos", request)
+
+# Los traslados de equipos los atiende equipos-service
+@app.api_route("/api/movimientos", methods=["POST"])
+@app.api_route("/api/movimientos/{path:path}", methods=["POST"])
+async def movimientos_proxy(request: Request, path: str = ""):
+    return await forward_request("equipos", f"movimientos/{path}" if path else "movimientos", request)
+
+# Las auditorías de inventario físico las atiende equipos-service
+@app.api_route("/api/auditorias", methods=["POST"])
+@app.api_route("/api/auditorias/{path:path}", methods=["GET", "POST"])
+async def auditorias_proxy(request: Request, path: str = ""):
+    return await forward_request("equipos", f"auditorias/{path}" if path else "auditorias", request)
+
 @app.api_route("/api/mantenimientos/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
 async def mantenimientos_proxy(path: str, request: Request):
     return await forward_request("mantenimientos", f"mantenimientos/{path}" if path else "mantenimientos", request)
 
+# Reportes y agentes exponen sus rutas en la raíz del servicio
+@app.api_route("/api/reportes/{path:path}", methods=["GET", "POST"])
+async def reportes_proxy(path: str, request: Request):
+    return await forward_request("reportes", path, request)
+
+@app.api_route("/api/agents/{path:path}", methods=["GET", "POST"])
+async def agents_proxy(path: str, request: Request):
+    return await forward_request("agents", path, request)
+
 # --- RUTAS ESPECÍFICAS / ALIAS (Para asegurar compatibilidad con el frontend) ---
 
 # Mantenimientos (Raíz)
@@ -99,5 +554,230 @@ async def run_agents(request: Request):
 async def get_notif(request: Request):
     return await forward_request("agents", "notificaciones", request)
 
+# --- BACKEND-FOR-FRONTEND (una llamada por página de Streamlit) ---
+
+# Timeout por defecto de cada tramo; un tramo lento no retrasa al resto de la página
+BFF_LEG_TIMEOUT = float(os.getenv("GATEWAY_BFF_LEG_TIMEOUT", "5"))
+
+@dataclass
+class BffLeg:
+    service: str
+    path: str
+    ruta: str            # ruta equivalente del gateway: comparte caché y coalescencia con ella
+    params: tuple = ()   # parámetros de la página que se reenvían a este tramo
+    timeout: float = BFF_LEG_TIMEOUT
+
+BFF_PAGES = {
+    "equipos-page": {
+        "equipos": BffLeg("equipos", "equipos", "/api/equipos",
+                          ("categoria", "estado", "ubicacion", "limit", "cursor", "sort", "fields")),
+        "categorias": BffLeg("equipos", "categorias", "/api/categorias"),
+        "ubicaciones": BffLeg("equipos", "ubicaciones", "/api/ubicaciones"),
+        "proveedores": BffLeg("proveedores", "proveedores", "/api/proveedores"),
+    },
+    "reportes-page": {
+        "dashboard": BffLeg("reportes", "dashboard", "/api/reportes/dashboard"),
+        "equipos_por_ubicacion": BffLeg("reportes", "equipos-por-ubicacion", "/api/reportes/equipos-por-ubicacion"),
+        "equipos_por_estado": BffLeg("reportes", "equipos-por-estado", "/api/reportes/equipos-por-estado"),
+        "equipos_por_categoria": BffLeg("reportes", "equipos-por-categoria", "/api/reportes/equipos-por-categoria"),
+        "costos_mantenimiento": BffLeg("reportes", "costos-mantenimiento", "/api/reportes/costos-mantenimiento", ("year",)),
+        "equipos_antiguedad": BffLeg("reportes", "equipos-antiguedad", "/api/reportes/equipos-antiguedad"),
+    },
+}
+
+async def ejecutar_leg(leg: BffLeg, query: str, headers: list) -> bytes:
+    """Obtiene el JSON de un tramo (pasando por caché/coalescencia) como bytes"""
+    regla = CACHE_RULES.get(leg.ruta)
+    if regla and regla.ttl > 0:
+        resultado, _ = await asyncio.wait_for(
+            obtener_cacheado(leg.service, leg.path, leg.ruta, query, headers, regla), leg.timeout
+        )
+    else:
+        resultado = await asyncio.wait_for(
+            obtener_compartido(leg.service, leg.path, leg.ruta, query, headers), leg.timeout
+        )
+
+    if resultado.status_code != 200:
+        raise HTTPException(status_code=502, detail=f"El servicio {leg.service} respondió {resultado.status_code}")
+    tipo = dict(resultado.headers).get(b"content-type", b"")
+    if not tipo.startswith(b"application/json"):
+        raise HTTPException(status_code=502, detail=f"El servicio {leg.service} no devolvió JSON")
+    return resultado.body
+
+def describir_error(error: BaseException, leg: BffLeg) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return f"Tiempo de espera agotado ({leg.timeout}s)"
+    if isinstance(error, HTTPException):
+        return error.detail
+    return str(error) or error.__class__.__name__
+
+@app.get("/api/bff/{pagina}")
+async def bff_page(pagina: str, request: Request):
+    legs = BFF_PAGES.get(pagina)
+    if not legs:
+        raise HTTPException(status_code=404, detail="Página no encontrada")
+
+    # Los validadores del cliente se refieren al documento combinado, no a cada tramo
+    headers = [
+        (k, v) for k, v in filtrar_headers(request.headers)
+        if k not in (b"if-none-match", b"if-modified-since")
+    ]
+    tiempos = {}
+
+    async def medir(nombre: str, leg: BffLeg):
+        query = urlencode([(p, request.query_params[p]) for p in leg.params if p in request.query_params])
+        inicio = time.perf_counter()
+        try:
+            return await ejecutar_leg(leg, query, headers)
+        finally:
+            tiempos[nombre] = round((time.perf_counter() - inicio) * 1000, 1)
+
+    # Todos los tramos en paralelo: la página tarda lo que el tramo más lento
+    resultados = await asyncio.gather(*(medir(n, leg) for n, leg in legs.items()), return_exceptions=True)
+
+    data, errores = [], {}
+    for (nombre, leg), resultado in zip(legs.items(), resultados):
+        if isinstance(resultado, bytes):
+            # El JSON de cada servicio se inserta tal cual, sin parsearlo y re-serializarlo
+            data.append(b'"' + nombre.encode() + b'":' + resultado)
+        else:
+            errores[nombre] = describir_error(resultado, leg)
+
+    cuerpo = b"".join([
+        b'{"data":{', b",".join(data), b'},"errors":', json.dumps(errores).encode(),
+        b',"partial":', b"true" if errores else b"false",
+        b',"timings_ms":', json.dumps(tiempos).encode(), b"}",
+    ])
+    # Sólo se responde error si no se pudo obtener ningún tramo
+    return Response(content=cuerpo, media_type="application/json", status_code=200 if data else 502)
+
+# --- BATCH (varias sub-peticiones en un solo viaje de red) ---
+
+BATCH_MAX_ITEMS = int(os.getenv("GATEWAY_BATCH_MAX_ITEMS", "50"))
+# Sub-peticiones del mismo lote que se despachan a la vez
+BATCH_CONCURRENCY = int(os.getenv("GATEWAY_BATCH_CONCURRENCY", "8"))
+BATCH_ITEM_TIMEOUT = float(os.getenv("GATEWAY_BATCH_ITEM_TIMEOUT", "10"))
+
+# Prefijo de la ruta del gateway -> (servicio, ruta base en el servicio), igual que los proxies
+BATCH_ROUTES = (
+    ("/api/equipos", "equipos", "equipos"),
+    ("/api/categorias", "equipos", "categorias"),
+    ("/api/ubicaciones", "equipos", "ubicaciones"),
+    ("/api/proveedores", "proveedores", "proveedores"),
+    ("/api/contratos", "proveedores", "contratos"),
+    ("/api/movimientos", "equipos", "movimientos"),
+    ("/api/auditorias", "equipos", "auditorias"),
+    ("/api/mantenimientos", "mantenimientos", "mantenimientos"),
+    ("/api/reportes", "reportes", ""),
+    ("/api/agents", "agents", ""),
+)
+
+# Cabeceras del cliente que no se reenvían a las sub-peticiones: describen el lote, no cada item
+BATCH_HEADERS_EXCLUIDAS = {
+    b"content-length", b"content-type", b"accept-encoding", b"if-none-match", b"if-modified-since"
+}
+
+class SubPeticion(BaseModel):
+    method: str = "GET"
+    path: str
+    query: Optional[Union[dict, str]] = None
+    body: Optional[Any] = None
+
+def resolver_ruta(path: str) -> tuple:
+    """Traduce una ruta del gateway a (servicio, ruta en el servicio)"""
+    for prefijo, servicio, base in BATCH_ROUTES:
+        if path == prefijo or path.startswith(prefijo + "/"):
+            resto = path[len(prefijo):].strip("/")
+            return servicio, "/".join(p for p in (base, resto) if p)
+    raise HTTPException(status_code=404, detail=f"Ruta no soportada en batch: {path}")
+
+async def ejecutar_sub(sub: SubPeticion, headers: list, cliente: str) -> RespuestaUpstream:
+    method = sub.method.upper()
+    ruta, _, query = sub.path.partition("?")
+    if isinstance(sub.query, dict):
+        query = urlencode(sub.query, doseq=True)
+    elif sub.query:
+        query = sub.query.lstrip("?")
+    # Antes de clasificar y de las claves de caché: la ruta debe ser la que llega al servicio.
+    # La del item no está decodificada; se comprueba decodificada para ver también los puntos codificados
+    validar_ruta(unquote(ruta))
+    service_name, path = resolver_ruta(ruta)
+
+    # Cada item pasa por la admisión de su clase: un lote no es una forma de saltarse los límites
+    clase = admision.clasificar(ruta)
+    await admision.admitir(clase, cliente)
+    try:
+        if method == "GET":
+            regla = CACHE_RULES.get(ruta)
+            if regla and regla.ttl > 0:
+                resultado, _ = await obtener_cacheado(service_name, path, ruta, query, headers, regla)
+                return resultado
+            if ruta in COALESCE_ROUTES:
+                return await obtener_compartido(service_name, path, ruta, query, headers)
+            return await obtener_buffered(service_name, path, query, headers)
+
+        contenido = None
+        if sub.body is not None:
+            contenido = json.dumps(sub.body).encode()
+            headers = headers + [(b"content-type", b"application/json")]
+        upstream_request = pools[service_name].client.build_request(
+            method, url_destino(service_name, path, query), headers=headers, content=contenido
+        )
+        resultado = await leer_respuesta(service_name, await enviar(service_name, upstream_request))
+        if method in METODOS_ESCRITURA:
+            cache.invalidar(service_name)
+        return resultado
+    finally:
+        admision.liberar(clase)
+
+def cuerpo_item(resultado: RespuestaUpstream) -> bytes:
+    """Cuerpo de un item como JSON: el de los servicios se inserta tal cual"""
+    tipo = dict(resultado.headers).get(b"content-type", b"")
+    if not resultado.body:
+        return b"null"
+    if tipo.startswith(b"application/json"):
+        return resultado.body
+    return json.dumps(resultado.body.decode("utf-8", "replace")).encode()
+
+def error_item(error: BaseException) -> tuple:
+    """(status, detalle) de una sub-petición que no obtuvo respuesta del servicio"""
+    if isinstance(error, HTTPException):
+        return error.status_code, error.detail
+    if isinstance(error, Rechazada):
+        return error.status, "Demasiadas peticiones" if error.status == 429 else "Gateway saturado para esta ruta"
+    if isinstance(error, asyncio.TimeoutError):
+        return 504, f"Tiempo de espera agotado ({BATCH_ITEM_TIMEOUT}s)"
+    return 500, f"Error interno en Gateway: {str(error)}"
+
+@app.post("/api/batch")
+async def batch(peticiones: List[SubPeticion], request: Request):
+    if not peticiones:
+        raise HTTPException(status_code=400, detail="El lote no contiene peticiones")
+    if len(peticiones) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Máximo {BATCH_MAX_ITEMS} peticiones por lote")
+
+    # Las sub-peticiones llevan la identidad del cliente (Authorization, X-Forwarded-For...)
+    headers = [(k, v) for k, v in filtrar_headers(request.headers) if k not in BATCH_HEADERS_EXCLUIDAS]
+    cliente = cliente_id(request)
+    limite = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def despachar(sub: SubPeticion):
+        async with limite:
+            return await asyncio.wait_for(ejecutar_sub(sub, headers, cliente), BATCH_ITEM_TIMEOUT)
+
+    resultados = await asyncio.gather(*(despachar(sub) for sub in peticiones), return_exceptions=True)
+
+    items = []
+    for resultado in resultados:
+        if isinstance(resultado, RespuestaUpstream):
+            status, cuerpo = resultado.status_code, cuerpo_item(resultado)
+        else:
+            status, detalle = error_item(resultado)
+            cuerpo = json.dumps({"detail": detalle}).encode()
+        items.append(b'{"status":' + str(status).encode() + b',"body":' + cuerpo + b"}")
+
+    # Cada item conserva su status; el lote en sí siempre responde 200
+    return Response(content=b'{"results":[' + b",".join(items) + b"]}", media_type="application/json")
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    servir("main:app", 8000)
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""Un cliente httpx (y su pool de conexiones) por cada microservicio."""
+from dataclasses import dataclass
+import logging
+
+import httpx
+
+from config import desde_env
+
+logger = logging.getLogger("api_gateway")
+
+# Valores por defecto de todos los pools; cada servicio puede ajustarlos en
+# POOL_DEFAULTS_POR_SERVICIO y, en despliegue, con variables de entorno
+POOL_DEFAULTS = {
+    "max_connections": 50,
+    "max_keepalive": 20,
+    "keepalive_expiry": 30.0,
+    "connect_timeout": 3.0,
+    "read_timeout": 30.0,
+    "write_timeout": 30.0,
+    "pool_timeout": 5.0,
+    "http2": False,
+}
+
+POOL_DEFAULTS_POR_SERVICIO = {
+    # Las exportaciones de reportes son lentas: más tiempo de lectura, menos conexiones
+    "reportes": {"max_connections": 20, "max_keepalive": 10, "read_timeout": 120.0},
+    "agents": {"max_connections": 10, "max_keepalive": 5},
+}
+
+
+@dataclass
+class PoolConfig:
+    max_connections: int
+    max_keepalive: int
+    keepalive_expiry: float
+    connect_timeout: float
+    read_timeout: float
+    write_timeout: float
+    pool_timeout: float
+    http2: bool
+
+    @classmethod
+    def desde_env(cls, servicio: str) -> "PoolConfig":
+        """Lee GATEWAY_POOL_<SERVICIO>_<CAMPO>, luego GATEWAY_POOL_<CAMPO>, luego los defaults"""
+        defaults = {**POOL_DEFAULTS, **POOL_DEFAULTS_POR_SERVICIO.get(servicio, {})}
+        return desde_env(cls, "GATEWAY_POOL", servicio, defaults)
+
+
+def crear_cliente(servicio: str, config: PoolConfig) -> httpx.AsyncClient:
+    opciones = {
+        "limits": httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        "timeout": httpx.Timeout(
+            connect=config.connect_timeout,
+            read=config.read_timeout,
+            write=config.write_timeout,
+            pool=config.pool_timeout,
+        ),
+    }
+    # HTTP/2 necesita el paquete "h2" y, sobre http:// sin TLS, un servidor que
+    # acepte HTTP/2 con conocimiento previo (uvicorn no lo hace)
+    if config.http2:
+        try:
+            return httpx.AsyncClient(http2=True, **opciones)
+        except ImportError:
+            logger.warning("HTTP/2 pedido para %s pero el paquete 'h2' no está instalado; se usa HTTP/1.1", servicio)
+    return httpx.AsyncClient(**opciones)
+
+
+class ServicePool:
+    """Cliente de un servicio con contadores de uso para detectar saturación.
+
+    `en_uso` cuenta las peticiones desde que se envían hasta que se cierra su
+    respuesta (incluye las que esperan conexión libre en el pool).
+    """
+
+    def __init__(self, servicio: str, config: PoolConfig):
+        self.servicio = servicio
+        self.config = config
+        self.client = crear_cliente(servicio, config)
+        self.en_uso = 0
+        self.pico = 0
+        self.total = 0
+        self.pool_timeouts = 0
+
+    async def send(self, request: httpx.Request) -> httpx.Response:
+        """Envía en modo stream; la respuesta debe cerrarse con `cerrar`"""
+        self.en_uso += 1
+        self.total += 1
+        self.pico = max(self.pico, self.en_uso)
+        try:
+            return await self.client.send(request, stream=True)
+        except httpx.PoolTimeout:
+            self.pool_timeouts += 1
+            self.en_uso -= 1
+            raise
+        except BaseException:
+            self.en_uso -= 1
+            raise
+
+    async def cerrar(self, response: httpx.Response):
+        try:
+            await response.aclose()
+        finally:
+            self.en_uso -= 1
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "in_use": self.en_uso,
+            "peak_in_use": self.pico,
+            "max_connections": self.config.max_connections,
+            "saturation": round(self.en_uso / self.config.max_connections, 4),
+            "requests": self.total,
+            "pool_timeouts": self.pool_timeouts,
+            "http2": self.config.http2,
+            "timeouts": {
+                "connect": self.config.connect_timeout,
+                "read": self.config.read_timeout,
+                "write": self.config.write_timeout,
+                "pool": self.config.pool_timeout,
+            },
+            "keepalive": {
+                "max_connections": self.config.max_keepalive,
+                "expiry": self.config.keepalive_expiry,
+            },
+        }
@@ -0,0 +1,53 @@
+"""Coalescencia de peticiones idénticas en vuelo ("single-flight")."""
+import asyncio
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+
+    La primera llamada (líder) lanza la función como tarea independiente; las
+    que llegan mientras sigue en vuelo esperan ese mismo resultado. Si el
+    cliente del líder se desconecta, la tarea sigue para el resto.
+    """
+
+    def __init__(self):
+        self._en_vuelo = {}
+        self.lideres = 0
+        self.coalescidas = 0
+        self.timeouts = 0
+
+    def _terminar(self, clave, tarea: asyncio.Task):
+        if self._en_vuelo.get(clave) is tarea:
+            del self._en_vuelo[clave]
+        # Marca la excepción como recuperada aunque ya no quede nadie esperando
+        if not tarea.cancelled():
+            tarea.exception()
+
+    async def do(self, clave, funcion, max_wait: float):
+        """Ejecuta `funcion()` o se une a la ejecución en curso para `clave`.
+
+        Quien se une espera como máximo `max_wait` segundos; pasado ese tiempo
+        deja de esperar al líder y hace su propia llamada.
+        """
+        tarea = self._en_vuelo.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(funcion())
+            self._en_vuelo[clave] = tarea
+            tarea.add_done_callback(lambda t: self._terminar(clave, t))
+            self.lideres += 1
+            return await asyncio.shield(tarea)
+
+        self.coalescidas += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(tarea), max_wait)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return await funcion()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._en_vuelo),
+            "leaders": self.lideres,
+            "coalesced": self.coalescidas,
+            "wait_timeouts": self.timeouts,
+        }
@@ -0,0 +1 @@
+"""Código compartido por el gateway y los microservicios."""
@@ -0,0 +1,86 @@
+"""Feed de cambios incremental: GET /<recurso>/changes?since=<token>.
+
+Las tablas con feed (migración 007) llevan dos columnas que mantiene un trigger:
+actualizado_en (fecha de la última modificación) y version_fila (id de la
+transacción que la escribió, pg_current_xact_id). Los borrados dejan una lápida
+en filas_eliminadas con la misma versión.
+
+El token no puede ser simplemente la mayor versión vista: una transacción con
+un id menor puede confirmarse después y sus filas se perderían. Por eso el
+token de la siguiente sincronización es el xmin de la instantánea actual (toda
+transacción anterior ya terminó y sus filas eran visibles en esta lectura).
+Las filas de transacciones entre ese xmin y la última versión vista se pueden
+recibir dos veces: el consumidor debe aplicar los cambios de forma idempotente.
+
+Dentro de una sincronización paginada el token guarda la posición (versión, id)
+de la última fila y el horizonte (xmin) de la primera página, al que vuelve el
+token final.
+"""
+import base64
+import heapq
+import json
+
+import asyncpg
+from fastapi import HTTPException
+
+CAMBIOS_LIMITE_MAXIMO = 5000
+
+
+def codificar_token(version: int, fila_id: int, horizonte: int = None) -> str:
+    crudo = json.dumps([version, fila_id] if horizonte is None else [version, fila_id, horizonte])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def leer_token(token: str) -> tuple:
+    """(versión, id, horizonte o None)"""
+    try:
+        partes = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if len(partes) not in (2, 3) or not all(isinstance(p, int) for p in partes):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Token de cambios inválido")
+    return partes[0], partes[1], partes[2] if len(partes) == 3 else None
+
+
+async def leer_cambios(conn, tabla: str, since: str = None, limit: int = 500) -> dict:
+    """Filas de `tabla` modificadas y borradas desde `since`, en orden de versión.
+
+    Responde {"items": [{"op": "upsert"|"delete", "id", "version", "data"?}],
+    "next_token", "has_more"}. Sin `since` devuelve toda la tabla (sincronización
+    inicial), paginada igual.
+    """
+    version, fila_id, horizonte = leer_token(since) if since else (0, 0, None)
+    try:
+        # Se lee antes que las filas: lo que aquí ya terminó es visible en las consultas siguientes
+        xmin = await conn.fetchval("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        filas = await conn.fetch(
+            f"SELECT * FROM {tabla} WHERE (version_fila, id) > ($1, $2) ORDER BY version_fila, id LIMIT $3",
+            version, fila_id, limit + 1
+        )
+        lapidas = await conn.fetch(
+            """
+            SELECT version_fila, fila_id, eliminado_en FROM filas_eliminadas
+            WHERE tabla = $1 AND (version_fila, fila_id) > ($2, $3)
+            ORDER BY version_fila, fila_id LIMIT $4
+            """,
+            tabla, version, fila_id, limit + 1
+        )
+    except (asyncpg.UndefinedColumnError, asyncpg.UndefinedTableError):
+        raise HTTPException(status_code=503, detail="El feed de cambios necesita la migración 007")
+
+    horizonte = xmin if horizonte is None else min(horizonte, xmin)
+    cambios = heapq.merge(
+        (((f["version_fila"], f["id"]), {"op": "upsert", "id": f["id"], "version": f["version_fila"],
+                                          "data": dict(f)}) for f in filas),
+        (((l["version_fila"], l["fila_id"]), {"op": "delete", "id": l["fila_id"], "version": l["version_fila"],
+                                               "eliminado_en": l["eliminado_en"]}) for l in lapidas),
+        key=lambda cambio: cambio[0],
+    )
+    items = [item for _, item in cambios][:limit + 1]
+
+    if len(items) > limit:
+        items = items[:limit]
+        ultimo = items[-1]
+        return {"items": items, "next_token": codificar_token(ultimo["version"], ultimo["id"], horizonte),
+                "has_more": True}
+    return {"items": items, "next_token": codificar_token(horizonte, 0), "has_more": False}
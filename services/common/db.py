@@ -0,0 +1,301 @@
+"""Acceso a Postgres compartido por los microservicios.
+
+`crear_pool(DATABASE_URL, init=...)` crea el pool asyncpg de un worker con el
+tamaño de common.server, la caché de sentencias preparadas configurada y los
+hooks de inicialización de cada conexión encadenados con el de medición.
+
+Con `dsn_lectura` (DATABASE_READ_URL) devuelve un `Pools`: un pool principal y
+otro de réplica de lectura. `enrutar_lecturas(app)` marca cada petición como
+lectura (GET/HEAD) o escritura y `Pools.acquire()` entrega una conexión de la
+réplica sólo a las lecturas. Para leer lo recién escrito se fuerza el principal
+con la cabecera X-Read-Primary: 1, o devolviendo la cabecera
+X-Read-Primary-Until que acompaña a cada respuesta de escritura (el principal
+se usa hasta ese instante, DB_READ_STICKY_SECONDS después de la escritura). Si
+la réplica no acepta conexiones, las lecturas van al principal y no se vuelve a
+intentar con ella hasta pasados DB_READ_RETRY_SECONDS.
+
+asyncpg prepara y guarda cada texto SQL distinto por conexión, así que la caché
+sólo acierta si la misma forma de consulta produce siempre el mismo texto.
+`Consulta` y `sentencia_update` numeran los parámetros en el orden en que se
+añaden: los mismos filtros (o los mismos campos a actualizar) dan el mismo SQL
+sin importar sus valores.
+
+Variables de entorno:
+    DB_STATEMENT_CACHE_SIZE         sentencias preparadas por conexión (256; 0 la
+                                    desactiva, necesario detrás de PgBouncer en modo
+                                    transacción)
+    DB_STATEMENT_CACHE_LIFETIME     segundos que vive una sentencia en la caché (300)
+    DB_MAX_CACHEABLE_STATEMENT_SIZE tamaño máximo en bytes de una sentencia cacheable (32768)
+    DB_COMMAND_TIMEOUT              timeout por defecto de cada consulta, en segundos (sin límite)
+    DB_SLOW_QUERY_MS                consultas más lentas que esto se registran en el log (500)
+    DB_READ_CONNECT_TIMEOUT         segundos para conectar con la réplica antes de usar el principal (2)
+    DB_READ_RETRY_SECONDS           segundos sin intentar la réplica tras un fallo de conexión (30)
+    DB_READ_STICKY_SECONDS          lecturas al principal tras una escritura, con X-Read-Primary-Until (5)
+"""
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+import asyncpg
+
+from common.server import tamano_pool
+
+logger = logging.getLogger("db")
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+READ_CONNECT_TIMEOUT = float(os.getenv("DB_READ_CONNECT_TIMEOUT", "2"))
+READ_RETRY_SECONDS = float(os.getenv("DB_READ_RETRY_SECONDS", "30"))
+READ_STICKY_SECONDS = float(os.getenv("DB_READ_STICKY_SECONDS", "5"))
+
+# Errores al obtener una conexión de la réplica (red, arranque, credenciales) que hacen usar el principal
+ERRORES_CONEXION = (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError)
+
+# Si la petición en curso puede leer de la réplica (lo decide EnrutarLecturas)
+_lectura = ContextVar("lectura_replica", default=False)
+
+# Las consultas suelen durar menos de un milisegundo: buckets más finos que los HTTP
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Funciones hook(sql, duracion_en_segundos, error) llamadas tras cada consulta
+_hooks_consulta = []
+
+
+def agregar_hook_consulta(funcion):
+    """Registra una función que recibe (sql, duración en segundos, excepción o None) tras cada consulta"""
+    _hooks_consulta.append(funcion)
+    return funcion
+
+
+@lru_cache(maxsize=1024)
+def huella(sql: str) -> str:
+    """Identificador corto y estable de un texto SQL (para etiquetas y logs)"""
+    return hashlib.blake2b(sql.encode(), digest_size=4).hexdigest()
+
+
+def operacion(sql: str) -> str:
+    """Primera palabra de la sentencia: select, insert, update, with..."""
+    partes = sql.split(None, 1)
+    return partes[0].lstrip("(").lower() if partes else ""
+
+
+def _registrar_consulta(registro):
+    # asyncpg llama a los loggers de consultas fuera del camino de la petición
+    if registro.elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning("Consulta lenta %s (%.0f ms): %s", huella(registro.query),
+                       registro.elapsed * 1000, " ".join(registro.query.split()))
+    for funcion in _hooks_consulta:
+        funcion(registro.query, registro.elapsed, registro.exception)
+
+
+async def crear_pool(dsn: str, init=None, dsn_lectura: str = None, conexiones_extra: int = 0, **opciones):
+    """Pool asyncpg de un worker, o `Pools` si se indica una réplica de lectura.
+
+    `init` puede ser una corrutina init(conn) o una lista de ellas; se ejecutan en
+    orden al abrir cada conexión (codecs, SET de sesión...). `conexiones_extra` son
+    las conexiones al principal que el worker abre fuera del pool (p. ej. una de
+    LISTEN): se descuentan del reparto de DB_POOL_MAX_TOTAL. `opciones` se pasan
+    tal cual a asyncpg.create_pool y tienen prioridad sobre la configuración.
+    """
+    hooks = list(init) if isinstance(init, (list, tuple)) else [init] if init else []
+
+    async def iniciar(conn):
+        conn.add_query_logger(_registrar_consulta)
+        for hook in hooks:
+            await hook(conn)
+
+    timeout = os.getenv("DB_COMMAND_TIMEOUT")
+    configuracion = {
+        **tamano_pool(conexiones_extra),
+        "statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256")),
+        "max_cached_statement_lifetime": int(os.getenv("DB_STATEMENT_CACHE_LIFETIME", "300")),
+        "max_cacheable_statement_size": int(os.getenv("DB_MAX_CACHEABLE_STATEMENT_SIZE", "32768")),
+        "command_timeout": float(timeout) if timeout else None,
+        "init": iniciar,
+    }
+    configuracion.update(opciones)
+    principal = await asyncpg.create_pool(dsn, **configuracion)
+    if not dsn_lectura:
+        return principal
+    # min_size=0: la réplica no se conecta al crear el pool, así un servicio
+    # arranca aunque esté caída y el fallo aparece (y se resuelve) en acquire()
+    # Las conexiones fuera del pool son al principal: la réplica recibe el reparto completo
+    lectura = await asyncpg.create_pool(
+        dsn_lectura, **{**configuracion, **tamano_pool(), "min_size": 0, "timeout": READ_CONNECT_TIMEOUT}
+    )
+    return Pools(principal, lectura)
+
+
+class Pools:
+    """Pool principal y pool de réplica, con la misma interfaz acquire()/close() que un pool"""
+
+    def __init__(self, principal, lectura):
+        self.principal = principal
+        self.lectura = lectura
+        # Instante (monotonic) hasta el que no se intenta la réplica tras un fallo
+        self._reintento = 0.0
+        self.lecturas_en_principal = 0
+        # id() de las conexiones de la réplica entregadas y aún no devueltas
+        self._de_lectura = set()
+
+    def por_rol(self) -> dict:
+        return {"primary": self.principal, "replica": self.lectura}
+
+    def es_lectura(self, conn) -> bool:
+        """True si `conn` (obtenida con acquire()) es de la réplica"""
+        return id(conn) in self._de_lectura
+
+    @asynccontextmanager
+    async def acquire(self):
+        pool = self.principal
+        conn = None
+        if _lectura.get():
+            if time.monotonic() >= self._reintento:
+                try:
+                    conn = await self.lectura.acquire()
+                    pool = self.lectura
+                    self._de_lectura.add(id(conn))
+                except ERRORES_CONEXION as e:
+                    self._reintento = time.monotonic() + READ_RETRY_SECONDS
+                    logger.warning("Réplica de lectura no disponible (%s); se usa el principal %.0fs",
+                                   e, READ_RETRY_SECONDS)
+            if conn is None:
+                self.lecturas_en_principal += 1
+        if conn is None:
+            conn = await self.principal.acquire()
+        try:
+            yield conn
+        finally:
+            self._de_lectura.discard(id(conn))
+            await pool.release(conn)
+
+    async def close(self):
+        await asyncio.gather(self.principal.close(), self.lectura.close())
+
+
+class EnrutarLecturas:
+    """Middleware ASGI: decide si cada petición puede leer de la réplica.
+
+    Son lecturas GET, HEAD y las rutas de `rutas_lectura` (POST que sólo leen,
+    como las exportaciones de reportes), salvo que la petición fuerce el
+    principal. Las demás respuestas llevan X-Read-Primary-Until.
+    """
+
+    def __init__(self, app, rutas_lectura: tuple = ()):
+        self.app = app
+        self.rutas_lectura = set(rutas_lectura)
+
+    @staticmethod
+    def _fuerza_principal(headers: dict) -> bool:
+        if headers.get(b"x-read-primary", b"").strip() in (b"1", b"true"):
+            return True
+        try:
+            return float(headers.get(b"x-read-primary-until", b"0")) > time.time()
+        except ValueError:
+            return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        lectura = scope["method"] in ("GET", "HEAD") or scope["path"] in self.rutas_lectura
+        token = _lectura.set(lectura and not self._fuerza_principal(dict(scope["headers"])))
+        try:
+            if lectura:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_con_token(message):
+                if message["type"] == "http.response.start":
+                    hasta = f"{time.time() + READ_STICKY_SECONDS:.3f}".encode()
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"x-read-primary-until", hasta)]}
+                await send(message)
+
+            await self.app(scope, receive, send_con_token)
+        finally:
+            _lectura.reset(token)
+
+
+def enrutar_lecturas(app, rutas_lectura: tuple = ()):
+    """Envía las lecturas de `app` a la réplica cuando el servicio tiene DATABASE_READ_URL"""
+    app.add_middleware(EnrutarLecturas, rutas_lectura=rutas_lectura)
+
+
+class Consulta:
+    """Parámetros y condiciones WHERE de una consulta construida por partes.
+
+    `param(valor)` añade un parámetro y devuelve su marcador ($n, con el tipo si
+    se indica); `donde(condicion, *valores)` añade una condición AND en la que
+    cada "{}" se sustituye por el marcador del valor correspondiente:
+
+        consulta = Consulta()
+        consulta.donde("e.estado_operativo = {}", estado)
+        sql = f"SELECT ... FROM equipos e{consulta.where} LIMIT {consulta.param(limit)}"
+        await conn.fetch(sql, *consulta.params)
+    """
+
+    def __init__(self, params: list = None):
+        self.params = list(params or [])
+        self.condiciones = []
+
+    def param(self, valor, tipo: str = None) -> str:
+        self.params.append(valor)
+        return f"${len(self.params)}::{tipo}" if tipo else f"${len(self.params)}"
+
+    def formatear(self, plantilla: str, *valores) -> str:
+        partes = plantilla.split("{}")
+        if len(partes) != len(valores) + 1:
+            raise ValueError(f"La plantilla espera {len(partes) - 1} valores y recibió {len(valores)}")
+        return partes[0] + "".join(self.param(v) + parte for v, parte in zip(valores, partes[1:]))
+
+    def donde(self, condicion: str, *valores) -> "Consulta":
+        self.condiciones.append(self.formatear(condicion, *valores))
+        return self
+
+    @property
+    def where(self) -> str:
+        """Cláusula WHERE (con el espacio inicial) o cadena vacía si no hay condiciones"""
+        return " WHERE " + " AND ".join(self.condiciones) if self.condiciones else ""
+
+
+def sentencia_update(tabla: str, campos: dict, clave: str, valor_clave, tipos: dict = None) -> tuple:
+    """(sql, params) de un UPDATE de las columnas de `campos` en la fila `clave` = `valor_clave`.
+
+    Las columnas van en el orden del dict (el de los campos del modelo con
+    model_dump), así cada combinación de campos produce un único texto SQL.
+    `tipos` añade un cast a las columnas que lo necesitan ({"especificaciones": "jsonb"}).
+    """
+    consulta = Consulta()
+    tipos = tipos or {}
+    asignaciones = ", ".join(f"{columna} = {consulta.param(valor, tipos.get(columna))}"
+                             for columna, valor in campos.items())
+    sql = f"UPDATE {tabla} SET {asignaciones} WHERE {clave} = {consulta.param(valor_clave)}"
+    return sql, consulta.params
+
+
+def instrumentar_consultas(registry):
+    """Histograma de duración y contador de errores de las consultas en el registro de métricas.
+
+    Las etiquetas son la operación y la huella del SQL: con consultas canónicas
+    hay una serie por forma de consulta, y el log de consultas lentas muestra el
+    texto completo de cada huella.
+    """
+    duracion = registry.histogram(
+        "db_query_duration_seconds", "Duración de las consultas a Postgres", ("operation", "query"),
+        QUERY_BUCKETS
+    )
+    errores = registry.counter("db_query_errors_total", "Consultas a Postgres que fallaron", ("operation", "query"))
+
+    def observar(sql: str, segundos: float, error):
+        etiquetas = (operacion(sql), huella(sql))
+        duracion.observe(etiquetas, segundos)
+        if error is not None:
+            errores.inc(etiquetas)
+
+    agregar_hook_consulta(observar)
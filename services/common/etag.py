@@ -0,0 +1,47 @@
+"""ETags fuertes derivados de la versión de datos de cada tabla (tabla versiones_tablas).
+
+Calcular el ETag cuesta una consulta a una tabla de pocas filas, así que un
+If-None-Match que coincide se responde con 304 sin ejecutar la consulta real.
+"""
+import hashlib
+
+import asyncpg
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+async def version_datos(conn, tablas: tuple) -> str:
+    filas = await conn.fetch(
+        "SELECT tabla, version FROM versiones_tablas WHERE tabla = ANY($1::text[])", list(tablas)
+    )
+    versiones = {fila["tabla"]: fila["version"] for fila in filas}
+    return ".".join(str(versiones.get(tabla, 0)) for tabla in tablas)
+
+
+async def calcular_etag(conn, request: Request, tablas: tuple):
+    """ETag de la respuesta a `request` según la versión de las tablas que lee.
+
+    Devuelve None si la base aún no tiene la tabla versiones_tablas (migración
+    001 sin aplicar); en ese caso la respuesta simplemente no lleva ETag.
+    """
+    try:
+        version = await version_datos(conn, tablas)
+    except asyncpg.UndefinedTableError:
+        return None
+    parametros = sorted(request.query_params.multi_items())
+    firma = f"{request.url.path}?{parametros}|{version}"
+    return '"' + hashlib.blake2b(firma.encode(), digest_size=12).hexdigest() + '"'
+
+
+def coincide(request: Request, etag) -> bool:
+    """If-None-Match usa comparación débil: W/"x" coincide con "x" """
+    valor = request.headers.get("if-none-match")
+    if not valor or etag is None:
+        return False
+    if valor.strip() == "*":
+        return True
+    return any(e.strip().removeprefix("W/") == etag for e in valor.split(","))
+
+
+def no_modificado(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
@@ -0,0 +1,273 @@
+"""Métricas en formato de texto de Prometheus, compartidas por todos los servicios.
+
+`instrumentar(app, "equipos", pool_getter=lambda: pool)` monta el middleware que
+mide cada petición y expone GET /metrics; con `pool_getter` añade también el
+estado del pool y la duración de cada consulta (common.db).
+
+El registro está pensado para que el scrape sea barato aunque haya miles de
+combinaciones de etiquetas: el texto de las etiquetas de cada serie se formatea
+una sola vez al crearla y en cada scrape sólo se formatean los números.
+"""
+from bisect import bisect_left
+import time
+
+from starlette.responses import Response
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Límites de los buckets de latencia, en segundos
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Tope de series por métrica; las combinaciones nuevas por encima se agrupan en
+# una serie "__overflow__" para que un cliente no pueda disparar la memoria
+MAX_SERIES = 5000
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def formatear_labels(nombres: tuple, valores: tuple) -> str:
+    if not nombres:
+        return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)) + "}"
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, labels: tuple = (), constantes: dict = None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        constantes = constantes or {}
+        self.labels = tuple(constantes) + tuple(labels)
+        self._constantes = tuple(constantes.values())
+        self._series = {}  # valores de etiquetas -> [texto de etiquetas, estado]
+
+    def _serie(self, valores: tuple):
+        serie = self._series.get(valores)
+        if serie is None:
+            if len(self._series) >= MAX_SERIES:
+                valores = ("__overflow__",) * len(valores)
+                serie = self._series.get(valores)
+                if serie is not None:
+                    return serie
+            serie = [formatear_labels(self.labels, self._constantes + valores), self._nuevo_estado()]
+            self._series[valores] = serie
+        return serie
+
+    def _nuevo_estado(self):
+        return 0.0
+
+    def cabecera(self) -> list:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Counter(_Metrica):
+    tipo = "counter"
+
+    def inc(self, valores: tuple = (), cantidad: float = 1.0):
+        self._serie(valores)[1] += cantidad
+
+    def render(self, lineas: list):
+        lineas.extend(self.cabecera())
+        for texto, valor in self._series.values():
+            lineas.append(f"{self.nombre}{texto} {_numero(valor)}")
+
+
+class Gauge(Counter):
+    tipo = "gauge"
+
+    def set(self, valores: tuple, valor: float):
+        self._serie(valores)[1] = valor
+
+    def dec(self, valores: tuple = (), cantidad: float = 1.0):
+        self._serie(valores)[1] -= cantidad
+
+
+class Histogram(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, labels: tuple = (), constantes: dict = None,
+                 buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(nombre, ayuda, labels, constantes)
+        self.buckets = tuple(buckets)
+        # Texto de la etiqueta "le" de cada bucket, preformateado
+        self._les = [_numero(b) for b in self.buckets] + ["+Inf"]
+
+    def _nuevo_estado(self):
+        # Conteo por bucket (no acumulado) + suma
+        return [[0] * (len(self.buckets) + 1), 0.0]
+
+    def observe(self, valores: tuple, valor: float):
+        estado = self._serie(valores)[1]
+        estado[0][bisect_left(self.buckets, valor)] += 1
+        estado[1] += valor
+
+    def render(self, lineas: list):
+        lineas.extend(self.cabecera())
+        for texto, (conteos, suma) in self._series.values():
+            prefijo = texto[:-1] + "," if texto else "{"
+            acumulado = 0
+            for le, conteo in zip(self._les, conteos):
+                acumulado += conteo
+                lineas.append(f'{self.nombre}_bucket{prefijo}le="{le}"}} {acumulado}')
+            lineas.append(f"{self.nombre}_sum{texto} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{texto} {acumulado}")
+
+
+class Registry:
+    """Conjunto de métricas de un servicio. Todas llevan la etiqueta constante `service`."""
+
+    def __init__(self, servicio: str):
+        self.servicio = servicio
+        self._metricas = []
+        self._collectors = []
+
+    def _registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def counter(self, nombre: str, ayuda: str, labels: tuple = ()) -> Counter:
+        return self._registrar(Counter(nombre, ayuda, labels, {"service": self.servicio}))
+
+    def gauge(self, nombre: str, ayuda: str, labels: tuple = ()) -> Gauge:
+        return self._registrar(Gauge(nombre, ayuda, labels, {"service": self.servicio}))
+
+    def histogram(self, nombre: str, ayuda: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._registrar(Histogram(nombre, ayuda, labels, {"service": self.servicio}, buckets))
+
+    def collector(self, funcion):
+        """Registra una función que, en cada scrape, devuelve muestras calculadas en ese momento.
+
+        Debe devolver una lista de (nombre, tipo, ayuda, [(dict de etiquetas, valor), ...]).
+        """
+        self._collectors.append(funcion)
+        return funcion
+
+    def render(self) -> str:
+        lineas = []
+        for metrica in self._metricas:
+            metrica.render(lineas)
+        for funcion in self._collectors:
+            for nombre, tipo, ayuda, muestras in funcion():
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} {tipo}")
+                for labels, valor in muestras:
+                    labels = {"service": self.servicio, **labels}
+                    texto = formatear_labels(tuple(labels), tuple(labels.values()))
+                    lineas.append(f"{nombre}{texto} {_numero(valor)}")
+        lineas.append("")
+        return "\n".join(lineas)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: cuenta peticiones, peticiones en curso y latencia por plantilla de ruta."""
+
+    def __init__(self, app, registry: Registry):
+        self.app = app
+        self.en_curso = registry.gauge("http_requests_in_flight", "Peticiones HTTP en curso", ("method",))
+        self.peticiones = registry.counter(
+            "http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status")
+        )
+        self.latencia = registry.histogram(
+            "http_request_duration_seconds", "Latencia de las peticiones HTTP", ("method", "route", "status")
+        )
+        self._rutas = None
+
+    def _plantilla(self, scope) -> str:
+        """Plantilla de la ruta atendida (p. ej. /equipos/{equipo_id}), no la ruta concreta"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "__sin_ruta__"
+        if self._rutas is None:
+            self._rutas = {}
+            for ruta in getattr(scope.get("app"), "routes", ()):
+                self._rutas.setdefault(getattr(ruta, "endpoint", None), []).append(ruta)
+        candidatas = self._rutas.get(endpoint, ())
+        if len(candidatas) == 1:
+            return candidatas[0].path
+        # Un mismo endpoint montado en varias rutas
+        for ruta in candidatas:
+            if ruta.path_regex.match(scope["path"]):
+                return ruta.path
+        return "__sin_ruta__"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metodo = (scope["method"],)
+        status = 500
+
+        async def send_con_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.en_curso.inc(metodo)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_con_status)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.en_curso.dec(metodo)
+            etiquetas = (scope["method"], self._plantilla(scope), str(status))
+            self.peticiones.inc(etiquetas)
+            self.latencia.observe(etiquetas, duracion)
+
+
+def stats_pool_asyncpg(pool) -> list:
+    """Muestras del pool de asyncpg: tamaño, conexiones libres, máximo y peticiones esperando.
+
+    Con réplica de lectura (common.db.Pools) hay una serie por rol: primary y replica.
+    """
+    if pool is None:
+        return []
+    pools = pool.por_rol() if hasattr(pool, "por_rol") else {"primary": pool}
+    tamano, libres, maximo, esperando = [], [], [], []
+    for rol, p in pools.items():
+        etiquetas = {"role": rol}
+        # asyncpg no expone cuántos acquire() esperan: se lee de la cola interna si existe
+        cola = getattr(p, "_queue", None)
+        tamano.append((etiquetas, p.get_size()))
+        libres.append((etiquetas, p.get_idle_size()))
+        maximo.append((etiquetas, p.get_max_size()))
+        esperando.append((etiquetas, len(getattr(cola, "_getters", ()) or ())))
+    muestras = [
+        ("db_pool_size", "gauge", "Conexiones abiertas en el pool de asyncpg", tamano),
+        ("db_pool_idle", "gauge", "Conexiones libres en el pool de asyncpg", libres),
+        ("db_pool_max_size", "gauge", "Tamaño máximo del pool de asyncpg", maximo),
+        ("db_pool_waiters", "gauge", "Peticiones esperando una conexión del pool", esperando),
+    ]
+    if hasattr(pool, "lecturas_en_principal"):
+        muestras.append(("db_read_fallbacks_total", "counter",
+                         "Lecturas servidas por el principal porque la réplica no estaba disponible",
+                         [({}, pool.lecturas_en_principal)]))
+    return muestras
+
+
+def instrumentar(app, servicio: str, pool_getter=None) -> Registry:
+    """Monta el middleware de métricas y GET /metrics en una app FastAPI"""
+    registry = Registry(servicio)
+    app.add_middleware(MetricsMiddleware, registry=registry)
+
+    if pool_getter is not None:
+        # Sólo los servicios con base de datos importan asyncpg
+        from common.db import instrumentar_consultas
+        registry.collector(lambda: stats_pool_asyncpg(pool_getter()))
+        instrumentar_consultas(registry)
+
+    async def metrics():
+        return Response(registry.render(), media_type=CONTENT_TYPE)
+
+    app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+    return registry
@@ -0,0 +1,68 @@
+"""Arranque de producción de los servicios: varios workers, uvloop/httptools y cierre ordenado.
+
+Variables de entorno (las mismas para todos los servicios):
+    WEB_WORKERS                 procesos worker de uvicorn (1)
+    WEB_LOOP / WEB_HTTP         event loop e implementación HTTP ("auto": uvloop y
+                                httptools si están instalados, si no asyncio y h11)
+    WEB_GRACEFUL_TIMEOUT        segundos que se espera a las peticiones en curso al parar (20)
+    HOST / PORT                 dirección de escucha
+    DB_POOL_MAX_TOTAL           conexiones a Postgres de todo el servicio, repartidas
+                                entre sus workers (10); incluye las que cada worker
+                                abre fuera del pool (p. ej. la de LISTEN de equipos)
+    DB_POOL_MAX_SIZE            fija el máximo del pool de cada worker (ignora el reparto)
+    DB_POOL_MIN_SIZE            conexiones abiertas desde el arranque en cada worker (1)
+"""
+import logging
+import os
+
+import uvicorn
+
+logger = logging.getLogger("server")
+
+
+def workers() -> int:
+    return max(1, int(os.getenv("WEB_WORKERS", "1")))
+
+
+def tamano_pool(conexiones_extra: int = 0) -> dict:
+    """min_size/max_size del pool asyncpg de un worker.
+
+    Cada worker es un proceso con su propio pool, así que el total del servicio es
+    (max_size + conexiones_extra) * workers: se reparte DB_POOL_MAX_TOTAL para que
+    la suma de todos los servicios siga por debajo de max_connections de Postgres.
+    `conexiones_extra` son las que cada worker abre fuera del pool y se descuentan
+    de su parte. El pool tiene al menos una conexión: si el total no alcanza, se
+    avisa en el log de cuántas se usarán.
+    """
+    maximo = os.getenv("DB_POOL_MAX_SIZE")
+    if maximo:
+        maximo = int(maximo)
+    else:
+        total = int(os.getenv("DB_POOL_MAX_TOTAL", "10"))
+        maximo = total // workers() - conexiones_extra
+        if maximo < 1:
+            maximo = 1
+            logger.warning(
+                "DB_POOL_MAX_TOTAL=%d no alcanza para %d workers con %d conexiones fuera del pool cada uno: "
+                "el servicio usará hasta %d conexiones", total, workers(), conexiones_extra,
+                workers() * (1 + conexiones_extra)
+            )
+    minimo = min(int(os.getenv("DB_POOL_MIN_SIZE", "1")), maximo)
+    return {"min_size": minimo, "max_size": maximo}
+
+
+def servir(app: str, puerto: int):
+    """Lanza uvicorn con la configuración de producción.
+
+    `app` es la ruta de importación ("main:app"): con más de un worker uvicorn
+    necesita importarla de nuevo en cada proceso.
+    """
+    uvicorn.run(
+        app,
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", str(puerto))),
+        workers=workers(),
+        loop=os.getenv("WEB_LOOP", "auto"),
+        http=os.getenv("WEB_HTTP", "auto"),
+        timeout_graceful_shutdown=int(os.getenv("WEB_GRACEFUL_TIMEOUT", "20")),
+    )
@@ -0,0 +1,179 @@
+"""Búsqueda masiva por código y auditorías de inventario físico.
+
+POST /equipos/lookup resuelve de una vez una lista de códigos leídos con
+escáner (código de inventario o número de serie) con una sola consulta
+`= ANY($1)`, que usa los índices de ambas columnas.
+
+Una auditoría recorre una ubicación: se abre la sesión, se envían los códigos
+leídos por lotes (se guardan en auditoria_lecturas, sin repetir) y la
+conciliación compara, en una única sentencia, lo leído con lo que el inventario
+espera en esa ubicación:
+
+    faltantes       equipos de la ubicación que no se leyeron
+    inesperados     códigos leídos que no corresponden a ningún equipo
+    fuera_de_lugar  equipos leídos que el inventario tiene en otra ubicación
+
+Los equipos dados de baja no se esperan en ninguna ubicación.
+"""
+import os
+
+import asyncpg
+from fastapi import HTTPException
+
+LOOKUP_MAX_CODIGOS = int(os.getenv("LOOKUP_MAX_CODIGOS", "10000"))
+MIGRACION_PENDIENTE = "Las auditorías necesitan la migración 008"
+
+BUSCAR_CODIGOS = """
+    SELECT {columnas} FROM equipos e
+    WHERE e.codigo_inventario = ANY($1::text[]) OR e.numero_serie = ANY($1::text[])
+    ORDER BY e.id
+"""
+
+REGISTRAR_LECTURAS = """
+    INSERT INTO auditoria_lecturas (auditoria_id, codigo)
+    SELECT $1, codigo FROM unnest($2::text[]) AS codigo
+    ON CONFLICT DO NOTHING
+"""
+
+# Cada lectura se resuelve a un equipo: primero por código de inventario y, si
+# no, por número de serie (el de menor id si se repite)
+CONCILIAR = """
+    WITH auditoria AS (
+        SELECT ubicacion_id FROM auditorias WHERE id = $1
+    ),
+    leidas AS (
+        SELECT l.codigo, e.id, e.codigo_inventario, e.nombre, e.ubicacion_actual_id, e.estado_operativo
+        FROM auditoria_lecturas l
+        LEFT JOIN LATERAL (
+            SELECT id, codigo_inventario, nombre, ubicacion_actual_id, estado_operativo
+            FROM equipos
+            WHERE codigo_inventario = l.codigo OR numero_serie = l.codigo
+            ORDER BY codigo_inventario = l.codigo DESC, id
+            LIMIT 1
+        ) e ON true
+        WHERE l.auditoria_id = $1
+    ),
+    esperados AS (
+        SELECT e.id, e.codigo_inventario, e.nombre
+        FROM equipos e, auditoria a
+        WHERE e.ubicacion_actual_id = a.ubicacion_id
+          AND e.estado_operativo IS DISTINCT FROM 'dado_baja'
+    ),
+    faltantes AS (
+        SELECT * FROM esperados x WHERE NOT EXISTS (SELECT 1 FROM leidas l WHERE l.id = x.id)
+    ),
+    inesperados AS (
+        SELECT codigo FROM leidas WHERE id IS NULL
+    ),
+    fuera_de_lugar AS (
+        SELECT DISTINCT ON (l.id) l.id, l.codigo_inventario, l.nombre, l.codigo AS codigo_leido,
+               l.ubicacion_actual_id, l.estado_operativo
+        FROM leidas l, auditoria a
+        WHERE l.id IS NOT NULL
+          AND (l.ubicacion_actual_id IS DISTINCT FROM a.ubicacion_id OR l.estado_operativo = 'dado_baja')
+        ORDER BY l.id
+    )
+    SELECT
+        (SELECT count(*) FROM leidas) AS leidos,
+        (SELECT count(*) FROM esperados) AS esperados,
+        (SELECT count(DISTINCT id) FROM leidas l WHERE l.id IN (SELECT id FROM esperados)) AS encontrados,
+        (SELECT coalesce(json_agg(f ORDER BY f.codigo_inventario), '[]') FROM faltantes f) AS faltantes,
+        (SELECT coalesce(json_agg(i.codigo ORDER BY i.codigo), '[]') FROM inesperados i) AS inesperados,
+        (SELECT coalesce(json_agg(d ORDER BY d.codigo_inventario), '[]') FROM fuera_de_lugar d) AS fuera_de_lugar
+"""
+
+
+def normalizar_codigos(codigos: list) -> list:
+    """Códigos sin espacios ni vacíos, sin repetir y en el orden recibido"""
+    codigos = list(dict.fromkeys(c.strip() for c in codigos if c and c.strip()))
+    if not codigos:
+        raise HTTPException(status_code=400, detail="Indique al menos un código")
+    if len(codigos) > LOOKUP_MAX_CODIGOS:
+        raise HTTPException(status_code=400, detail=f"Máximo {LOOKUP_MAX_CODIGOS} códigos por petición")
+    largos = [c for c in codigos if len(c) > 100]
+    if largos:
+        raise HTTPException(status_code=400, detail=f"Código demasiado largo: {largos[0][:100]}...")
+    return codigos
+
+
+async def buscar_codigos(conn, codigos: list, columnas: list) -> tuple:
+    """({código: fila}, códigos sin equipo). Un código de inventario tiene
+    prioridad sobre un número de serie igual; entre series repetidas gana el menor id"""
+    select = ", ".join(f"e.{c}" for c in columnas)
+    filas = await conn.fetch(BUSCAR_CODIGOS.format(columnas=select), codigos)
+    por_codigo, por_serie = {}, {}
+    for fila in filas:
+        por_codigo.setdefault(fila["codigo_inventario"], fila)
+        if fila["numero_serie"]:
+            por_serie.setdefault(fila["numero_serie"], fila)
+    encontrados = {}
+    for codigo in codigos:
+        fila = por_codigo.get(codigo) or por_serie.get(codigo)
+        if fila is not None:
+            encontrados[codigo] = fila
+    return encontrados, [c for c in codigos if c not in encontrados]
+
+
+async def obtener_auditoria(conn, auditoria_id: int, bloquear: bool = False):
+    try:
+        fila = await conn.fetchrow(
+            "SELECT * FROM auditorias WHERE id = $1" + (" FOR UPDATE" if bloquear else ""), auditoria_id
+        )
+    except asyncpg.UndefinedTableError:
+        raise HTTPException(status_code=503, detail=MIGRACION_PENDIENTE)
+    if not fila:
+        raise HTTPException(status_code=404, detail="Auditoría no encontrada")
+    return fila
+
+
+async def crear_auditoria(conn, ubicacion_id: int, usuario_id: int = None, notas: str = None) -> dict:
+    try:
+        fila = await conn.fetchrow(
+            "INSERT INTO auditorias (ubicacion_id, usuario_id, notas) VALUES ($1, $2, $3) RETURNING *",
+            ubicacion_id, usuario_id, notas
+        )
+    except asyncpg.ForeignKeyViolationError:
+        raise HTTPException(status_code=400, detail="La ubicación o el usuario no existen")
+    except asyncpg.UndefinedTableError:
+        raise HTTPException(status_code=503, detail=MIGRACION_PENDIENTE)
+    return dict(fila)
+
+
+async def registrar_lecturas(conn, auditoria_id: int, codigos: list) -> int:
+    """Guarda los códigos leídos y devuelve cuántos eran nuevos en la sesión"""
+    async with conn.transaction():
+        # El bloqueo evita registrar lecturas mientras otra petición cierra la sesión
+        auditoria = await obtener_auditoria(conn, auditoria_id, bloquear=True)
+        if auditoria["estado"] != "abierta":
+            raise HTTPException(status_code=409, detail="La auditoría está cerrada")
+        estado = await conn.execute(REGISTRAR_LECTURAS, auditoria_id, codigos)
+    return int(estado.split()[-1])
+
+
+async def conciliar(conn, auditoria_id: int) -> dict:
+    fila = await conn.fetchrow(CONCILIAR, auditoria_id)
+    return {
+        "resumen": {
+            "leidos": fila["leidos"],
+            "esperados": fila["esperados"],
+            "encontrados": fila["encontrados"],
+            "faltantes": len(fila["faltantes"]),
+            "inesperados": len(fila["inesperados"]),
+            "fuera_de_lugar": len(fila["fuera_de_lugar"]),
+        },
+        "faltantes": fila["faltantes"],
+        "inesperados": fila["inesperados"],
+        "fuera_de_lugar": fila["fuera_de_lugar"],
+    }
+
+
+async def cerrar_auditoria(conn, auditoria_id: int) -> dict:
+    async with conn.transaction():
+        auditoria = await obtener_auditoria(conn, auditoria_id, bloquear=True)
+        if auditoria["estado"] != "abierta":
+            raise HTTPException(status_code=409, detail="La auditoría ya está cerrada")
+        fila = await conn.fetchrow(
+            "UPDATE auditorias SET estado = 'cerrada', fecha_cierre = CURRENT_TIMESTAMP WHERE id = $1 RETURNING *",
+            auditoria_id
+        )
+        return {**dict(fila), "conciliacion": await conciliar(conn, auditoria_id)}
@@ -0,0 +1,219 @@
+"""Carga masiva de equipos desde CSV o XLSX (POST /equipos/bulk).
+
+El archivo se recibe en streaming a un temporal (en memoria hasta 1 MB, luego
+en disco), se lee y valida por lotes de filas y cada lote se copia con COPY a
+una tabla temporal. Al final una única sentencia pasa a `equipos` las filas
+válidas y devuelve las rechazadas con su motivo. La memoria usada depende del
+tamaño del lote, no del archivo.
+"""
+from decimal import Decimal
+from itertools import islice
+import csv
+import io
+import json
+import os
+import tempfile
+import zipfile
+from xml.etree import ElementTree
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+try:
+    import openpyxl
+    from openpyxl.utils.exceptions import InvalidFileException
+except ImportError:  # sin openpyxl sólo se aceptan CSV
+    openpyxl = None
+    InvalidFileException = zipfile.BadZipFile
+
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(200 * 1024 * 1024)))
+BULK_CHUNK = int(os.getenv("BULK_CHUNK", "5000"))
+# Errores que se detallan en la respuesta (el total siempre se informa)
+BULK_MAX_ERRORES = int(os.getenv("BULK_MAX_ERRORES", "1000"))
+
+# Columnas de la tabla temporal: "fila" es el número de fila del archivo (la cabecera es la 1)
+COLUMNAS_CARGA = (
+    "fila", "codigo_inventario", "categoria_id", "nombre", "marca", "modelo", "numero_serie",
+    "especificaciones", "proveedor_id", "fecha_compra", "costo_compra", "fecha_garantia_fin",
+    "ubicacion_actual_id", "estado_operativo", "estado_fisico", "asignado_a_id", "notas", "imagen_url",
+)
+COLUMNAS_EQUIPO = COLUMNAS_CARGA[1:]
+
+# especificaciones va como texto: COPY es binario y el codec JSON del pool es de texto
+CREAR_TABLA_CARGA = """
+    CREATE TEMP TABLE equipos_carga (
+        fila INTEGER, codigo_inventario TEXT, categoria_id INTEGER, nombre TEXT, marca TEXT,
+        modelo TEXT, numero_serie TEXT, especificaciones TEXT, proveedor_id INTEGER,
+        fecha_compra DATE, costo_compra NUMERIC, fecha_garantia_fin DATE,
+        ubicacion_actual_id INTEGER, estado_operativo TEXT, estado_fisico TEXT,
+        asignado_a_id INTEGER, notas TEXT, imagen_url TEXT
+    ) ON COMMIT DROP
+"""
+
+# Las comprobaciones que en un INSERT fila a fila darían error (claves foráneas,
+# longitudes, duplicados) se hacen antes para rechazar sólo esas filas en vez de
+# abortar la carga completa
+FUSIONAR_CARGA = f"""
+    WITH revisadas AS (
+        SELECT c.*,
+            CASE
+                WHEN NOT EXISTS (SELECT 1 FROM categorias_equipos x WHERE x.id = c.categoria_id)
+                    THEN 'categoria_id no existe'
+                WHEN c.proveedor_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM proveedores x WHERE x.id = c.proveedor_id)
+                    THEN 'proveedor_id no existe'
+                WHEN c.ubicacion_actual_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM ubicaciones x WHERE x.id = c.ubicacion_actual_id)
+                    THEN 'ubicacion_actual_id no existe'
+                WHEN c.asignado_a_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM usuarios x WHERE x.id = c.asignado_a_id)
+                    THEN 'asignado_a_id no existe'
+                WHEN length(c.codigo_inventario) > 50 OR length(c.nombre) > 200 OR length(c.marca) > 100
+                  OR length(c.modelo) > 100 OR length(c.numero_serie) > 100 OR length(c.estado_operativo) > 50
+                  OR length(c.estado_fisico) > 50 OR length(c.imagen_url) > 255
+                    THEN 'texto demasiado largo para la columna'
+                WHEN abs(c.costo_compra) >= 1e10
+                    THEN 'costo_compra fuera de rango'
+                WHEN c.fila <> min(c.fila) OVER (PARTITION BY c.codigo_inventario)
+                    THEN 'codigo_inventario repetido en el archivo'
+            END AS error
+        FROM equipos_carga c
+    ),
+    insertados AS (
+        INSERT INTO equipos ({", ".join(COLUMNAS_EQUIPO)})
+        SELECT {", ".join("especificaciones::jsonb" if c == "especificaciones" else c for c in COLUMNAS_EQUIPO)}
+        FROM revisadas
+        WHERE error IS NULL
+        ON CONFLICT (codigo_inventario) DO NOTHING
+        RETURNING codigo_inventario
+    ),
+    rechazadas AS (
+        SELECT fila, codigo_inventario, error FROM revisadas WHERE error IS NOT NULL
+        UNION ALL
+        SELECT r.fila, r.codigo_inventario, 'codigo_inventario ya existe'
+        FROM revisadas r
+        WHERE r.error IS NULL
+          AND NOT EXISTS (SELECT 1 FROM insertados i WHERE i.codigo_inventario = r.codigo_inventario)
+    )
+    SELECT
+        (SELECT count(*) FROM insertados) AS insertados,
+        (SELECT count(*) FROM rechazadas) AS rechazadas,
+        (SELECT coalesce(json_agg(r ORDER BY r.fila), '[]')
+         FROM (SELECT * FROM rechazadas ORDER BY fila LIMIT $1) r) AS detalle
+"""
+
+TIPO_XLSX = "spreadsheetml"
+
+
+async def guardar_subida(request) -> tempfile.SpooledTemporaryFile:
+    """Copia el cuerpo de la petición a un temporal sin cargarlo entero en memoria"""
+    archivo = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    recibidos = 0
+    async for chunk in request.stream():
+        recibidos += len(chunk)
+        if recibidos > BULK_MAX_BYTES:
+            archivo.close()
+            raise HTTPException(status_code=413, detail=f"El archivo supera {BULK_MAX_BYTES} bytes")
+        archivo.write(chunk)
+    archivo.seek(0)
+    return archivo
+
+
+def detectar_formato(content_type: str, formato: str = None) -> str:
+    formato = (formato or ("xlsx" if TIPO_XLSX in content_type or "excel" in content_type else "csv")).lower()
+    if formato not in ("csv", "xlsx"):
+        raise HTTPException(status_code=415, detail="Formato no soportado: use csv o xlsx")
+    if formato == "xlsx" and openpyxl is None:
+        raise HTTPException(status_code=415, detail="La carga de XLSX no está disponible (falta openpyxl)")
+    return formato
+
+
+def _cabecera(valores, columnas_validas) -> list:
+    cabecera = [str(v or "").strip().lower() for v in valores]
+    desconocidas = [c for c in cabecera if c and c not in columnas_validas]
+    if desconocidas:
+        raise HTTPException(status_code=400, detail=f"Columnas desconocidas: {', '.join(desconocidas)}")
+    faltantes = [c for c in ("codigo_inventario", "categoria_id", "nombre") if c not in cabecera]
+    if faltantes:
+        raise HTTPException(status_code=400, detail=f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+    return cabecera
+
+
+def valor_celda(valor):
+    """Las celdas numéricas de un XLSX llegan como int/float y los campos de texto
+    (codigo_inventario, numero_serie...) no los aceptan: se pasan a texto como los
+    mostraría la hoja (1234.0 -> "1234"). Las fechas y los booleanos se conservan;
+    los campos numéricos convierten el texto al validar."""
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return valor
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def leer_filas(archivo, formato: str, columnas_validas):
+    """Genera (número de fila, {columna: valor}) omitiendo celdas vacías.
+
+    Un archivo ilegible (XLSX corrupto o que no es XLSX, CSV que no es UTF-8)
+    se responde con 400: los errores aparecen al leer, también a mitad de archivo.
+    """
+    try:
+        yield from _leer_filas(archivo, formato, columnas_validas)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El CSV no está codificado en UTF-8 (guárdelo como «CSV UTF-8»)")
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"CSV ilegible: {e}")
+    except (zipfile.BadZipFile, InvalidFileException, ElementTree.ParseError):
+        raise HTTPException(status_code=400, detail="El archivo no es un XLSX válido o está dañado")
+
+
+def _leer_filas(archivo, formato: str, columnas_validas):
+    if formato == "xlsx":
+        try:
+            libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+        except KeyError:  # ZIP sin las partes de un libro de Excel
+            raise zipfile.BadZipFile
+        filas = ([valor_celda(v) for v in fila] for fila in libro.active.iter_rows(values_only=True))
+    else:
+        texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+        primera = texto.readline()
+        texto.seek(0)
+        # Excel en configuración regional española exporta con ";"
+        separador = ";" if primera.count(";") > primera.count(",") else ","
+        filas = csv.reader(texto, delimiter=separador)
+
+    cabecera = _cabecera(next(filas, []), columnas_validas)
+    for numero, valores in enumerate(filas, start=2):
+        fila = {
+            columna: valor.strip() if isinstance(valor, str) else valor
+            for columna, valor in zip(cabecera, valores)
+            if columna and valor is not None and valor != ""
+        }
+        if fila:
+            yield numero, fila
+
+
+def validar_lote(filas, modelo, cantidad: int) -> tuple:
+    """Lee hasta `cantidad` filas y devuelve (registros para COPY, errores, filas leídas)"""
+    registros, errores, leidas = [], [], 0
+    for numero, fila in islice(filas, cantidad):
+        leidas += 1
+        try:
+            if isinstance(fila.get("especificaciones"), str):
+                fila["especificaciones"] = json.loads(fila["especificaciones"])
+            equipo = modelo.model_validate(fila)
+        except ValueError as e:  # ValidationError y JSON inválido
+            errores.append({"fila": numero, "codigo_inventario": fila.get("codigo_inventario"),
+                            "error": describir_error(e)})
+            continue
+
+        valores = equipo.model_dump()
+        if valores["especificaciones"] is not None:
+            valores["especificaciones"] = json.dumps(valores["especificaciones"])
+        if valores["costo_compra"] is not None:
+            valores["costo_compra"] = Decimal(str(valores["costo_compra"]))
+        registros.append((numero, *(valores[c] for c in COLUMNAS_EQUIPO)))
+    return registros, errores, leidas
+
+
+def describir_error(error: ValueError) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+    return f"especificaciones: JSON inválido ({error})"
@@ -0,0 +1,188 @@
+"""Instantánea en memoria de los catálogos (categorías, ubicaciones, proveedores y usuarios).
+
+Cada worker guarda las filas de cada catálogo y un mapa id -> nombre con el que
+el listado de equipos completa categoria_nombre, ubicacion_nombre, etc. sin
+hacer JOIN. Los triggers de la migración 006 avisan con pg_notify en el canal
+"catalogos" (payload: nombre de la tabla) cada vez que una sentencia modifica
+un catálogo; una conexión dedicada escucha el canal y descarta la instantánea
+de esa tabla, que se vuelve a leer en el siguiente uso.
+
+Mientras la conexión de escucha no está activa (arranque, caída de Postgres,
+migración 006 sin aplicar) no se guarda nada: cada uso lee el catálogo de la
+base, como antes. CATALOGOS_TTL acota además la antigüedad de una instantánea
+por si se pierde un aviso.
+
+Una recarga nunca espera otra conexión del pool principal mientras la petición
+retiene una de ese pool (con un pool de una conexión se bloquearía): lee con
+la conexión de la petición si es del principal. Si es de la réplica, pide una
+del principal con un timeout (CATALOGOS_ACQUIRE_TIMEOUT) y, si no la obtiene,
+responde con la réplica sin guardar.
+"""
+from dataclasses import dataclass, field
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+import asyncpg
+
+logger = logging.getLogger("catalogos")
+
+CANAL = "catalogos"
+CATALOGOS_CACHE = os.getenv("CATALOGOS_CACHE", "1") != "0"
+# Conexiones al principal que cada worker abre fuera del pool (la de LISTEN)
+CONEXIONES_PROPIAS = 1 if CATALOGOS_CACHE else 0
+CATALOGOS_TTL = float(os.getenv("CATALOGOS_TTL", "300"))
+# Espera máxima por una conexión del principal para recargar cuando la petición lee de la réplica
+CATALOGOS_ACQUIRE_TIMEOUT = float(os.getenv("CATALOGOS_ACQUIRE_TIMEOUT", "1"))
+# Espera máxima entre reintentos de la conexión de escucha, en segundos
+REINTENTO_MAXIMO = 30.0
+
+# Tabla -> (consulta que la carga, columna con el nombre que se muestra en los listados)
+CONSULTAS = {
+    "categorias_equipos": ("SELECT * FROM categorias_equipos ORDER BY nombre", "nombre"),
+    "ubicaciones": ("""
+        SELECT *, edificio || ' - ' || aula_oficina AS nombre_completo
+        FROM ubicaciones ORDER BY edificio, aula_oficina
+    """, "nombre_completo"),
+    "proveedores": ("SELECT id, razon_social FROM proveedores", "razon_social"),
+    "usuarios": ("SELECT id, nombre_completo FROM usuarios", "nombre_completo"),
+}
+
+
+@dataclass
+class Instantanea:
+    filas: list
+    nombres: dict
+    etag: str
+    cargada: float = field(default_factory=time.monotonic)
+
+
+async def leer(conn, tabla: str) -> Instantanea:
+    consulta, columna = CONSULTAS[tabla]
+    filas = [dict(row) for row in await conn.fetch(consulta)]
+    nombres = {fila["id"]: fila[columna] for fila in filas}
+    # El ETag depende sólo del contenido: es el mismo en todos los workers
+    firma = json.dumps(filas, default=str, sort_keys=True)
+    etag = '"' + hashlib.blake2b(firma.encode(), digest_size=12).hexdigest() + '"'
+    return Instantanea(filas, nombres, etag)
+
+
+class Catalogos:
+    def __init__(self):
+        # pool: el principal; pools: lo que devuelve crear_pool (un pool o un Pools con réplica)
+        self.pool = None
+        self.pools = None
+        self.escuchando = False
+        self._dsn = None
+        self._conexion = None
+        self._tarea = None
+        self._instantaneas = {}
+        # Avisos recibidos por tabla: una lectura que empezó antes de un aviso no se guarda
+        self._generaciones = {tabla: 0 for tabla in CONSULTAS}
+        self._locks = {tabla: asyncio.Lock() for tabla in CONSULTAS}
+
+    async def iniciar(self, dsn: str, pools):
+        # NOTIFY no llega a las réplicas: se escucha y se recarga siempre del principal
+        self.pools = pools
+        self.pool = getattr(pools, "principal", pools)
+        self._dsn = dsn
+        if CATALOGOS_CACHE:
+            self._tarea = asyncio.create_task(self._mantener_escucha())
+
+    async def cerrar(self):
+        if self._tarea:
+            self._tarea.cancel()
+        if self._conexion and not self._conexion.is_closed():
+            await self._conexion.close()
+
+    async def _mantener_escucha(self):
+        """Abre la conexión de escucha y la reabre, con espera creciente, si se cae"""
+        espera = 1.0
+        while True:
+            try:
+                await self._escuchar()
+                espera = 1.0
+                while not self._conexion.is_closed():
+                    await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # Postgres caído, credenciales, red...
+                logger.warning("Sin escucha de cambios de catálogos (%s); se reintenta en %.0fs", e, espera)
+            self._invalidar_todo()
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, REINTENTO_MAXIMO)
+
+    async def _escuchar(self):
+        self._conexion = await asyncpg.connect(self._dsn)
+        if not await self._conexion.fetchval("SELECT to_regproc('notificar_cambio_catalogo') IS NOT NULL"):
+            await self._conexion.close()
+            raise RuntimeError("falta la migración 006 (triggers de pg_notify)")
+        await self._conexion.add_listener(CANAL, self._aviso)
+        self._conexion.add_termination_listener(lambda conn: self._invalidar_todo())
+        self.escuchando = True
+
+    def _aviso(self, conn, pid, canal, tabla):
+        if tabla in self._generaciones:
+            self._generaciones[tabla] += 1
+            self._instantaneas.pop(tabla, None)
+
+    def _invalidar_todo(self):
+        self.escuchando = False
+        for tabla in CONSULTAS:
+            self._generaciones[tabla] += 1
+        self._instantaneas.clear()
+
+    async def obtener(self, tabla: str, conn=None) -> Instantanea:
+        """Instantánea vigente de `tabla`; si no la hay se lee con `conn` (o una conexión del pool)"""
+        instantanea = self._instantaneas.get(tabla)
+        if instantanea and time.monotonic() - instantanea.cargada < CATALOGOS_TTL:
+            return instantanea
+        # Dentro de una transacción la conexión ve una instantánea que puede ser
+        # anterior al último aviso: lo que lea no se guarda
+        if not self.escuchando or (conn is not None and conn.is_in_transaction()):
+            return await self._leer_sin_guardar(tabla, conn)
+
+        async with self._locks[tabla]:
+            # Otra petición pudo recargarla mientras se esperaba el lock
+            instantanea = self._instantaneas.get(tabla)
+            if instantanea and time.monotonic() - instantanea.cargada < CATALOGOS_TTL:
+                return instantanea
+            generacion = self._generaciones[tabla]
+            instantanea = await self._leer_del_principal(tabla, conn)
+            if instantanea is None:
+                return await leer(conn, tabla)
+            if self.escuchando and generacion == self._generaciones[tabla]:
+                self._instantaneas[tabla] = instantanea
+            return instantanea
+
+    def _es_principal(self, conn) -> bool:
+        es_lectura = getattr(self.pools, "es_lectura", None)
+        return not (es_lectura and es_lectura(conn))
+
+    async def _leer_del_principal(self, tabla: str, conn=None):
+        """Lee `tabla` del principal, o None si `conn` es de la réplica y el principal no
+        da conexión a tiempo. Lo que se guarda no puede venir de una réplica con retraso:
+        serían datos anteriores al aviso"""
+        if conn is None:
+            return await self._leer_sin_guardar(tabla)
+        if self._es_principal(conn):
+            return await leer(conn, tabla)
+        try:
+            async with self.pool.acquire(timeout=CATALOGOS_ACQUIRE_TIMEOUT) as principal:
+                return await leer(principal, tabla)
+        except asyncio.TimeoutError:
+            logger.warning("Sin conexión libre en el principal para recargar %s; se lee de la réplica", tabla)
+            return None
+
+    async def _leer_sin_guardar(self, tabla: str, conn=None) -> Instantanea:
+        if conn is not None:
+            return await leer(conn, tabla)
+        async with self.pool.acquire() as conn:
+            return await leer(conn, tabla)
+
+    async def nombres(self, tablas, conn=None) -> dict:
+        """{tabla: {id: nombre}} de las tablas indicadas"""
+        return {tabla: (await self.obtener(tabla, conn)).nombres for tabla in tablas}
@@ -1,25 +1,63 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
+import asyncio
 import asyncpg
+import base64
+import csv
+import io
+import math
 import os
+import re
 from datetime import datetime, date
+from decimal import Decimal
 import json
 
+import auditorias
+import carga
+from catalogos import CONEXIONES_PROPIAS, Catalogos
+from common.cambios import CAMBIOS_LIMITE_MAXIMO, leer_cambios
+from common.db import Consulta, crear_pool, enrutar_lecturas, sentencia_update
+from common.etag import calcular_etag, coincide, no_modificado
+from common.metrics import instrumentar
+from common.server import servir
+
 app = FastAPI(title="Equipos Service", version="1.0.0")
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Réplica opcional para las lecturas (GET); sin ella todo va a DATABASE_URL
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
 
 # --- CORRECCIÓN: Pool Global ---
 pool = None
 
+# Métricas Prometheus en /metrics (incluye el estado del pool de conexiones)
+instrumentar(app, "equipos", pool_getter=lambda: pool)
+# POST /equipos/lookup sólo lee: también puede ir a la réplica
+enrutar_lecturas(app, rutas_lectura=("/equipos/lookup",))
+
+# Categorías, ubicaciones, proveedores y usuarios en memoria (invalidados con LISTEN/NOTIFY)
+catalogos = Catalogos()
+
+async def init_conexion(conn):
+    # JSON/JSONB se convierten a dict/list al leer y desde dict/list al escribir,
+    # una vez por valor dentro del protocolo de asyncpg
+    for tipo in ("json", "jsonb"):
+        await conn.set_type_codec(tipo, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
 @app.on_event("startup")
 async def startup_db():
     global pool
-    # Creamos el pool una sola vez. Max size 10 es suficiente por servicio.
-    pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=10)
+    # Un pool por worker; su tamaño reparte DB_POOL_MAX_TOTAL entre los workers,
+    # descontando la conexión de LISTEN de los catálogos
+    pool = await crear_pool(DATABASE_URL, init=init_conexion, dsn_lectura=DATABASE_READ_URL,
+                            conexiones_extra=CONEXIONES_PROPIAS)
+    # Los avisos NOTIFY no llegan a las réplicas: los catálogos se escuchan y leen en el principal
+    await catalogos.iniciar(DATABASE_URL, pool)
 
 @app.on_event("shutdown")
 async def shutdown_db():
+    await catalogos.cerrar()
     if pool:
         await pool.close()
 
@@ -57,6 +95,9 @@ class EquipoUpdate(BaseModel):
     fecha_garantia_fin: Optional[date] = None
     proveedor_id: Optional[int] = None
 
+# Tablas que lee cada respuesta: su versión de datos forma el ETag
+TABLAS_LISTADO = ("equipos", "categorias_equipos", "ubicaciones", "proveedores", "usuarios")
+
 class MovimientoCreate(BaseModel):
     equipo_id: int
     ubicacion_destino_id: int
@@ -64,61 +105,537 @@ class MovimientoCreate(BaseModel):
     motivo: str
     observaciones: Optional[str] = None
 
+class FiltroMovimiento(BaseModel):
+    ubicacion_id: Optional[int] = None
+    categoria: Optional[str] = None
+    estado: Optional[str] = None
+
+class MovimientoBulk(BaseModel):
+    # Equipos a mover: por id, por filtro o ambos (se combinan con AND)
+    equipo_ids: Optional[List[int]] = None
+    filtro: Optional[FiltroMovimiento] = None
+    ubicacion_destino_id: int
+    usuario_responsable_id: int
+    motivo: str
+    observaciones: Optional[str] = None
+    # Si se indica, los equipos movidos quedan además asignados a este usuario
+    asignado_a_id: Optional[int] = None
+
+MOVIMIENTOS_BULK_MAX = int(os.getenv("MOVIMIENTOS_BULK_MAX", "5000"))
+
+class LookupEquipos(BaseModel):
+    # Códigos de inventario o números de serie, p. ej. leídos con un escáner
+    codigos: List[str]
+
+class AuditoriaCreate(BaseModel):
+    ubicacion_id: int
+    usuario_id: Optional[int] = None
+    notas: Optional[str] = None
+
+class LecturasAuditoria(BaseModel):
+    codigos: List[str]
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "equipos"}
 
+# --- LISTADO: PAGINACIÓN POR CURSOR, ORDEN Y PROYECCIÓN DE CAMPOS ---
+
+# Columnas de equipos que se pueden pedir en fields
+COLUMNAS_EQUIPO = (
+    "id", "codigo_inventario", "nombre", "marca", "modelo", "numero_serie", "categoria_id",
+    "especificaciones", "proveedor_id", "fecha_compra", "costo_compra", "fecha_garantia_fin",
+    "ubicacion_actual_id", "estado_operativo", "estado_fisico", "asignado_a_id", "notas",
+    "imagen_url", "fecha_registro",
+)
+
+# Nombres de catálogo: campo de salida -> (columna con el id, tabla del catálogo).
+# Se completan en Python con la instantánea de `catalogos`, sin JOIN.
+CAMPOS_CATALOGO = {
+    "categoria_nombre": ("categoria_id", "categorias_equipos"),
+    "ubicacion_nombre": ("ubicacion_actual_id", "ubicaciones"),
+    "proveedor_nombre": ("proveedor_id", "proveedores"),
+    "asignado_a_nombre": ("asignado_a_id", "usuarios"),
+}
+
+CAMPOS_EQUIPO = COLUMNAS_EQUIPO + tuple(CAMPOS_CATALOGO)
+
+# Ordenaciones permitidas: nombre -> (columna, tipo SQL del valor en el cursor, admite NULL).
+# Todas desempatan por e.id, así la clave (columna, id) es única y el orden estable.
+ORDENES_EQUIPO = {
+    "fecha_registro": ("e.fecha_registro", "timestamp", True),
+    "codigo_inventario": ("e.codigo_inventario", "text", False),
+    "nombre": ("e.nombre", "text", False),
+    "fecha_compra": ("e.fecha_compra", "date", True),
+    "costo_compra": ("e.costo_compra", "numeric", True),
+    "id": ("e.id", "integer", False),
+}
+ORDEN_POR_DEFECTO = "-fecha_registro"
+LIMITE_MAXIMO = 1000
+
+# Filtros sobre especificaciones (JSONB), como parámetros de query:
+#   spec.ram_gb=16              igualdad                     -> especificaciones @> '{"ram_gb": 16}'
+#   spec.cpu.marca=Intel        claves anidadas
+#   spec.ram_gb__gte=16         rango: __gt, __gte, __lt, __lte -> especificaciones @? '$."ram_gb" ? (@ >= 16)'
+#   spec={"ram_gb":16,"ssd":true}  contención de un documento JSON
+# @> y @? los resuelve el índice GIN jsonb_path_ops; los rangos se comprueban
+# sobre las filas que dejan el resto de filtros.
+OPERADORES_RANGO = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+CLAVE_ESPECIFICACION = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def valor_filtro(texto: str):
+    """'16' -> 16, 'true' -> True, 'Intel' -> 'Intel' (lo que no es JSON válido es texto).
+
+    Entre comillas se fuerza el texto: '"16"' -> '16'. Los objetos y listas se toman como texto literal.
+    """
+    try:
+        valor = json.loads(texto)
+    except ValueError:
+        return texto
+    return valor if isinstance(valor, (int, float, bool, str)) or valor is None else texto
+
+def filtros_especificaciones(query_params, consulta: Consulta):
+    for nombre, texto in query_params.multi_items():
+        if nombre == "spec":
+            try:
+                documento = json.loads(texto)
+            except ValueError:
+                documento = None
+            if not isinstance(documento, dict):
+                raise HTTPException(status_code=400, detail="spec debe ser un objeto JSON")
+            consulta.donde("e.especificaciones @> {}::jsonb", documento)
+            continue
+        if not nombre.startswith("spec."):
+            continue
+
+        ruta, _, operador = nombre[len("spec."):].partition("__")
+        claves = ruta.split(".")
+        if not all(CLAVE_ESPECIFICACION.match(c) for c in claves):
+            raise HTTPException(status_code=400, detail=f"Clave de especificación inválida: {ruta}")
+
+        if not operador:
+            documento = valor_filtro(texto)
+            for clave in reversed(claves):
+                documento = {clave: documento}
+            consulta.donde("e.especificaciones @> {}::jsonb", documento)
+        elif operador in OPERADORES_RANGO:
+            try:
+                numero = float(texto)
+            except ValueError:
+                numero = None
+            if numero is None or not math.isfinite(numero):
+                raise HTTPException(status_code=400, detail=f"{nombre} debe ser numérico")
+            # Claves validadas y número ya convertido: se pueden escribir en el jsonpath
+            camino = "$" + "".join(f'."{c}"' for c in claves)
+            consulta.donde("e.especificaciones @? {}::jsonpath",
+                           f"{camino} ? (@ {OPERADORES_RANGO[operador]} {numero!r})")
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Operador no soportado: {operador}. Opciones: {', '.join(OPERADORES_RANGO)}"
+            )
+
+def codificar_cursor(*partes) -> str:
+    """Cursor opaco: las partes de la clave de la última fila, como JSON en base64.
+
+    La última parte es el id y se guarda como entero; el resto, como texto (o
+    null), que es como se envían a Postgres para convertirlas a su tipo.
+    """
+    *valores, equipo_id = partes
+    crudo = json.dumps([v if v is None else str(v) for v in valores] + [equipo_id])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+def leer_cursor(cursor: str, partes: int) -> list:
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if len(valores) != partes:
+            raise ValueError
+        valores[-1] = int(valores[-1])  # la última parte siempre es un id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return valores
+
+def decodificar_cursor(cursor: str, orden: str) -> tuple:
+    orden_cursor, valor, equipo_id = leer_cursor(cursor, 3)
+    if orden_cursor != orden:
+        raise HTTPException(status_code=400, detail="El cursor pertenece a otro orden (sort)")
+    # Los cursores anteriores guardaban los enteros (sort=id) sin convertir
+    return (None if valor is None else str(valor)), equipo_id
+
+def condicion_cursor(orden: str, descendente: bool, valor, equipo_id: int, consulta: Consulta) -> str:
+    """Filas posteriores a (valor, id) en el orden dado.
+
+    Los NULL se ordenan como el valor más alto (comportamiento por defecto de
+    Postgres): van al final en ascendente y al principio en descendente, de modo
+    que un único índice (columna, id) sirve para ambas direcciones.
+    """
+    columna, tipo, admite_null = ORDENES_EQUIPO[orden]
+    op = "<" if descendente else ">"
+    p_id = consulta.param(equipo_id, "integer")
+    if valor is None:
+        if descendente:
+            return f"(({columna} IS NULL AND e.id < {p_id}) OR {columna} IS NOT NULL)"
+        return f"({columna} IS NULL AND e.id > {p_id})"
+
+    # El valor viaja como texto y se convierte en SQL (asyncpg no acepta str para date/numeric)
+    p_valor = consulta.param(valor, f"text::{tipo}")
+    condicion = f"({columna}, e.id) {op} ({p_valor}, {p_id})"
+    if admite_null and not descendente:
+        condicion = f"({condicion} OR {columna} IS NULL)"
+    return condicion
+
+async def estimar_total(conn, from_where: str, params: list) -> int:
+    """Filas estimadas por el planificador (no recorre la tabla como COUNT(*))"""
+    plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) SELECT 1 {from_where}", *params)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def campos_pedidos(fields: Optional[str]) -> list:
+    if not fields:
+        return list(CAMPOS_EQUIPO)
+    campos = [c.strip() for c in fields.split(",") if c.strip()]
+    desconocidos = [c for c in campos if c not in CAMPOS_EQUIPO]
+    if desconocidos:
+        raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(desconocidos)}")
+    return campos
+
+def columnas_listado(campos: list, necesarias: tuple = ()) -> tuple:
+    """(columnas a leer, columnas ocultas, nombres de catálogo pedidos).
+
+    Cada nombre de catálogo necesita la columna con su id; esas columnas y las
+    `necesarias` (p. ej. las del cursor) se leen aunque no se hayan pedido y se
+    quitan después de la respuesta.
+    """
+    nombres_pedidos = [c for c in campos if c in CAMPOS_CATALOGO]
+    columnas = [c for c in campos if c not in CAMPOS_CATALOGO]
+    ocultos = []
+    for nombre in (*necesarias, *(CAMPOS_CATALOGO[c][0] for c in nombres_pedidos)):
+        if nombre not in columnas:
+            columnas.append(nombre)
+            ocultos.append(nombre)
+    return columnas, ocultos, nombres_pedidos
+
+def filtros_listado(request: Request, categoria: Optional[str], estado: Optional[str],
+                    ubicacion: Optional[int]) -> Consulta:
+    consulta = Consulta()
+    if categoria:
+        consulta.donde("e.categoria_id IN (SELECT id FROM categorias_equipos WHERE nombre = {})", categoria)
+    if estado:
+        consulta.donde("e.estado_operativo = {}", estado)
+    if ubicacion:
+        consulta.donde("e.ubicacion_actual_id = {}", ubicacion)
+    filtros_especificaciones(request.query_params, consulta)
+    return consulta
+
+def fila_listado(row, ocultos: list, nombres_pedidos: list, nombres: dict) -> dict:
+    equipo = dict(row)
+    for campo in nombres_pedidos:
+        columna, tabla = CAMPOS_CATALOGO[campo]
+        equipo[campo] = nombres[tabla].get(equipo[columna])
+    for nombre in ocultos:
+        del equipo[nombre]
+    return equipo
+
 @app.get("/equipos")
 async def get_equipos(
+    request: Request,
+    response: Response,
     categoria: Optional[str] = None,
     estado: Optional[str] = None,
-    ubicacion: Optional[int] = None
+    ubicacion: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    sort: str = ORDEN_POR_DEFECTO,
+    fields: Optional[str] = None,
+    total_estimado: bool = False
 ):
-    query = """
-        SELECT e.*, c.nombre as categoria_nombre, 
-               u.edificio || ' - ' || u.aula_oficina as ubicacion_nombre,
-               p.razon_social as proveedor_nombre
-        FROM equipos e
-        LEFT JOIN categorias_equipos c ON e.categoria_id = c.id
-        LEFT JOIN ubicaciones u ON e.ubicacion_actual_id = u.id
-        LEFT JOIN proveedores p ON e.proveedor_id = p.id
-        WHERE 1=1
+    """Listado de equipos.
+
+    Sin `limit` ni `cursor` devuelve la lista completa (compatibilidad). Con
+    ellos devuelve {"items", "next_cursor"} y, si se pide, "total_estimado".
     """
-    params = []
-    param_count = 1
-    
-    if categoria:
-        query += f" AND c.nombre = ${param_count}"
-        params.append(categoria)
-        param_count += 1
-    
-    if estado:
-        query += f" AND e.estado_operativo = ${param_count}"
-        params.append(estado)
-        param_count += 1
-    
-    if ubicacion:
-        query += f" AND e.ubicacion_actual_id = ${param_count}"
-        params.append(ubicacion)
-        param_count += 1
-    
-    query += " ORDER BY e.fecha_registro DESC"
-    
+    descendente = sort.startswith("-")
+    orden = sort.lstrip("-")
+    if orden not in ORDENES_EQUIPO:
+        raise HTTPException(status_code=400, detail=f"Orden no permitido. Opciones: {', '.join(ORDENES_EQUIPO)}")
+
+    # El cursor necesita la columna de orden y el id aunque no se hayan pedido
+    columna_orden = ORDENES_EQUIPO[orden][0]
+    columnas, ocultos, nombres_pedidos = columnas_listado(campos_pedidos(fields), (orden, "id"))
+    select = [f"e.{c}" for c in columnas]
+
+    consulta = filtros_listado(request, categoria, estado, ubicacion)
+
+    filtros_params = list(consulta.params)
+    filtros_sql = " FROM equipos e" + consulta.where
+
+    if cursor:
+        valor, equipo_id = decodificar_cursor(cursor, orden)
+        consulta.donde(condicion_cursor(orden, descendente, valor, equipo_id, consulta))
+
+    direccion = "DESC" if descendente else "ASC"
+    query = f"SELECT {', '.join(select)} FROM equipos e{consulta.where}"
+    query += f" ORDER BY {columna_orden} {direccion}, e.id {direccion}"
+    paginado = limit is not None or cursor is not None
+    if paginado:
+        limit = limit or 100
+        # Una fila de más indica si hay página siguiente
+        query += f" LIMIT {consulta.param(limit + 1)}"
+    params = consulta.params
+
     async with pool.acquire() as conn:
+        etag = await calcular_etag(conn, request, TABLAS_LISTADO)
+        if coincide(request, etag):
+            return no_modificado(etag)
+        if etag:
+            response.headers["ETag"] = etag
+
         rows = await conn.fetch(query, *params)
-        equipos = []
-        for row in rows:
-            equipo = dict(row)
-            if equipo.get('especificaciones'):
-                try:
-                    equipo['especificaciones'] = json.loads(equipo['especificaciones'])
-                except:
-                    equipo['especificaciones'] = {}
-            equipos.append(equipo)
-        return equipos
+        siguiente = None
+        if paginado and len(rows) > limit:
+            rows = rows[:limit]
+            ultima = rows[-1]
+            siguiente = codificar_cursor(orden, ultima[orden], ultima["id"])
+
+        nombres = await catalogos.nombres({CAMPOS_CATALOGO[c][1] for c in nombres_pedidos}, conn)
+        equipos = [fila_listado(row, ocultos, nombres_pedidos, nombres) for row in rows]
+
+        if not paginado:
+            return equipos
+        resultado = {"items": equipos, "next_cursor": siguiente}
+        if total_estimado:
+            resultado["total_estimado"] = await estimar_total(conn, filtros_sql, filtros_params)
+        return resultado
+
+# --- EXPORTACIÓN COMPLETA EN STREAMING ---
+
+FORMATOS_EXPORTACION = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+# Filas que trae cada viaje del cursor de servidor
+EXPORT_PREFETCH = int(os.getenv("EXPORT_PREFETCH", "500"))
+# Bytes que se acumulan antes de enviar un trozo al cliente
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(64 * 1024)))
+# Cada exportación retiene una conexión del pool mientras dura
+EXPORT_MAX_CONCURRENTES = int(os.getenv("EXPORT_MAX_CONCURRENTES", "2"))
+exportaciones = asyncio.Semaphore(EXPORT_MAX_CONCURRENTES)
+
+def valor_json(valor):
+    """Fechas y decimales igual que en las respuestas JSON de FastAPI"""
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"{type(valor).__name__} no es serializable")
+
+def valor_csv(valor):
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+async def generar_exportacion(formato: str, campos: list, query: str, params: list,
+                              ocultos: list, nombres_pedidos: list):
+    """Trozos del archivo a medida que llegan las filas del cursor.
+
+    Cada `yield` espera a que el cliente acepte el trozo anterior: si lee
+    despacio, no se piden más filas a Postgres y la memoria no crece.
+    """
+    async with exportaciones:
+        async with pool.acquire() as conn:
+            # El cursor de servidor vive dentro de la transacción, y todo el archivo
+            # sale de una misma instantánea aunque haya escrituras mientras tanto
+            async with conn.transaction(readonly=True, isolation="repeatable_read"):
+                nombres = await catalogos.nombres({CAMPOS_CATALOGO[c][1] for c in nombres_pedidos}, conn)
+                buffer = io.StringIO()
+                escritor = csv.writer(buffer)
+                if formato == "csv":
+                    escritor.writerow(campos)
+                async for row in conn.cursor(query, *params, prefetch=EXPORT_PREFETCH):
+                    equipo = fila_listado(row, ocultos, nombres_pedidos, nombres)
+                    if formato == "csv":
+                        escritor.writerow([valor_csv(equipo[c]) for c in campos])
+                    else:
+                        buffer.write(json.dumps(equipo, default=valor_json, ensure_ascii=False))
+                        buffer.write("\n")
+                    if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                        yield buffer.getvalue().encode()
+                        buffer.seek(0)
+                        buffer.truncate()
+                if buffer.tell():
+                    yield buffer.getvalue().encode()
+
+@app.get("/equipos/export")
+async def export_equipos(
+    request: Request,
+    formato: str = Query("ndjson", alias="format"),
+    categoria: Optional[str] = None,
+    estado: Optional[str] = None,
+    ubicacion: Optional[int] = None,
+    fields: Optional[str] = None
+):
+    """Inventario completo (con los mismos filtros y fields que GET /equipos) en NDJSON o CSV, ordenado por id"""
+    if formato not in FORMATOS_EXPORTACION:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado. Opciones: {', '.join(FORMATOS_EXPORTACION)}")
+    if exportaciones.locked():
+        raise HTTPException(status_code=503, detail="Hay demasiadas exportaciones en curso, reintente más tarde")
+
+    campos = campos_pedidos(fields)
+    columnas, ocultos, nombres_pedidos = columnas_listado(campos)
+    consulta = filtros_listado(request, categoria, estado, ubicacion)
+    query = f"SELECT {', '.join(f'e.{c}' for c in columnas)} FROM equipos e{consulta.where} ORDER BY e.id"
+
+    return StreamingResponse(
+        generar_exportacion(formato, campos, query, consulta.params, ocultos, nombres_pedidos),
+        media_type=FORMATOS_EXPORTACION[formato],
+        headers={"Content-Disposition": f'attachment; filename="equipos.{formato}"'}
+    )
+
+# --- FEED DE CAMBIOS ---
+
+@app.get("/equipos/changes")
+async def get_cambios_equipos(since: Optional[str] = None, limit: int = Query(500, ge=1, le=CAMBIOS_LIMITE_MAXIMO)):
+    """Equipos creados, modificados y borrados desde el token `since` (ver common/cambios.py)"""
+    async with pool.acquire() as conn:
+        return await leer_cambios(conn, "equipos", since, limit)
+
+# --- BÚSQUEDA DE TEXTO COMPLETO Y APROXIMADA ---
+
+# Deben coincidir con las expresiones de los índices GIN y GiST de schema.sql (migraciones 003 y 009):
+# si se cambian aquí, hay que recrear los índices con la misma expresión
+BUSQUEDA_TSV = """(
+    setweight(to_tsvector('simple', coalesce(e.codigo_inventario, '') || ' ' || coalesce(e.numero_serie, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(e.nombre, '') || ' ' || coalesce(e.marca, '') || ' ' || coalesce(e.modelo, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(e.notas, '')), 'C')
+)"""
+BUSQUEDA_TEXTO = """lower(
+    coalesce(e.codigo_inventario, '') || ' ' || coalesce(e.numero_serie, '') || ' ' ||
+    coalesce(e.nombre, '') || ' ' || coalesce(e.marca, '') || ' ' || coalesce(e.modelo, '')
+)"""
+
+# Coincidencias que se ordenan por relevancia: las BUSQUEDA_MAX_CANDIDATOS más
+# parecidas al término, que es también hasta donde llega la paginación
+BUSQUEDA_MAX_CANDIDATOS = int(os.getenv("BUSQUEDA_MAX_CANDIDATOS", "2000"))
+
+# Los candidatos salen de dos ramas: el código de inventario o número de serie
+# exactos (índices btree), que van siempre primero, y el resto de coincidencias
+# de la más a la menos parecida (<->> recorre el índice GiST de trigramas por
+# distancia, sin leer todas las coincidencias de un término amplio)
+CONSULTA_BUSQUEDA = f"""
+    WITH candidatos AS (
+        SELECT e.id, true AS exacto
+        FROM equipos e
+        WHERE e.codigo_inventario IN ($4, upper($4)) OR e.numero_serie IN ($4, upper($4))
+        UNION ALL
+        (
+            SELECT e.id, false
+            FROM equipos e
+            WHERE {BUSQUEDA_TSV} @@ to_tsquery('simple', $2)
+               OR {BUSQUEDA_TEXTO} LIKE $3
+               OR $1 <% {BUSQUEDA_TEXTO}
+            ORDER BY {BUSQUEDA_TEXTO} <->> $1
+            LIMIT $5
+        )
+    )
+    SELECT e.id, e.codigo_inventario, e.numero_serie, e.nombre, e.marca, e.modelo,
+           e.estado_operativo, e.estado_fisico, e.ubicacion_actual_id, e.fecha_compra, e.costo_compra,
+           c.nombre as categoria_nombre,
+           u.edificio || ' - ' || u.aula_oficina as ubicacion_nombre,
+           p.razon_social as proveedor_nombre,
+           round((ts_rank({BUSQUEDA_TSV}, to_tsquery('simple', $2)) + word_similarity($1, {BUSQUEDA_TEXTO}))::numeric, 4)
+               as relevancia
+    FROM (SELECT id, bool_or(exacto) AS exacto FROM candidatos GROUP BY id) r
+    JOIN equipos e ON e.id = r.id
+    LEFT JOIN categorias_equipos c ON e.categoria_id = c.id
+    LEFT JOIN ubicaciones u ON e.ubicacion_actual_id = u.id
+    LEFT JOIN proveedores p ON e.proveedor_id = p.id
+    ORDER BY r.exacto DESC, relevancia DESC, e.id
+    LIMIT $6 OFFSET $7
+"""
+
+def parametros_busqueda(q: str) -> tuple:
+    """(texto, tsquery de prefijos, patrón LIKE, código exacto) para CONSULTA_BUSQUEDA"""
+    codigo = q.strip()
+    texto = codigo.lower()
+    palabras = re.findall(r"\w+", texto)
+    if not palabras:
+        raise HTTPException(status_code=400, detail="La búsqueda debe contener letras o números")
+    # Cada palabra como prefijo: "lap del" encuentra "Laptop Dell"
+    tsquery = " & ".join(f"{p}:*" for p in palabras)
+    patron = "%" + texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return texto, tsquery, patron, codigo
+
+@app.get("/equipos/search")
+async def search_equipos(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=BUSQUEDA_MAX_CANDIDATOS)
+):
+    """Busca por código, serie, nombre, marca, modelo y notas (parcial y con errores de tipeo).
+
+    Pagina hasta BUSQUEDA_MAX_CANDIDATOS resultados: más allá next_offset es null.
+    """
+    parametros = parametros_busqueda(q)
+
+    async with pool.acquire() as conn:
+        etag = await calcular_etag(conn, request, TABLAS_LISTADO)
+        if coincide(request, etag):
+            return no_modificado(etag)
+        if etag:
+            response.headers["ETag"] = etag
+
+        rows = await conn.fetch(
+            CONSULTA_BUSQUEDA, *parametros, BUSQUEDA_MAX_CANDIDATOS, limit + 1, offset
+        )
+        siguiente = offset + limit if len(rows) > limit else None
+        return {"items": [dict(row) for row in rows[:limit]], "next_offset": siguiente}
+
+# Secciones que se pueden incluir en el detalle: nombre -> (clave en la respuesta, tablas que lee)
+INCLUDES_DETALLE = {
+    "movimientos": ("historial_movimientos", ("movimientos_equipos",)),
+    "mantenimientos": ("mantenimientos", ("mantenimientos",)),
+    "notificaciones": ("notificaciones", ("notificaciones",)),
+}
+# Cada sección trae sólo los registros más recientes; el resto, en /equipos/{id}/timeline
+DETALLE_MAX_REGISTROS = int(os.getenv("DETALLE_MAX_REGISTROS", "50"))
+
+CONSULTAS_INCLUDE = {
+    "movimientos": """
+        SELECT m.*,
+               uo.edificio || ' - ' || uo.aula_oficina as origen,
+               ud.edificio || ' - ' || ud.aula_oficina as destino,
+               u.nombre_completo as responsable
+        FROM movimientos_equipos m
+        LEFT JOIN ubicaciones uo ON m.ubicacion_origen_id = uo.id
+        LEFT JOIN ubicaciones ud ON m.ubicacion_destino_id = ud.id
+        LEFT JOIN usuarios u ON m.usuario_responsable_id = u.id
+        WHERE m.equipo_id = $1
+        ORDER BY m.fecha_movimiento DESC, m.id DESC
+        LIMIT $2
+    """,
+    "mantenimientos": """
+        SELECT * FROM mantenimientos
+        WHERE equipo_id = $1
+        ORDER BY fecha_creacion DESC, id DESC
+        LIMIT $2
+    """,
+    "notificaciones": """
+        SELECT * FROM notificaciones
+        WHERE equipo_id = $1
+        ORDER BY fecha_creacion DESC, id DESC
+        LIMIT $2
+    """,
+}
 
 @app.get("/equipos/{equipo_id}")
-async def get_equipo(equipo_id: int):
+async def get_equipo(equipo_id: int, request: Request, response: Response, include: str = "movimientos"):
+    """Detalle de un equipo. `include` elige las secciones a añadir (movimientos,
+    mantenimientos, notificaciones, separadas por comas; vacío = sólo la ficha)."""
+    secciones = [i.strip() for i in include.split(",") if i.strip()]
+    desconocidas = [i for i in secciones if i not in INCLUDES_DETALLE]
+    if desconocidas:
+        raise HTTPException(status_code=400, detail=f"include no soportado: {', '.join(desconocidas)}")
+
     query = """
         SELECT e.*, c.nombre as categoria_nombre,
                u.edificio || ' - ' || u.aula_oficina as ubicacion_nombre,
@@ -131,35 +648,131 @@ async def get_equipo(equipo_id: int):
         LEFT JOIN usuarios usr ON e.asignado_a_id = usr.id
         WHERE e.id = $1
     """
+    tablas = TABLAS_LISTADO + tuple(t for i in secciones for t in INCLUDES_DETALLE[i][1])
     
     async with pool.acquire() as conn:
+        etag = await calcular_etag(conn, request, tablas)
+        if coincide(request, etag):
+            return no_modificado(etag)
+        if etag:
+            response.headers["ETag"] = etag
+
         row = await conn.fetchrow(query, equipo_id)
         if not row:
             raise HTTPException(status_code=404, detail="Equipo no encontrado")
         
         equipo = dict(row)
-        if equipo.get('especificaciones'):
-            try:
-                equipo['especificaciones'] = json.loads(equipo['especificaciones'])
-            except:
-                equipo['especificaciones'] = {}
-        
-        movimientos_query = """
-            SELECT m.*, 
-                   uo.edificio || ' - ' || uo.aula_oficina as origen,
-                   ud.edificio || ' - ' || ud.aula_oficina as destino,
-                   u.nombre_completo as responsable
-            FROM movimientos_equipos m
-            LEFT JOIN ubicaciones uo ON m.ubicacion_origen_id = uo.id
-            LEFT JOIN ubicaciones ud ON m.ubicacion_destino_id = ud.id
-            LEFT JOIN usuarios u ON m.usuario_responsable_id = u.id
-            WHERE m.equipo_id = $1
-            ORDER BY m.fecha_movimiento DESC
-        """
-        movimientos = await conn.fetch(movimientos_query, equipo_id)
-        equipo['historial_movimientos'] = [dict(m) for m in movimientos]
+        for seccion in secciones:
+            clave = INCLUDES_DETALLE[seccion][0]
+            # Una fila de más indica que hay registros anteriores fuera de la respuesta
+            filas = await conn.fetch(CONSULTAS_INCLUDE[seccion], equipo_id, DETALLE_MAX_REGISTROS + 1)
+            equipo[clave] = [dict(f) for f in filas[:DETALLE_MAX_REGISTROS]]
+            if len(filas) > DETALLE_MAX_REGISTROS:
+                equipo[f"{clave}_truncado"] = True
         return equipo
 
+# --- LÍNEA DE TIEMPO (movimientos, mantenimientos y notificaciones de un equipo) ---
+
+# Tipo de evento -> (tabla, columna de fecha, SELECT del detalle). El orden es
+# (fecha, tipo, id) descendente; cada fuente tiene un índice (equipo_id, fecha, id)
+FUENTES_TIMELINE = {
+    "movimiento": ("movimientos_equipos", "fecha_movimiento", """
+        json_build_object(
+            'origen', uo.edificio || ' - ' || uo.aula_oficina,
+            'destino', ud.edificio || ' - ' || ud.aula_oficina,
+            'responsable', u.nombre_completo,
+            'motivo', x.motivo,
+            'observaciones', x.observaciones
+        )
+        FROM movimientos_equipos x
+        LEFT JOIN ubicaciones uo ON x.ubicacion_origen_id = uo.id
+        LEFT JOIN ubicaciones ud ON x.ubicacion_destino_id = ud.id
+        LEFT JOIN usuarios u ON x.usuario_responsable_id = u.id"""),
+    "mantenimiento": ("mantenimientos", "fecha_creacion", """
+        json_build_object(
+            'tipo', x.tipo, 'estado', x.estado, 'prioridad', x.prioridad,
+            'fecha_programada', x.fecha_programada, 'fecha_realizada', x.fecha_realizada,
+            'descripcion', x.descripcion, 'costo', x.costo
+        )
+        FROM mantenimientos x"""),
+    "notificacion": ("notificaciones", "fecha_creacion", """
+        json_build_object('tipo', x.tipo, 'titulo', x.titulo, 'mensaje', x.mensaje, 'leida', x.leida)
+        FROM notificaciones x"""),
+}
+
+def rama_timeline(tipo: str, cursor: Optional[list], consulta: Consulta) -> str:
+    """SELECT de una fuente, ya ordenado y limitado, con la condición del cursor.
+
+    (fecha, tipo, id) < (f, t, i) con el tipo constante en cada rama se reduce a
+    una condición sobre (fecha, id) que el índice (equipo_id, fecha, id) resuelve.
+    """
+    _, columna, detalle = FUENTES_TIMELINE[tipo]
+    condicion = ""
+    if cursor:
+        fecha, tipo_cursor, fila_id = cursor
+        p_fecha = consulta.param(fecha, "text::timestamp")
+        if tipo < tipo_cursor:
+            condicion = f"AND x.{columna} <= {p_fecha}"
+        elif tipo > tipo_cursor:
+            condicion = f"AND x.{columna} < {p_fecha}"
+        else:
+            condicion = f"AND (x.{columna}, x.id) < ({p_fecha}, {consulta.param(fila_id, 'integer')})"
+    return f"""(
+        SELECT x.{columna} AS fecha, '{tipo}' AS tipo, x.id, {detalle}
+        WHERE x.equipo_id = $1 AND x.{columna} IS NOT NULL {condicion}
+        ORDER BY x.{columna} DESC, x.id DESC
+        LIMIT $2
+    )"""
+
+@app.get("/equipos/{equipo_id}/timeline")
+async def get_timeline(
+    equipo_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    tipos: Optional[str] = None
+):
+    """Eventos del equipo en orden cronológico inverso, paginados por cursor"""
+    seleccion = [t.strip() for t in tipos.split(",") if t.strip()] if tipos else list(FUENTES_TIMELINE)
+    desconocidos = [t for t in seleccion if t not in FUENTES_TIMELINE]
+    if desconocidos or not seleccion:
+        raise HTTPException(status_code=400, detail=f"tipos admitidos: {', '.join(FUENTES_TIMELINE)}")
+
+    posicion = None
+    if cursor:
+        posicion = leer_cursor(cursor, 3)
+        if posicion[1] not in FUENTES_TIMELINE:
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    # Cada rama aporta como mucho limit + 1 filas; la unión se vuelve a ordenar y cortar
+    consulta = Consulta([equipo_id, limit + 1])
+    ramas = [rama_timeline(t, posicion, consulta) for t in seleccion]
+    query = f"""
+        SELECT fecha, tipo, id, detalle FROM ({' UNION ALL '.join(ramas)}) t (fecha, tipo, id, detalle)
+        ORDER BY fecha DESC, tipo DESC, id DESC
+        LIMIT $2
+    """
+    tablas = ("equipos", "ubicaciones", "usuarios") + tuple(FUENTES_TIMELINE[t][0] for t in seleccion)
+
+    async with pool.acquire() as conn:
+        etag = await calcular_etag(conn, request, tablas)
+        if coincide(request, etag):
+            return no_modificado(etag)
+        if etag:
+            response.headers["ETag"] = etag
+
+        if not await conn.fetchval("SELECT 1 FROM equipos WHERE id = $1", equipo_id):
+            raise HTTPException(status_code=404, detail="Equipo no encontrado")
+        rows = await conn.fetch(query, *consulta.params)
+
+    siguiente = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        ultima = rows[-1]
+        siguiente = codificar_cursor(ultima["fecha"], ultima["tipo"], ultima["id"])
+    return {"items": [dict(r) for r in rows], "next_cursor": siguiente}
+
 @app.post("/equipos")
 async def create_equipo(equipo: EquipoCreate):
     query = """
@@ -171,14 +784,12 @@ async def create_equipo(equipo: EquipoCreate):
         ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17)
         RETURNING id
     """
-    especificaciones_json = json.dumps(equipo.especificaciones) if equipo.especificaciones else None
-    
     async with pool.acquire() as conn:
         try:
             equipo_id = await conn.fetchval(
                 query,
                 equipo.codigo_inventario, equipo.categoria_id, equipo.nombre, equipo.marca,
-                equipo.modelo, equipo.numero_serie, especificaciones_json, equipo.proveedor_id,
+                equipo.modelo, equipo.numero_serie, equipo.especificaciones, equipo.proveedor_id,
                 equipo.fecha_compra, equipo.costo_compra, equipo.fecha_garantia_fin,
                 equipo.ubicacion_actual_id, equipo.estado_operativo, equipo.estado_fisico,
                 equipo.asignado_a_id, equipo.notas, equipo.imagen_url
@@ -187,69 +798,59 @@ async def create_equipo(equipo: EquipoCreate):
         except asyncpg.UniqueViolationError:
             raise HTTPException(status_code=400, detail="El código de inventario ya existe")
 
-@app.put("/equipos/{equipo_id}")
-async def update_equipo(equipo_id: int, equipo: EquipoUpdate):
-    updates = []
-    params = []
-    param_count = 1
-    
-    # Lógica de actualización completa recuperada
-    if equipo.nombre is not None:
-        updates.append(f"nombre = ${param_count}")
-        params.append(equipo.nombre)
-        param_count += 1
-    
-    if equipo.marca is not None:
-        updates.append(f"marca = ${param_count}")
-        params.append(equipo.marca)
-        param_count += 1
-    
-    if equipo.modelo is not None:
-        updates.append(f"modelo = ${param_count}")
-        params.append(equipo.modelo)
-        param_count += 1
-    
-    if equipo.especificaciones is not None:
-        updates.append(f"especificaciones = ${param_count}")
-        params.append(json.dumps(equipo.especificaciones))
-        param_count += 1
-    
-    if equipo.ubicacion_actual_id is not None:
-        updates.append(f"ubicacion_actual_id = ${param_count}")
-        params.append(equipo.ubicacion_actual_id)
-        param_count += 1
-    
-    if equipo.estado_operativo is not None:
-        updates.append(f"estado_operativo = ${param_count}")
-        params.append(equipo.estado_operativo)
-        param_count += 1
-    
-    if equipo.estado_fisico is not None:
-        updates.append(f"estado_fisico = ${param_count}")
-        params.append(equipo.estado_fisico)
-        param_count += 1
-    
-    if equipo.asignado_a_id is not None:
-        updates.append(f"asignado_a_id = ${param_count}")
-        params.append(equipo.asignado_a_id)
-        param_count += 1
-    
-    if equipo.notas is not None:
-        updates.append(f"notas = ${param_count}")
-        params.append(equipo.notas)
-        param_count += 1
+@app.post("/equipos/bulk")
+async def bulk_equipos(request: Request, formato: Optional[str] = None):
+    """Alta masiva desde un CSV o XLSX enviado como cuerpo de la petición.
+
+    La primera fila son los nombres de columna (los campos de EquipoCreate). Las
+    filas con errores se rechazan sin detener la carga y se informan en "errores".
+    """
+    formato = carga.detectar_formato(request.headers.get("content-type", ""), formato)
+    archivo = await carga.guardar_subida(request)
+    try:
+        filas = carga.leer_filas(archivo, formato, EquipoCreate.model_fields)
+        errores, total_errores, leidas = [], 0, 0
+
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(carga.CREAR_TABLA_CARGA)
+                while True:
+                    # Leer y validar es CPU: se hace fuera del event loop, un lote cada vez
+                    registros, invalidas, n = await asyncio.to_thread(
+                        carga.validar_lote, filas, EquipoCreate, carga.BULK_CHUNK
+                    )
+                    if n == 0:
+                        break
+                    leidas += n
+                    total_errores += len(invalidas)
+                    errores.extend(invalidas[:carga.BULK_MAX_ERRORES - len(errores)])
+                    if registros:
+                        await conn.copy_records_to_table(
+                            "equipos_carga", records=registros, columns=carga.COLUMNAS_CARGA
+                        )
+
+                resultado = await conn.fetchrow(carga.FUSIONAR_CARGA, carga.BULK_MAX_ERRORES)
+    finally:
+        archivo.close()
 
-    if equipo.proveedor_id is not None:
-        updates.append(f"proveedor_id = ${param_count}")
-        params.append(equipo.proveedor_id)
-        param_count += 1
+    total_errores += resultado["rechazadas"]
+    errores = sorted(errores + resultado["detalle"], key=lambda e: e["fila"])[:carga.BULK_MAX_ERRORES]
+    return {
+        "filas": leidas,
+        "insertados": resultado["insertados"],
+        "rechazados": total_errores,
+        "errores": errores,
+        "errores_truncados": total_errores > len(errores),
+    }
 
-    if not updates:
+@app.put("/equipos/{equipo_id}")
+async def update_equipo(equipo_id: int, equipo: EquipoUpdate):
+    # Los campos a None no se modifican
+    campos = equipo.model_dump(exclude_none=True)
+    if not campos:
         raise HTTPException(status_code=400, detail="No hay campos para actualizar")
-    
-    params.append(equipo_id)
-    query = f"UPDATE equipos SET {', '.join(updates)} WHERE id = ${param_count}"
-    
+    query, params = sentencia_update("equipos", campos, "id", equipo_id)
+
     async with pool.acquire() as conn:
         result = await conn.execute(query, *params)
         if result == "UPDATE 0":
@@ -264,45 +865,170 @@ async def delete_equipo(equipo_id: int):
             raise HTTPException(status_code=404, detail="Equipo no encontrado")
         return {"message": "Equipo eliminado exitosamente"}
 
+async def mover_equipos(conn, destino: int, responsable: int, motivo: str, observaciones: Optional[str],
+                        equipo_ids: Optional[List[int]] = None, filtro: Optional[FiltroMovimiento] = None,
+                        asignado_a_id: Optional[int] = None) -> List[int]:
+    """Mueve los equipos seleccionados y registra sus movimientos en una sola sentencia.
+
+    La fila de cada equipo se bloquea al leer su ubicación de origen, así dos
+    traslados simultáneos del mismo equipo no registran un origen desactualizado.
+    Un filtro que selecciona más de MOVIMIENTOS_BULK_MAX equipos no mueve ninguno
+    (400). Devuelve los ids movidos.
+    """
+    consulta = Consulta([destino, responsable, motivo, observaciones, asignado_a_id])
+    joins = []
+
+    if equipo_ids is not None:
+        joins.append(f"JOIN unnest({consulta.param(equipo_ids, 'integer[]')}) AS sel(id) ON sel.id = e.id")
+
+    if filtro and filtro.ubicacion_id is not None:
+        consulta.donde("e.ubicacion_actual_id = {}", filtro.ubicacion_id)
+
+    if filtro and filtro.categoria:
+        consulta.donde("e.categoria_id IN (SELECT id FROM categorias_equipos WHERE nombre = {})", filtro.categoria)
+
+    if filtro and filtro.estado:
+        consulta.donde("e.estado_operativo = {}", filtro.estado)
+
+    # Se seleccionan como mucho MOVIMIENTOS_BULK_MAX + 1 equipos: si sobra uno, no se mueve ninguno
+    query = f"""
+        WITH seleccion AS (
+            SELECT e.id, e.ubicacion_actual_id AS origen
+            FROM equipos e {' '.join(joins)}{consulta.where}
+            ORDER BY e.id
+            LIMIT {consulta.param(MOVIMIENTOS_BULK_MAX + 1)}
+            FOR UPDATE OF e
+        ),
+        movidos AS (
+            UPDATE equipos e
+            SET ubicacion_actual_id = $1::integer, asignado_a_id = COALESCE($5::integer, e.asignado_a_id)
+            FROM seleccion s
+            WHERE e.id = s.id AND (SELECT count(*) FROM seleccion) <= {consulta.param(MOVIMIENTOS_BULK_MAX)}
+            RETURNING e.id, s.origen
+        ),
+        registrados AS (
+            INSERT INTO movimientos_equipos
+            (equipo_id, ubicacion_origen_id, ubicacion_destino_id, usuario_responsable_id, motivo, observaciones)
+            SELECT id, origen, $1::integer, $2::integer, $3::text, $4::text FROM movidos
+        )
+        SELECT (SELECT count(*) FROM seleccion) AS seleccionados,
+               coalesce(array_agg(id ORDER BY id), '{{}}') AS ids
+        FROM movidos
+    """
+    try:
+        fila = await conn.fetchrow(query, *consulta.params)
+    except asyncpg.ForeignKeyViolationError:
+        raise HTTPException(status_code=400, detail="La ubicación de destino o el usuario no existen")
+    if fila["seleccionados"] > MOVIMIENTOS_BULK_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El filtro selecciona más de {MOVIMIENTOS_BULK_MAX} equipos; acótelo o traslade por partes"
+        )
+    return fila["ids"]
+
 @app.post("/movimientos")
 async def create_movimiento(movimiento: MovimientoCreate):
     async with pool.acquire() as conn:
-        ubicacion_origen = await conn.fetchval(
-            "SELECT ubicacion_actual_id FROM equipos WHERE id = $1",
-            movimiento.equipo_id
-        )
-        
-        await conn.execute(
-            """
-            INSERT INTO movimientos_equipos 
-            (equipo_id, ubicacion_origen_id, ubicacion_destino_id, usuario_responsable_id, motivo, observaciones)
-            VALUES ($1, $2, $3, $4, $5, $6)
-            """,
-            movimiento.equipo_id, ubicacion_origen, movimiento.ubicacion_destino_id,
-            movimiento.usuario_responsable_id, movimiento.motivo, movimiento.observaciones
-        )
-        
-        await conn.execute(
-            "UPDATE equipos SET ubicacion_actual_id = $1 WHERE id = $2",
-            movimiento.ubicacion_destino_id, movimiento.equipo_id
+        movidos = await mover_equipos(
+            conn, movimiento.ubicacion_destino_id, movimiento.usuario_responsable_id,
+            movimiento.motivo, movimiento.observaciones, equipo_ids=[movimiento.equipo_id]
         )
+        if not movidos:
+            raise HTTPException(status_code=404, detail="Equipo no encontrado")
         return {"message": "Movimiento registrado exitosamente"}
 
-@app.get("/categorias")
-async def get_categorias():
+@app.post("/movimientos/bulk")
+async def create_movimientos_bulk(movimiento: MovimientoBulk):
+    """Traslada (y opcionalmente reasigna) un grupo de equipos de forma atómica"""
+    filtro_vacio = movimiento.filtro is None or not any(movimiento.filtro.model_dump().values())
+    if not movimiento.equipo_ids and filtro_vacio:
+        raise HTTPException(status_code=400, detail="Indique equipo_ids o al menos un criterio en filtro")
+    if movimiento.equipo_ids and len(movimiento.equipo_ids) > MOVIMIENTOS_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo {MOVIMIENTOS_BULK_MAX} equipos por traslado")
+
     async with pool.acquire() as conn:
-        rows = await conn.fetch("SELECT * FROM categorias_equipos ORDER BY nombre")
-        return [dict(row) for row in rows]
+        movidos = await mover_equipos(
+            conn, movimiento.ubicacion_destino_id, movimiento.usuario_responsable_id,
+            movimiento.motivo, movimiento.observaciones,
+            equipo_ids=movimiento.equipo_ids or None, filtro=movimiento.filtro,
+            asignado_a_id=movimiento.asignado_a_id
+        )
 
-@app.get("/ubicaciones")
-async def get_ubicaciones():
+    resultado = {"movidos": len(movidos), "equipo_ids": movidos}
+    if movimiento.equipo_ids:
+        resultado["no_encontrados"] = sorted(set(movimiento.equipo_ids) - set(movidos))
+    return resultado
+
+# --- BÚSQUEDA POR CÓDIGO Y AUDITORÍAS DE INVENTARIO ---
+
+@app.post("/equipos/lookup")
+async def lookup_equipos(lookup: LookupEquipos, fields: Optional[str] = None):
+    """Resuelve una lista de códigos (inventario o serie) con una sola consulta.
+
+    Devuelve {"encontrados": [{"codigo", "equipo"}], "no_encontrados": [...]} en
+    el orden de los códigos recibidos.
+    """
+    codigos = auditorias.normalizar_codigos(lookup.codigos)
+    columnas, ocultos, nombres_pedidos = columnas_listado(
+        campos_pedidos(fields), ("codigo_inventario", "numero_serie")
+    )
+    async with pool.acquire() as conn:
+        encontrados, no_encontrados = await auditorias.buscar_codigos(conn, codigos, columnas)
+        nombres = await catalogos.nombres({CAMPOS_CATALOGO[c][1] for c in nombres_pedidos}, conn)
+    return {
+        "encontrados": [
+            {"codigo": codigo, "equipo": fila_listado(fila, ocultos, nombres_pedidos, nombres)}
+            for codigo, fila in encontrados.items()
+        ],
+        "no_encontrados": no_encontrados,
+    }
+
+@app.post("/auditorias")
+async def create_auditoria(auditoria: AuditoriaCreate):
+    """Abre una sesión de auditoría física de una ubicación"""
     async with pool.acquire() as conn:
-        rows = await conn.fetch("""
-            SELECT *, edificio || ' - ' || aula_oficina as nombre_completo 
-            FROM ubicaciones WHERE activo = TRUE ORDER BY edificio, aula_oficina
-        """)
-        return [dict(row) for row in rows]
+        return await auditorias.crear_auditoria(conn, auditoria.ubicacion_id, auditoria.usuario_id, auditoria.notas)
+
+@app.post("/auditorias/{auditoria_id}/lecturas")
+async def add_lecturas_auditoria(auditoria_id: int, lecturas: LecturasAuditoria):
+    """Registra un lote de códigos leídos; los repetidos en la sesión se ignoran"""
+    codigos = auditorias.normalizar_codigos(lecturas.codigos)
+    async with pool.acquire() as conn:
+        nuevas = await auditorias.registrar_lecturas(conn, auditoria_id, codigos)
+    return {"recibidas": len(codigos), "nuevas": nuevas}
+
+@app.get("/auditorias/{auditoria_id}")
+async def get_auditoria(auditoria_id: int):
+    """Sesión de auditoría con la conciliación de lo leído frente al inventario"""
+    async with pool.acquire() as conn:
+        # Misma instantánea para la sesión y la conciliación
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            auditoria = await auditorias.obtener_auditoria(conn, auditoria_id)
+            return {**dict(auditoria), "conciliacion": await auditorias.conciliar(conn, auditoria_id)}
+
+@app.post("/auditorias/{auditoria_id}/cerrar")
+async def close_auditoria(auditoria_id: int):
+    """Cierra la sesión (no admite más lecturas) y devuelve la conciliación final"""
+    async with pool.acquire() as conn:
+        return await auditorias.cerrar_auditoria(conn, auditoria_id)
+
+def respuesta_catalogo(request: Request, response: Response, instantanea, filas: list):
+    """Catálogo servido desde memoria con el ETag de su contenido"""
+    if coincide(request, instantanea.etag):
+        return no_modificado(instantanea.etag)
+    response.headers["ETag"] = instantanea.etag
+    return filas
+
+@app.get("/categorias")
+async def get_categorias(request: Request, response: Response):
+    instantanea = await catalogos.obtener("categorias_equipos")
+    return respuesta_catalogo(request, response, instantanea, instantanea.filas)
+
+@app.get("/ubicaciones")
+async def get_ubicaciones(request: Request, response: Response):
+    instantanea = await catalogos.obtener("ubicaciones")
+    activas = [fila for fila in instantanea.filas if fila["activo"]]
+    return respuesta_catalogo(request, response, instantanea, activas)
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    servir("main:app", 8001)
\ No newline at end of file
@@ -1,20 +1,32 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 from typing import Optional, List
 import asyncpg
 import os
 from datetime import date
 
+from common.cambios import CAMBIOS_LIMITE_MAXIMO, leer_cambios
+from common.db import crear_pool, enrutar_lecturas
+from common.etag import calcular_etag, coincide, no_modificado
+from common.metrics import instrumentar
+from common.server import servir
+
 app = FastAPI(title="Mantenimiento Service", version="1.0.0")
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Réplica opcional para las lecturas (GET); sin ella todo va a DATABASE_URL
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
 
 # --- CORRECCIÓN: Pool Global ---
 pool = None
 
+# Métricas Prometheus en /metrics (incluye el estado del pool de conexiones)
+instrumentar(app, "mantenimiento", pool_getter=lambda: pool)
+enrutar_lecturas(app)
+
 @app.on_event("startup")
 async def startup_db():
     global pool
-    pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=10)
+    pool = await crear_pool(DATABASE_URL, dsn_lectura=DATABASE_READ_URL)
 
 @app.on_event("shutdown")
 async def shutdown_db():
@@ -33,7 +45,7 @@ async def health_check():
     return {"status": "healthy", "service": "mantenimiento"}
 
 @app.get("/mantenimientos")
-async def get_mantenimientos():
+async def get_mantenimientos(request: Request, response: Response):
     query = """
         SELECT m.*, e.nombre as equipo_nombre, e.codigo_inventario
         FROM mantenimientos m
@@ -41,9 +53,21 @@ async def get_mantenimientos():
         ORDER BY m.fecha_programada DESC
     """
     async with pool.acquire() as conn:
+        etag = await calcular_etag(conn, request, ("mantenimientos", "equipos"))
+        if coincide(request, etag):
+            return no_modificado(etag)
+        if etag:
+            response.headers["ETag"] = etag
+
         rows = await conn.fetch(query)
         return [dict(row) for row in rows]
 
+@app.get("/mantenimientos/changes")
+async def get_cambios_mantenimientos(since: Optional[str] = None, limit: int = Query(500, ge=1, le=CAMBIOS_LIMITE_MAXIMO)):
+    """Mantenimientos creados, modificados y borrados desde el token `since`"""
+    async with pool.acquire() as conn:
+        return await leer_cambios(conn, "mantenimientos", since, limit)
+
 @app.post("/mantenimientos")
 async def create_mantenimiento(mant: MantenimientoCreate):
     query = """
@@ -63,5 +87,4 @@ async def create_mantenimiento(mant: MantenimientoCreate):
             raise HTTPException(status_code=400, detail="Equipo no existe")
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8003)
\ No newline at end of file
+    servir("main:app", 8003)
\ No newline at end of file
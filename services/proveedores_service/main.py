@@ -1,20 +1,32 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 from typing import Optional
 import asyncpg
 import os
 from datetime import date
 
+from common.cambios import CAMBIOS_LIMITE_MAXIMO, leer_cambios
+from common.db import crear_pool, enrutar_lecturas, sentencia_update
+from common.etag import calcular_etag, coincide, no_modificado
+from common.metrics import instrumentar
+from common.server import servir
+
 app = FastAPI(title="Proveedores Service", version="1.0.0")
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Réplica opcional para las lecturas (GET); sin ella todo va a DATABASE_URL
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
 
 # --- CORRECCIÓN: Pool Global ---
 pool = None
 
+# Métricas Prometheus en /metrics (incluye el estado del pool de conexiones)
+instrumentar(app, "proveedores", pool_getter=lambda: pool)
+enrutar_lecturas(app)
+
 @app.on_event("startup")
 async def startup_db():
     global pool
-    pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=10)
+    pool = await crear_pool(DATABASE_URL, dsn_lectura=DATABASE_READ_URL)
 
 @app.on_event("shutdown")
 async def shutdown_db():
@@ -58,7 +70,7 @@ async def health_check():
     return {"status": "healthy", "service": "proveedores"}
 
 @app.get("/proveedores")
-async def get_proveedores(activo: Optional[bool] = None):
+async def get_proveedores(request: Request, response: Response, activo: Optional[bool] = None):
     query = "SELECT * FROM proveedores"
     params = []
     
@@ -69,12 +81,31 @@ async def get_proveedores(activo: Optional[bool] = None):
     query += " ORDER BY razon_social"
     
     async with pool.acquire() as conn:
+        etag = await calcular_etag(conn, request, ("proveedores",))
+        if coincide(request, etag):
+            return no_modificado(etag)
+        if etag:
+            response.headers["ETag"] = etag
+
         rows = await conn.fetch(query, *params)
         return [dict(row) for row in rows]
 
+@app.get("/proveedores/changes")
+async def get_cambios_proveedores(since: Optional[str] = None, limit: int = Query(500, ge=1, le=CAMBIOS_LIMITE_MAXIMO)):
+    """Proveedores creados, modificados y borrados desde el token `since`"""
+    async with pool.acquire() as conn:
+        return await leer_cambios(conn, "proveedores", since, limit)
+
 @app.get("/proveedores/{proveedor_id}")
-async def get_proveedor(proveedor_id: int):
+async def get_proveedor(proveedor_id: int, request: Request, response: Response):
     async with pool.acquire() as conn:
+        # El detalle incluye estadísticas de equipos y los contratos del proveedor
+        etag = await calcular_etag(conn, request, ("proveedores", "equipos", "contratos"))
+        if coincide(request, etag):
+            return no_modificado(etag)
+        if etag:
+            response.headers["ETag"] = etag
+
         proveedor = await conn.fetchrow(
             "SELECT * FROM proveedores WHERE id = $1",
             proveedor_id
@@ -135,21 +166,12 @@ async def create_proveedor(proveedor: ProveedorCreate):
 
 @app.put("/proveedores/{proveedor_id}")
 async def update_proveedor(proveedor_id: int, proveedor: ProveedorUpdate):
-    updates = []
-    params = []
-    param_count = 1
-    
-    for field, value in proveedor.dict(exclude_unset=True).items():
-        updates.append(f"{field} = ${param_count}")
-        params.append(value)
-        param_count += 1
-    
-    if not updates:
+    # Sólo los campos enviados (un null explícito borra el valor)
+    campos = proveedor.model_dump(exclude_unset=True)
+    if not campos:
         raise HTTPException(status_code=400, detail="No hay campos para actualizar")
-    
-    params.append(proveedor_id)
-    query = f"UPDATE proveedores SET {', '.join(updates)} WHERE id = ${param_count}"
-    
+    query, params = sentencia_update("proveedores", campos, "id", proveedor_id)
+
     async with pool.acquire() as conn:
         result = await conn.execute(query, *params)
         if result == "UPDATE 0":
@@ -157,7 +179,7 @@ async def update_proveedor(proveedor_id: int, proveedor: ProveedorUpdate):
         return {"message": "Proveedor actualizado exitosamente"}
 
 @app.get("/contratos")
-async def get_contratos(proveedor_id: Optional[int] = None):
+async def get_contratos(request: Request, response: Response, proveedor_id: Optional[int] = None):
     query = """
         SELECT c.*, p.razon_social as proveedor_nombre
         FROM contratos c
@@ -172,9 +194,21 @@ async def get_contratos(proveedor_id: Optional[int] = None):
     query += " ORDER BY c.fecha_inicio DESC"
     
     async with pool.acquire() as conn:
+        etag = await calcular_etag(conn, request, ("contratos", "proveedores"))
+        if coincide(request, etag):
+            return no_modificado(etag)
+        if etag:
+            response.headers["ETag"] = etag
+
         rows = await conn.fetch(query, *params)
         return [dict(row) for row in rows]
 
+@app.get("/contratos/changes")
+async def get_cambios_contratos(since: Optional[str] = None, limit: int = Query(500, ge=1, le=CAMBIOS_LIMITE_MAXIMO)):
+    """Contratos creados, modificados y borrados desde el token `since`"""
+    async with pool.acquire() as conn:
+        return await leer_cambios(conn, "contratos", since, limit)
+
 @app.post("/contratos")
 async def create_contrato(contrato: ContratoCreate):
     query = """
@@ -201,5 +235,4 @@ async def create_contrato(contrato: ContratoCreate):
             raise HTTPException(status_code=400, detail="El número de contrato ya existe")
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8002)
\ No newline at end of file
+    servir("main:app", 8002)
\ No newline at end of file
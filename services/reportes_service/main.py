@@ -1,7 +1,6 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import FileResponse
 from typing import Optional
-import asyncpg
 import os
 from datetime import datetime, date
 import pandas as pd
@@ -12,17 +11,27 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet
 import io
 
+from common.db import crear_pool, enrutar_lecturas
+from common.metrics import instrumentar
+from common.server import servir
+
 app = FastAPI(title="Reportes Service", version="1.0.0")
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Réplica opcional para las lecturas (GET); sin ella todo va a DATABASE_URL
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
 
 # --- CORRECCIÓN: Variable Global para el Pool ---
 pool = None
 
+# Métricas Prometheus en /metrics (incluye el estado del pool de conexiones)
+instrumentar(app, "reportes", pool_getter=lambda: pool)
+enrutar_lecturas(app, rutas_lectura=("/export/excel", "/export/pdf"))
+
 @app.on_event("startup")
 async def startup_db():
     global pool
     # Creamos el pool una sola vez al iniciar
-    pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=10)
+    pool = await crear_pool(DATABASE_URL, dsn_lectura=DATABASE_READ_URL)
 
 @app.on_event("shutdown")
 async def shutdown_db():
@@ -263,5 +272,4 @@ async def export_pdf(report_data: dict):
         raise HTTPException(status_code=500, detail=f"Error al exportar: {str(e)}")
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8004)
\ No newline at end of file
+    servir("main:app", 8004)
\ No newline at end of file
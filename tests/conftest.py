@@ -0,0 +1,8 @@
+"""Los servicios importan `common` y sus módulos hermanos como en su contenedor
+(WORKDIR /app con common/ copiado al lado): se reproducen esas rutas."""
+import sys
+from pathlib import Path
+
+SERVICIOS = Path(__file__).resolve().parent.parent / "services"
+
+sys.path[:0] = [str(SERVICIOS), str(SERVICIOS / "equipos_service"), str(SERVICIOS / "api_gateway")]
@@ -0,0 +1,69 @@
+"""Control de admisión del gateway: identidad del cliente y configuración de los límites."""
+import pytest
+
+import admission
+from admission import AdmissionController, ip_cliente, proxies_confiables, ruta_valida
+
+CONFIABLES = proxies_confiables("10.0.0.0/8, 192.168.1.5")
+
+
+def test_sin_proxies_confiables_se_ignora_x_forwarded_for():
+    assert ip_cliente("203.0.113.7", "1.2.3.4", ()) == "203.0.113.7"
+
+
+def test_x_forwarded_for_de_un_cliente_no_confiable_se_ignora():
+    assert ip_cliente("203.0.113.7", "1.2.3.4", CONFIABLES) == "203.0.113.7"
+
+
+def test_desde_un_proxy_confiable_se_toma_el_salto_mas_a_la_derecha_no_confiable():
+    # El cliente antepone una dirección inventada; el proxy añade la real al final
+    assert ip_cliente("10.0.0.2", "6.6.6.6, 198.51.100.9, 192.168.1.5", CONFIABLES) == "198.51.100.9"
+
+
+def test_cabecera_con_solo_proxies_confiables_usa_la_conexion():
+    assert ip_cliente("10.0.0.2", "10.0.0.3", CONFIABLES) == "10.0.0.2"
+
+
+def test_los_buckets_inactivos_se_descartan(monkeypatch):
+    control = AdmissionController()
+    limites = control.limites["agents"]
+    ahora = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: ahora[0])
+    for i in range(50):
+        control._comprobar_tasa("agents", f"cliente-{i}")
+    assert len(control._buckets) == 50
+    # Pasado el tiempo de rellenar el cupo, el siguiente cliente nuevo los descarta
+    ahora[0] += limites.burst / limites.rate + 1
+    control._comprobar_tasa("agents", "otro")
+    assert list(control._buckets) == [("otro", "agents")]
+
+
+def test_burst_por_defecto_admite_la_primera_peticion(monkeypatch):
+    monkeypatch.setenv("GATEWAY_ADMISSION_DEFAULT_RATE", "5")
+    limites = admission.ClassLimits.desde_env("default")
+    assert limites.burst == 5
+    control = AdmissionController()
+    control._comprobar_tasa("default", "cliente")
+
+
+def test_configuracion_invalida_se_rechaza_al_arrancar(monkeypatch):
+    monkeypatch.setenv("GATEWAY_ADMISSION_DEFAULT_RATE", "2")
+    monkeypatch.setenv("GATEWAY_ADMISSION_DEFAULT_BURST", "0")
+    with pytest.raises(ValueError, match="BURST"):
+        AdmissionController()
+
+
+@pytest.mark.parametrize("ruta", [
+    "/api/reportes/a/../export/excel",
+    "/api/reportes/./export/excel",
+    "/api/reportes//export/excel",
+    "/api/agents/x/../run-all-agents",
+])
+def test_rutas_con_segmentos_de_puntos_o_vacios_se_rechazan(ruta):
+    # Clasificada tal cual sería "default", pero httpx la resolvería hacia otra clase
+    assert not ruta_valida(ruta)
+
+
+@pytest.mark.parametrize("ruta", ["/api/reportes/export/excel", "/api/equipos/", "/api/equipos/1.5/timeline"])
+def test_rutas_normales_se_admiten(ruta):
+    assert ruta_valida(ruta)
@@ -0,0 +1,75 @@
+"""Lectura y validación de archivos de carga masiva (POST /equipos/bulk)."""
+import io
+
+import pytest
+
+pytest.importorskip("fastapi")
+openpyxl = pytest.importorskip("openpyxl")
+
+import carga  # noqa: E402
+from main import EquipoCreate  # noqa: E402
+
+
+def xlsx(*filas) -> io.BytesIO:
+    libro = openpyxl.Workbook()
+    for fila in filas:
+        libro.active.append(fila)
+    archivo = io.BytesIO()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+def validar(archivo, formato: str) -> tuple:
+    filas = carga.leer_filas(archivo, formato, EquipoCreate.model_fields)
+    registros, errores, _ = carga.validar_lote(filas, EquipoCreate, 100)
+    return registros, errores
+
+
+def test_xlsx_con_codigos_y_series_numericos():
+    archivo = xlsx(
+        ("codigo_inventario", "categoria_id", "nombre", "numero_serie", "costo_compra"),
+        (100234, 1, "Laptop", 5550001234, 1499.5),
+        (100235.0, 1.0, "Monitor", 77, 300),
+    )
+    registros, errores = validar(archivo, "xlsx")
+    assert errores == []
+    columnas = dict(enumerate(carga.COLUMNAS_CARGA))
+    filas = [{columnas[i]: v for i, v in enumerate(r)} for r in registros]
+    assert [f["codigo_inventario"] for f in filas] == ["100234", "100235"]
+    assert [f["numero_serie"] for f in filas] == ["5550001234", "77"]
+    assert [f["categoria_id"] for f in filas] == [1, 1]
+    assert [float(f["costo_compra"]) for f in filas] == [1499.5, 300.0]
+
+
+def test_valor_celda():
+    assert carga.valor_celda(1234.0) == "1234"
+    assert carga.valor_celda(12.5) == "12.5"
+    assert carga.valor_celda(7) == "7"
+    assert carga.valor_celda(True) is True
+    assert carga.valor_celda("INV-1") == "INV-1"
+
+
+@pytest.mark.parametrize("contenido", [b"esto no es un xlsx", b"PK\x03\x04roto", b""])
+def test_xlsx_corrupto_responde_400(contenido):
+    with pytest.raises(carga.HTTPException) as error:
+        validar(io.BytesIO(contenido), "xlsx")
+    assert error.value.status_code == 400
+
+
+def test_zip_que_no_es_un_libro_responde_400():
+    archivo = io.BytesIO()
+    with carga.zipfile.ZipFile(archivo, "w") as zip_:
+        zip_.writestr("documento.txt", "hola")
+    archivo.seek(0)
+    with pytest.raises(carga.HTTPException) as error:
+        validar(archivo, "xlsx")
+    assert error.value.status_code == 400
+
+
+def test_csv_que_no_es_utf8_responde_400():
+    contenido = "codigo_inventario,categoria_id,nombre\nINV-1,1,Cámara\n".encode("latin-1")
+    with pytest.raises(carga.HTTPException) as error:
+        validar(io.BytesIO(contenido), "csv")
+    assert error.value.status_code == 400
+    assert "UTF-8" in error.value.detail
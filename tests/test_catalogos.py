@@ -0,0 +1,109 @@
+"""Recarga de catálogos con el pool agotado: no debe esperar otra conexión del
+pool que la petición ya retiene."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("asyncpg")
+
+import catalogos  # noqa: E402
+from catalogos import Catalogos  # noqa: E402
+
+
+class ConexionFalsa:
+    def __init__(self, origen: str):
+        self.origen = origen
+        self.lecturas = 0
+
+    def is_in_transaction(self) -> bool:
+        return False
+
+    async def fetch(self, consulta):
+        self.lecturas += 1
+        return [{"id": 1, "nombre": f"Laptops ({self.origen})"}]
+
+
+class Adquisicion:
+    """Como PoolAcquireContext de asyncpg: se usa con await o con async with"""
+
+    def __init__(self, pool, timeout):
+        self.pool = pool
+        self.timeout = timeout
+        self.conn = None
+
+    async def _obtener(self):
+        await asyncio.wait_for(self.pool.libres.acquire(), self.timeout)
+        return self.pool.conexion
+
+    def __await__(self):
+        return self._obtener().__await__()
+
+    async def __aenter__(self):
+        self.conn = await self._obtener()
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        await self.pool.release(self.conn)
+
+
+class PoolFalso:
+    def __init__(self, origen: str, tamano: int = 1):
+        self.libres = asyncio.Semaphore(tamano)
+        self.conexion = ConexionFalsa(origen)
+
+    def acquire(self, timeout=None):
+        return Adquisicion(self, timeout)
+
+    async def release(self, conn):
+        self.libres.release()
+
+
+def preparar(pools) -> Catalogos:
+    # Como tras iniciar() con la conexión de escucha activa, sin abrirla
+    cache = Catalogos()
+    cache.pools = pools
+    cache.pool = getattr(pools, "principal", pools)
+    cache.escuchando = True
+    return cache
+
+
+def test_recarga_con_pool_de_una_conexion_usa_la_de_la_peticion():
+    async def escenario():
+        pool = PoolFalso("principal")
+        cache = preparar(pool)
+        async with pool.acquire() as conn:
+            instantanea = await asyncio.wait_for(cache.obtener("categorias_equipos", conn), 2)
+        assert instantanea.nombres == {1: "Laptops (principal)"}
+        # Guardada: el siguiente uso no vuelve a leer
+        async with pool.acquire() as conn:
+            await cache.obtener("categorias_equipos", conn)
+        assert pool.conexion.lecturas == 1
+
+    asyncio.run(escenario())
+
+
+def test_recarga_desde_la_replica_con_el_principal_agotado_no_guarda(monkeypatch):
+    pytest.importorskip("uvicorn")
+    from common.db import Pools, _lectura
+
+    monkeypatch.setattr(catalogos, "CATALOGOS_ACQUIRE_TIMEOUT", 0.05)
+
+    async def escenario():
+        pools = Pools(PoolFalso("principal"), PoolFalso("replica"))
+        cache = preparar(pools)
+        _lectura.set(True)
+        async with pools.acquire() as conn:
+            assert pools.es_lectura(conn)
+            # Otra petición retiene la única conexión del principal
+            async with pools.principal.acquire():
+                instantanea = await asyncio.wait_for(cache.obtener("categorias_equipos", conn), 2)
+        assert instantanea.nombres == {1: "Laptops (replica)"}
+        assert "categorias_equipos" not in cache._instantaneas
+
+        # Con el principal libre la recarga se lee de él y se guarda
+        async with pools.acquire() as conn:
+            instantanea = await cache.obtener("categorias_equipos", conn)
+        assert instantanea.nombres == {1: "Laptops (principal)"}
+        assert cache._instantaneas["categorias_equipos"] is instantanea
+
+    asyncio.run(escenario())
@@ -0,0 +1,62 @@
+"""Cabeceras de las respuestas comprimidas por el gateway: ETag y Vary."""
+import asyncio
+
+from compression import CompressionMiddleware, con_vary, etag_debil
+
+JSON = [(b"content-type", b"application/json"), (b"etag", b'"v42"')]
+
+
+def responder(headers: list, cuerpo: bytes, accept_encoding: str = None, metodo: str = "GET") -> dict:
+    """Pasa una respuesta por el middleware y devuelve sus cabeceras y cuerpo"""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": headers + [(b"content-length", str(len(cuerpo)).encode())]})
+        await send({"type": "http.response.body", "body": cuerpo})
+
+    enviados = []
+
+    async def send(message):
+        enviados.append(message)
+
+    peticion = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else []
+    scope = {"type": "http", "method": metodo, "headers": peticion}
+    asyncio.run(CompressionMiddleware(app, min_size=100)(scope, None, send))
+    cabeceras = {}
+    for clave, valor in enviados[0]["headers"]:
+        assert clave not in cabeceras, f"cabecera repetida: {clave}"
+        cabeceras[clave] = valor
+    return {"headers": cabeceras, "body": b"".join(m.get("body", b"") for m in enviados[1:])}
+
+
+def test_variante_comprimida_lleva_etag_debil_y_vary():
+    r = responder(JSON, b"[" + b"1," * 500 + b"1]", "gzip")
+    assert r["headers"][b"content-encoding"] == b"gzip"
+    assert r["headers"][b"etag"] == b'W/"v42"'
+    assert r["headers"][b"vary"] == b"Accept-Encoding"
+
+
+def test_sin_comprimir_conserva_el_etag_y_lleva_vary():
+    # Cliente sin Accept-Encoding
+    r = responder(JSON, b"[" + b"1," * 500 + b"1]")
+    assert b"content-encoding" not in r["headers"]
+    assert r["headers"][b"etag"] == b'"v42"'
+    assert r["headers"][b"vary"] == b"Accept-Encoding"
+    # Cuerpo por debajo del mínimo
+    r = responder(JSON, b"[1]", "gzip")
+    assert b"content-encoding" not in r["headers"]
+    assert r["headers"][b"vary"] == b"Accept-Encoding"
+
+
+def test_tipo_no_comprimible_no_lleva_vary():
+    r = responder([(b"content-type", b"image/png")], b"x" * 500, "gzip")
+    assert b"vary" not in r["headers"]
+
+
+def test_vary_existente_se_amplia():
+    assert con_vary([(b"vary", b"Origin")]) == [(b"vary", b"Origin, Accept-Encoding")]
+    assert con_vary([(b"vary", b"accept-encoding")]) == [(b"vary", b"accept-encoding")]
+
+
+def test_etag_debil_no_se_duplica():
+    assert etag_debil(b'"a"') == b'W/"a"'
+    assert etag_debil(b'W/"a"') == b'W/"a"'
@@ -0,0 +1,156 @@
+"""Parámetros que equipos_service envía a Postgres: cursor y filtros del listado, búsqueda."""
+import asyncio
+import base64
+import datetime
+import json
+import re
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import main  # noqa: E402
+from common.db import Consulta  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+from starlette.datastructures import QueryParams  # noqa: E402
+from main import (  # noqa: E402
+    codificar_cursor, condicion_cursor, decodificar_cursor, filtros_especificaciones, parametros_busqueda, valor_filtro
+)
+
+# Lo que hace Postgres con cada cast del cursor a partir del texto recibido
+CONVERSIONES = {
+    "integer": int,
+    "date": datetime.date.fromisoformat,
+    "timestamp": datetime.datetime.fromisoformat,
+    "numeric": Decimal,
+    "text": str,
+}
+
+
+def parametros_enlazados(sql: str, consulta: Consulta) -> list:
+    """(tipo del marcador, valor) de cada $n usado en la condición"""
+    return [(tipo, consulta.params[int(n) - 1]) for n, tipo in re.findall(r"\$(\d+)::([\w:]+)", sql)]
+
+
+def comprobar_tipos(sql: str, consulta: Consulta):
+    """asyncpg exige str para $n::text::... e int para $n::integer"""
+    for tipo, valor in parametros_enlazados(sql, consulta):
+        if tipo.startswith("text::"):
+            assert isinstance(valor, str), (tipo, valor)
+            CONVERSIONES[tipo.split("::")[1]](valor)
+        else:
+            assert isinstance(valor, int), (tipo, valor)
+
+
+def recorrer(orden: str, descendente: bool, filas: list):
+    """Pide las páginas de una en una como el endpoint: cursor de la última fila -> condición"""
+    for fila in filas:
+        cursor = codificar_cursor(orden, fila[orden], fila["id"])
+        valor, equipo_id = decodificar_cursor(cursor, orden)
+        assert equipo_id == fila["id"]
+        consulta = Consulta(["filtro previo"])
+        sql = condicion_cursor(orden, descendente, valor, equipo_id, consulta)
+        comprobar_tipos(sql, consulta)
+
+
+@pytest.mark.parametrize("descendente", [False, True])
+def test_paginas_ordenadas_por_id(descendente):
+    recorrer("id", descendente, [{"id": i} for i in (1, 2, 50, 1000)])
+
+
+@pytest.mark.parametrize("descendente", [False, True])
+def test_paginas_ordenadas_por_columna_con_nulos(descendente):
+    filas = [
+        {"id": 3, "fecha_compra": datetime.date(2023, 1, 31)},
+        {"id": 7, "fecha_compra": datetime.date(2024, 6, 1)},
+        {"id": 9, "fecha_compra": None},
+    ]
+    recorrer("fecha_compra", descendente, filas)
+
+
+def test_cursor_antiguo_con_entero():
+    """Los cursores emitidos antes guardaban el valor de sort=id como entero"""
+    cursor = base64.urlsafe_b64encode(json.dumps(["id", 5, 5]).encode()).decode().rstrip("=")
+    consulta = Consulta()
+    valor, equipo_id = decodificar_cursor(cursor, "id")
+    comprobar_tipos(condicion_cursor("id", False, valor, equipo_id, consulta), consulta)
+
+
+def test_busqueda_prefijos_por_palabra():
+    texto, tsquery, patron, codigo = parametros_busqueda("  Lap DEL ")
+    assert texto == "lap del"
+    assert tsquery == "lap:* & del:*"
+    assert patron == "%lap del%"
+    assert codigo == "Lap DEL"
+
+
+def test_busqueda_codigo_exacto_conserva_mayusculas():
+    texto, tsquery, _, codigo = parametros_busqueda("INV-0012")
+    assert (texto, tsquery, codigo) == ("inv-0012", "inv:* & 0012:*", "INV-0012")
+
+
+def test_busqueda_escapa_comodines_del_like():
+    _, tsquery, patron, _ = parametros_busqueda(r"50%_a\b")
+    assert patron == r"%50\%\_a\\b%"
+    # Los símbolos no llegan a la tsquery
+    assert tsquery == "50:* & _a:* & b:*"
+
+
+def test_busqueda_sin_letras_ni_numeros():
+    with pytest.raises(HTTPException) as error:
+        parametros_busqueda("--- !!")
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("texto, valor", [
+    ("16", 16),
+    ("2.5", 2.5),
+    ("true", True),
+    ("null", None),
+    ("Intel", "Intel"),
+    ('"16"', "16"),
+    ('"true"', "true"),
+    ("[1, 2]", "[1, 2]"),
+])
+def test_valor_filtro(texto, valor):
+    assert valor_filtro(texto) == valor
+    assert type(valor_filtro(texto)) is type(valor)
+
+
+def test_filtros_especificaciones_con_texto_entre_comillas():
+    consulta = Consulta()
+    filtros_especificaciones(QueryParams('spec.modelo="16"&spec.cpu.nucleos=8&estado=operativo'), consulta)
+    assert consulta.condiciones == ["e.especificaciones @> $1::jsonb", "e.especificaciones @> $2::jsonb"]
+    assert consulta.params == [{"modelo": "16"}, {"cpu": {"nucleos": 8}}]
+
+
+class ConexionFalsa:
+    """Devuelve la fila indicada a cualquier consulta y guarda la última"""
+
+    def __init__(self, fila: dict):
+        self.fila = fila
+        self.consulta = None
+
+    async def fetchrow(self, query, *params):
+        self.consulta = (query, params)
+        return self.fila
+
+
+def test_traslado_por_filtro_acotado_a_movimientos_bulk_max(monkeypatch):
+    monkeypatch.setattr(main, "MOVIMIENTOS_BULK_MAX", 3)
+    conn = ConexionFalsa({"seleccionados": 4, "ids": []})
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.mover_equipos(conn, 2, 1, "traslado", None, filtro=main.FiltroMovimiento(estado="operativo")))
+    assert error.value.status_code == 400
+    # La selección se corta en el máximo + 1 y la actualización sólo ocurre dentro del máximo
+    query, params = conn.consulta
+    assert "LIMIT $7" in query and params[6] == 4
+    assert "<= $8" in query and params[7] == 3
+
+
+def test_traslado_por_filtro_dentro_del_maximo(monkeypatch):
+    monkeypatch.setattr(main, "MOVIMIENTOS_BULK_MAX", 3)
+    conn = ConexionFalsa({"seleccionados": 2, "ids": [5, 9]})
+    filtro = main.FiltroMovimiento(estado="operativo")
+    assert asyncio.run(main.mover_equipos(conn, 2, 1, "traslado", None, filtro=filtro)) == [5, 9]
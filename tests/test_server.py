@@ -0,0 +1,34 @@
+"""Reparto de DB_POOL_MAX_TOTAL entre los workers de un servicio."""
+from common.server import tamano_pool
+
+
+def configurar(monkeypatch, total, workers, **otras):
+    monkeypatch.delenv("DB_POOL_MAX_SIZE", raising=False)
+    monkeypatch.delenv("DB_POOL_MIN_SIZE", raising=False)
+    monkeypatch.setenv("DB_POOL_MAX_TOTAL", str(total))
+    monkeypatch.setenv("WEB_WORKERS", str(workers))
+    for nombre, valor in otras.items():
+        monkeypatch.setenv(nombre, str(valor))
+
+
+def test_reparte_el_total_entre_workers(monkeypatch):
+    configurar(monkeypatch, 10, 4)
+    assert tamano_pool() == {"min_size": 1, "max_size": 2}
+
+
+def test_descuenta_conexiones_fuera_del_pool(monkeypatch):
+    configurar(monkeypatch, 12, 4)
+    tamano = tamano_pool(conexiones_extra=1)
+    assert tamano["max_size"] == 2
+    assert (tamano["max_size"] + 1) * 4 <= 12
+
+
+def test_minimo_una_conexion_y_aviso(monkeypatch, caplog):
+    configurar(monkeypatch, 4, 4)
+    assert tamano_pool(conexiones_extra=1)["max_size"] == 1
+    assert "usará hasta 8 conexiones" in caplog.text
+
+
+def test_max_size_explicito_no_se_reparte(monkeypatch):
+    configurar(monkeypatch, 10, 4, DB_POOL_MAX_SIZE=5)
+    assert tamano_pool(conexiones_extra=1)["max_size"] == 5